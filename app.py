@@ -1,38 +1,367 @@
 import os
+import gc
+import base64
+import json
+import csv
+import io
+import math
+import hmac
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, Blueprint, abort, current_app, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, g, has_request_context
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import func, desc
-from datetime import date
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime
+from werkzeug.middleware.proxy_fix import ProxyFix
+from sqlalchemy import func, desc, case, insert, update, event, text, DDL
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+import re
+import random
+import sqlite3
+import click
+import threading
+import time
+from datetime import date, timedelta
+from datetime import datetime, timezone
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+from functools import wraps
+from collections import OrderedDict, namedtuple
+from carbon_factors import CarbonFactorIndex
+from password_hashing import PasswordHasher, HashingBusy
+from metrics import Registry, COUNT_BUCKETS
+from request_profiling import RequestProfile, PROFILE_FORMATS
+from static_assets import AssetPipeline
+from event_hub import EventHub, HubFull, SQLiteRelay
+from rate_limits import Limit, MemoryStore, SQLiteStore, RateLimiter, ConcurrencyLimiter, Overloaded
+import schema_migrations
 
 # --- App Setup ---
-app = Flask(__name__)
+# create_app() (at the end of this module) builds the app; routes live on
+# three blueprints and CLI commands on a fourth without a command group.
 load_dotenv() 
+consumer_bp = Blueprint('consumer', __name__)
+vendor_bp = Blueprint('vendor', __name__)
+api_bp = Blueprint('api', __name__)
+cli_bp = Blueprint('cli', __name__, cli_group=None)
+
+# --- Static Assets ---
+# Templates link static files through asset_url(), which gives fingerprinted
+# URLs cached for a year; `flask build-assets` adds precompressed variants.
+ASSETS = AssetPipeline()
 
 # --- Database Configuration ---
+# Everything can be overridden from the environment (or .env):
+#   DATABASE_URL                                  SQLAlchemy URI, defaults to ./mosspay.db
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE
+#   SQLITE_JOURNAL_MODE, SQLITE_SYNCHRONOUS, SQLITE_BUSY_TIMEOUT_MS,
+#   SQLITE_CACHE_SIZE_KB, SQLITE_MMAP_SIZE_MB
 basedir = os.path.abspath(os.path.dirname(__file__))
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'mosspay.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = 'a-very-secret-key-you-should-change' 
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+def engine_options(uri):
+    """Pool settings for SQLAlchemy's engine, tuned for the database in `uri`."""
+    if uri.startswith('sqlite'):
+        if ':memory:' in uri or uri.rstrip('/') == 'sqlite:':
+            return {}
+        # Writers serialize on SQLite's file lock, so the pool only needs to
+        # cover concurrent readers; waiting on the lock is left to busy_timeout.
+        return {
+            'pool_size': env_int('DB_POOL_SIZE', 10),
+            'max_overflow': env_int('DB_MAX_OVERFLOW', 20),
+            'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+            'connect_args': {
+                'timeout': env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+                'check_same_thread': False
+            }
+        }
+    return {
+        'pool_size': env_int('DB_POOL_SIZE', 10),
+        'max_overflow': env_int('DB_MAX_OVERFLOW', 20),
+        'pool_timeout': env_int('DB_POOL_TIMEOUT', 30),
+        'pool_recycle': env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True
+    }
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Let readers run alongside the billing writer and cut fsyncs per commit."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')}")
+    cursor.execute(f"PRAGMA synchronous={os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')}")
+    cursor.execute(f"PRAGMA busy_timeout={env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+    cursor.execute(f"PRAGMA cache_size=-{env_int('SQLITE_CACHE_SIZE_KB', 65536)}")
+    cursor.execute(f"PRAGMA mmap_size={env_int('SQLITE_MMAP_SIZE_MB', 256) * 1024 * 1024}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.close()
 
 # --- Database Setup ---
-db = SQLAlchemy(app)
+db = SQLAlchemy()
 
 # --- Login Manager Setup (FOR CUSTOMERS) ---
 login_manager = LoginManager()
-login_manager.init_app(app)
-login_manager.login_view = 'consumer_login'
+login_manager.login_view = 'consumer.consumer_login'
 login_manager.login_message = 'Please log in to access this page.'
 
+# --- Metrics ---
+# Request hooks time every request and engine events count and time its SQL.
+# /metrics serves the totals in the Prometheus text format (protected by a
+# bearer token when METRICS_TOKEN is set). With METRICS_DIR set, as
+# gunicorn.conf.py does, workers share snapshots there and any of them reports
+# the whole server; otherwise the totals are this process's. Statements slower
+# than SLOW_QUERY_MS are logged with their text.
+METRICS_ENABLED = env_int('METRICS_ENABLED', 1)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+
+METRICS = Registry(snapshot_dir=os.environ.get('METRICS_DIR'))
+REQUESTS_TOTAL = METRICS.counter(
+    'mosspay_requests_total', 'Requests handled.', ('endpoint', 'method', 'status'))
+REQUEST_SECONDS = METRICS.histogram(
+    'mosspay_request_duration_seconds', 'Request latency, including streamed bodies.', ('endpoint',))
+REQUEST_QUERIES = METRICS.histogram(
+    'mosspay_request_db_queries', 'SQL statements executed per request.', ('endpoint',), buckets=COUNT_BUCKETS)
+REQUEST_DB_SECONDS = METRICS.histogram(
+    'mosspay_request_db_seconds', 'Time spent executing SQL per request.', ('endpoint',))
+QUERY_SECONDS = METRICS.histogram(
+    'mosspay_db_query_duration_seconds', 'Latency of individual SQL statements.')
+SLOW_QUERIES = METRICS.counter(
+    'mosspay_db_slow_queries_total', 'Statements slower than SLOW_QUERY_MS.', ('endpoint',))
+METRICS.gauge(
+    'mosspay_password_hash_tasks', 'Password hashes running or waiting for a worker.', ('state',),
+    callback=lambda: {(state,): PASSWORD_HASHER.stats()[state] for state in ('running', 'queued')})
+METRICS.counter(
+    'mosspay_password_hash_total', 'Password hashes finished or turned away because the queue was full.',
+    ('outcome',),
+    callback=lambda: {(outcome,): PASSWORD_HASHER.stats()[outcome] for outcome in ('completed', 'rejected')})
+PASSWORD_HASH_SECONDS = METRICS.histogram(
+    'mosspay_password_hash_seconds', 'Time spent computing a password hash or check.')
+PASSWORD_HASH_WAIT_SECONDS = METRICS.histogram(
+    'mosspay_password_hash_wait_seconds', 'Time a password hash waited in the queue for a worker.')
+
+def start_request_metrics():
+    g.request_started = time.perf_counter()
+    g.db_queries = 0
+    g.db_seconds = 0.0
+
+def remember_response_status(response):
+    g.response_status = response.status_code
+    return response
+
+def record_request_metrics(exc):
+    # Runs when the request context is torn down, i.e. after a streamed body.
+    started = g.pop('request_started', None)
+    if started is None:
+        return
+    endpoint = request.endpoint or 'unmatched'
+    status = 500 if exc is not None else g.get('response_status', 500)
+    REQUESTS_TOTAL.inc(endpoint=endpoint, method=request.method, status=status)
+    REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint=endpoint)
+    REQUEST_QUERIES.observe(g.db_queries, endpoint=endpoint)
+    REQUEST_DB_SECONDS.observe(g.db_seconds, endpoint=endpoint)
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    context.query_started = time.perf_counter()
+
+def record_query_metrics(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context.query_started
+    QUERY_SECONDS.observe(elapsed)
+    endpoint = None
+    if has_request_context() and 'request_started' in g:
+        endpoint = request.endpoint or 'unmatched'
+        g.db_queries += 1
+        g.db_seconds += elapsed
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc(endpoint=endpoint or '')
+        current_app.logger.warning('Slow query (%.0f ms) in %s: %s', elapsed * 1000, endpoint or 'background', statement)
+
+if METRICS_ENABLED:
+    event.listen(Engine, 'before_cursor_execute', start_query_timer)
+    event.listen(Engine, 'after_cursor_execute', record_query_metrics)
+
+def metrics():
+    if METRICS_TOKEN and request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
+
+# --- Password Hashing ---
+# Method strings follow werkzeug, e.g. "scrypt:32768:8:1" or "pbkdf2:sha256:600000".
+# Existing hashes made with another method/cost are upgraded at the next login.
+PASSWORD_HASHER = PasswordHasher(
+    method=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'),
+    workers=env_int('PASSWORD_HASH_WORKERS', 2),
+    max_queue=env_int('PASSWORD_HASH_QUEUE', 32),
+    timeout=env_int('PASSWORD_HASH_TIMEOUT', 10),
+    hash_histogram=PASSWORD_HASH_SECONDS,
+    wait_histogram=PASSWORD_HASH_WAIT_SECONDS
+)
+
+# --- Request Profiling ---
+# Off unless PROFILE_DIR is set. Then a request is profiled when it carries
+# "X-Profile-Request: <PROFILE_TOKEN>" (and may pick X-Profile-Format), or at
+# random with probability PROFILE_SAMPLE_RATE, optionally only for the
+# comma-separated PROFILE_ENDPOINTS. Sampled profiles are kept only when the
+# request took at least PROFILE_MIN_MS. Files are named after the time,
+# endpoint and signed-in vendor or user.
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_ENDPOINTS = {name.strip() for name in os.environ.get('PROFILE_ENDPOINTS', '').split(',') if name.strip()}
+PROFILE_MIN_MS = env_int('PROFILE_MIN_MS', 0)
+PROFILE_FORMAT = os.environ.get('PROFILE_FORMAT', 'pstats')
+
+def start_request_profile():
+    requested = request.headers.get('X-Profile-Request')
+    forced = bool(PROFILE_TOKEN and requested and hmac.compare_digest(requested, PROFILE_TOKEN))
+    if not forced:
+        if PROFILE_ENDPOINTS and request.endpoint not in PROFILE_ENDPOINTS:
+            return
+        if random.random() >= PROFILE_SAMPLE_RATE:
+            return
+    profile_format = request.headers.get('X-Profile-Format', PROFILE_FORMAT) if forced else PROFILE_FORMAT
+    if profile_format not in PROFILE_FORMATS:
+        profile_format = PROFILE_FORMAT
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{request.endpoint or 'unmatched'}"
+    if 'vendor_id' in session:
+        name += f"-vendor{session['vendor_id']}"
+    elif '_user_id' in session:
+        name += f"-user{session['_user_id']}"
+    g.request_profile = RequestProfile(profile_format)
+    g.request_profile_forced = forced
+    g.request_profile_name = name + g.request_profile.extension
+
+def add_profile_header(response):
+    if 'request_profile' in g and g.request_profile_forced:
+        response.headers['X-Profile-Id'] = g.request_profile_name
+    return response
+
+def save_request_profile(exc):
+    profile = g.pop('request_profile', None)
+    if profile is None:
+        return
+    forced = g.pop('request_profile_forced')
+    name = g.pop('request_profile_name')
+    profile.stop()
+    if not forced and profile.elapsed * 1000 < PROFILE_MIN_MS:
+        return
+    try:
+        profile.save(os.path.join(PROFILE_DIR, name))
+    except OSError as e:
+        current_app.logger.warning('Could not save request profile %s: %s', name, e)
+
+if PROFILE_DIR and PROFILE_FORMAT not in PROFILE_FORMATS:
+    raise RuntimeError(f"PROFILE_FORMAT must be one of {', '.join(PROFILE_FORMATS)}")
+
+# --- Admission Control ---
+# Writes (any method but GET, HEAD and OPTIONS) are checked before their view
+# runs. RATE_LIMITS maps an endpoint to token-bucket limits per key: "ip",
+# "account" (the email a login is for), "user" (signed-in customer) or
+# "vendor" (signed-in vendor); the "api" entry covers the other /api writes,
+# which share one budget. RATE_LIMITS_JSON overrides entries, e.g.
+# {"vendor.vendor_login": {"ip": "60/minute"}}, and null removes a limit.
+# Buckets are per process unless RATE_LIMIT_STORE names a SQLite file for
+# the workers on the host to share. Behind a reverse proxy, set PROXY_COUNT to
+# the number of proxies so "ip" is the client's address from X-Forwarded-For. A limited request gets 429; when
+# MAX_CONCURRENT_WRITES are already running and WRITE_QUEUE_SIZE more are
+# waiting (each up to WRITE_QUEUE_TIMEOUT_MS), it gets 503. Both carry
+# Retry-After.
+RATE_LIMIT_ENABLED = env_int('RATE_LIMIT_ENABLED', 1)
+RATE_LIMIT_STORE = os.environ.get('RATE_LIMIT_STORE')
+PROXY_COUNT = env_int('PROXY_COUNT', 0)
+MAX_CONCURRENT_WRITES = env_int('MAX_CONCURRENT_WRITES', 16)
+WRITE_QUEUE_SIZE = env_int('WRITE_QUEUE_SIZE', 32)
+WRITE_QUEUE_TIMEOUT_MS = env_int('WRITE_QUEUE_TIMEOUT_MS', 500)
+SAFE_METHODS = frozenset(('GET', 'HEAD', 'OPTIONS'))
+
+RATE_LIMITS = {
+    'consumer.consumer_login': {'ip': '30/minute', 'account': '10/minute'},
+    'vendor.vendor_login': {'ip': '30/minute', 'account': '10/minute'},
+    'consumer.consumer_register': {'ip': '10/minute'},
+    'vendor.vendor_register': {'ip': '10/minute'},
+    'api.api_import_items': {'vendor': '10/minute'},
+    'api.api_upload_bills': {'vendor': '30/minute'},
+    'api': {'ip': '600/minute', 'user': '60/minute', 'vendor': '300/minute'},
+}
+
+def rate_limit_rules(overrides):
+    """RATE_LIMITS with `overrides` applied, as {endpoint: {key: Limit}}."""
+    rules = {endpoint: dict(limits) for endpoint, limits in RATE_LIMITS.items()}
+    for endpoint, limits in overrides.items():
+        rules.setdefault(endpoint, {}).update(limits)
+    return {
+        endpoint: {key: Limit.parse(spec) for key, spec in limits.items() if spec is not None}
+        for endpoint, limits in rules.items()
+    }
+
+RATE_LIMIT_RULES = rate_limit_rules(json.loads(os.environ.get('RATE_LIMITS_JSON') or '{}'))
+RATE_LIMITER = RateLimiter(SQLiteStore(RATE_LIMIT_STORE) if RATE_LIMIT_STORE else MemoryStore())
+WRITE_SLOTS = ConcurrencyLimiter(MAX_CONCURRENT_WRITES, WRITE_QUEUE_SIZE, WRITE_QUEUE_TIMEOUT_MS / 1000)
+
+REQUESTS_SHED = METRICS.counter(
+    'mosspay_requests_shed_total', 'Writes turned away by a rate limit or the concurrency cap.',
+    ('endpoint', 'reason'))
+METRICS.gauge(
+    'mosspay_write_requests', 'Writes running or waiting for a slot.', ('state',),
+    callback=lambda: {(state,): WRITE_SLOTS.stats()[state] for state in ('active', 'waiting')})
+
+def rate_limit_key(key):
+    """The value a limit is counted against for this request, or None when it does not apply."""
+    if key == 'ip':
+        return request.remote_addr
+    if key == 'account':
+        email = (request.form.get('email') or '').strip().lower()
+        return email or None
+    if key == 'vendor':
+        return session.get('vendor_id')
+    if key == 'user':
+        return session.get('_user_id')
+    raise ValueError(f'Unknown rate limit key {key!r}')
+
+def shed_request(reason, message, status_code, retry_after):
+    REQUESTS_SHED.inc(endpoint=request.endpoint or 'unmatched', reason=reason)
+    headers = {'Retry-After': str(retry_after)}
+    if request.blueprint == 'api':
+        return jsonify({'error': message}), status_code, headers
+    return Response(message + '\n', status=status_code, mimetype='text/plain', headers=headers)
+
+def admit_request():
+    if request.method in SAFE_METHODS:
+        return None
+    if RATE_LIMIT_ENABLED:
+        group = request.endpoint if request.endpoint in RATE_LIMIT_RULES else request.blueprint
+        for key, limit in RATE_LIMIT_RULES.get(group, {}).items():
+            value = rate_limit_key(key)
+            if value is None:
+                continue
+            retry_after = RATE_LIMITER.hit(f'{group}:{key}:{value}', limit)
+            if retry_after:
+                return shed_request(f'rate_limit_{key}', 'Too many requests. Please slow down and try again shortly.',
+                                    429, retry_after)
+    if MAX_CONCURRENT_WRITES:
+        try:
+            WRITE_SLOTS.acquire()
+        except Overloaded as e:
+            return shed_request('overloaded', str(e), 503, 1)
+        g.write_slot = True
+    return None
+
+def release_write_slot(exc):
+    if g.pop('write_slot', False):
+        WRITE_SLOTS.release()
+
 # --- MOCK DATABASES ---
 MOCK_CARBON_DB = {
     # ... (all 50 items) ...
     "Local Apples": 0.2, "Imported Apples": 0.8, "Local Potatoes": 0.1, "Local Tomatoes": 0.3, "Imported Tomatoes": 1.1, "Local Bananas": 0.4, "Imported Bananas": 0.9, "Local Onions": 0.2, "Local Carrots": 0.2, "Organic Spinach": 0.4, "Field-grown Lettuce": 0.3, "Greenhouse Lettuce": 1.2, "Lentils (1kg)": 0.9, "Chickpeas (1kg)": 1.1, "White Rice (1kg)": 2.5, "Brown Rice (1kg)": 2.0, "Oats (1kg)": 0.8, "Whole Wheat Flour (1kg)": 0.6, "White Flour (1kg)": 0.8, "Pasta (500g)": 0.7, "Canned Tomatoes": 0.5, "Canned Beans": 0.4, "Olive Oil (1L)": 3.0, "Sugar (1kg)": 1.2, "Coffee (ground, 500g)": 3.5, "Black Tea (100 bags)": 0.8, "Almond Milk (1L)": 0.7, "Soy Milk (1L)": 0.5, "Oat Milk (1L)": 0.4, "Local Cow's Milk (1L)": 1.5, "Local Cheese (500g)": 4.5, "Local Eggs (12)": 1.2, "Local Chicken (1kg)": 4.5, "Tofu (1kg)": 2.0, "Bamboo Toothbrush": 0.3, "Plastic Toothbrush": 1.5, "Bar Soap (100g)": 0.2, "Liquid Soap (250ml)": 0.8, "Recycled Toilet Paper (4 pack)": 1.0, "Regular Toilet Paper (4 pack)": 2.0, "Eco-friendly Detergent (1L)": 1.5, "Regular Detergent (1L)": 3.0, "Reusable Cleaning Cloth": 0.1, "Jute Bag": 1.5, "Organic Cotton Tote Bag": 1.2, "Reusable Coffee Cup": 1.2, "Reusable Water Bottle": 1.0, "Glass Food Container": 0.8, "Beeswax Wraps (set)": 0.4
 }
 
+# Built once at startup; add_item and bulk lookups match names against it.
+CARBON_INDEX = CarbonFactorIndex(MOCK_CARBON_DB)
+CARBON_LOOKUP_LIMIT = 5000
+
 MOCK_REWARDS_DB = {
     "gov_1": {"type": "Government Scheme", "title": "Plant a Tree in Your Name", "description": "We'll partner with a local NGO to plant a tree.", "cost": 500},
     "gov_2": {"type": "Government Scheme", "title": "Solar Panel Subsidy Voucher", "description": "Claim a voucher for an extra 5% off a solar panel installation.", "cost": 5000}
@@ -51,8 +380,11 @@ class User(db.Model, UserMixin):
     green_purchases = db.Column(db.Integer, default=5)
     eco_streak = db.Column(db.Integer, default=8)
     rank = db.Column(db.Integer, default=240)
-    def set_password(self, password): self.password_hash = generate_password_hash(password)
-    def check_password(self, password): return check_password_hash(self.password_hash, password)
+    def set_password(self, password): self.password_hash = PASSWORD_HASHER.hash(password)
+    def check_password(self, password): return PASSWORD_HASHER.verify(self.password_hash, password)
+
+# Matches the leaderboard order so top-N and keyset pages read the index in order
+db.Index('ix_user_co2_rank', User.total_co2_saved.desc(), User.id)
 
 class Vendor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -67,8 +399,8 @@ class Vendor(db.Model):
     logo_url = db.Column(db.String(300), nullable=True)
     shop_category = db.Column(db.String(100), nullable=True)
     website_url = db.Column(db.String(300), nullable=True)
-    def set_password(self, password): self.password_hash = generate_password_hash(password)
-    def check_password(self, password): return check_password_hash(self.password_hash, password)
+    def set_password(self, password): self.password_hash = PASSWORD_HASHER.hash(password)
+    def check_password(self, password): return PASSWORD_HASHER.verify(self.password_hash, password)
 
 class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -78,6 +410,11 @@ class Item(db.Model):
     stock = db.Column(db.Integer, nullable=False, default=0)
     carbon_saved_kg = db.Column(db.Float, default=0.0)
     vendor_id = db.Column(db.Integer, db.ForeignKey('vendor.id'), nullable=False)
+    low_stock_threshold = db.Column(db.Integer, nullable=False, default=10, server_default='10')
+    __table_args__ = (
+        db.Index('ix_item_vendor_stock', 'vendor_id', 'stock'),
+        db.Index('ix_item_vendor_name', 'vendor_id', 'name'),
+    )
     def __repr__(self): return f'<Item {self.name}>'
 
 class Bill(db.Model):
@@ -89,6 +426,12 @@ class Bill(db.Model):
     mosscoins_to_award = db.Column(db.Integer, default=0) 
     status = db.Column(db.String(20), default='pending') 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    client_id = db.Column(db.String(64), nullable=True)  # set by POS uploads so retries are not billed twice
+    __table_args__ = (
+        db.Index('ix_bill_customer_created', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_bill_vendor_created', 'vendor_id', 'created_at', 'id'),
+        db.Index('ux_bill_vendor_client', 'vendor_id', 'client_id', unique=True),
+    )
 
 class BillItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -97,6 +440,46 @@ class BillItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price_at_sale = db.Column(db.Float, nullable=False) 
     carbon_at_sale = db.Column(db.Float, nullable=False)
+    __table_args__ = (db.Index('ix_bill_item_bill', 'bill_id'),)
+
+# --- Sales Rollups (one row per vendor per day, maintained by create_bill) ---
+class VendorDailySales(db.Model):
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendor.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+    total_sales = db.Column(db.Float, nullable=False, default=0.0)
+    total_co2 = db.Column(db.Float, nullable=False, default=0.0)
+
+class VendorDailyCustomer(db.Model):
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendor.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    customer_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    bill_count = db.Column(db.Integer, nullable=False, default=0)
+
+class VendorDailyItem(db.Model):
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendor.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+
+class LowStockItem(db.Model):
+    # Items whose stock is at or below their low_stock_threshold, kept in step
+    # by every write that changes stock or thresholds.
+    item_id = db.Column(db.Integer, db.ForeignKey('item.id'), primary_key=True, autoincrement=False)
+    vendor_id = db.Column(db.Integer, db.ForeignKey('vendor.id'), nullable=False)
+    since = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_low_stock_item_vendor', 'vendor_id'),)
+
+class LeaderboardBucket(db.Model):
+    # Number of users whose total_co2_saved * LEADERBOARD_BUCKETS_PER_KG truncates to `bucket`
+    bucket = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_count = db.Column(db.Integer, nullable=False, default=0)
+
+class LeaderboardScore(db.Model):
+    # Number of users with exactly this total_co2_saved whose id // LEADERBOARD_ID_BLOCK is `block`
+    score = db.Column(db.Float, primary_key=True)
+    block = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_count = db.Column(db.Integer, nullable=False, default=0)
 
 class Offer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -106,34 +489,305 @@ class Offer(db.Model):
     mosscoin_cost = db.Column(db.Integer, nullable=False)
     status = db.Column(db.String(20), default='active') # active, expired
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_offer_status_vendor', 'status', 'vendor_id'),)
+
+class MossCoinLedger(db.Model):
+    # Append-only: one row per balance change; User.mosscoin_balance is the running total
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Integer, nullable=False)  # positive credit, negative debit
+    balance_after = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(30), nullable=False)  # signup_bonus, opening_balance, purchase, redemption
+    bill_id = db.Column(db.Integer, db.ForeignKey('bill.id'), nullable=True)
+    offer_id = db.Column(db.Integer, db.ForeignKey('offer.id'), nullable=True)
+    reward_id = db.Column(db.String(50), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    __table_args__ = (db.Index('ix_mosscoin_ledger_user', 'user_id', 'id'),)
+
+class CacheVersion(db.Model):
+    # Bumped whenever a cached dataset changes so every worker can tell its copy is stale
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+class SchemaVersion(db.Model):
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+# --- Full-Text Search Index (SQLite FTS5) ---
+# One row per item (rowid = 2 * item.id) and one per vendor profile
+# (rowid = 2 * vendor.id + 1), kept in sync by triggers so every write path,
+# including bulk statements, updates the index.
+SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS vendor_search USING fts5(
+        vendor_id UNINDEXED, name, business_name, shop_category, description,
+        tokenize = 'porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_ai AFTER INSERT ON item BEGIN
+        INSERT INTO vendor_search(rowid, vendor_id, name) VALUES (new.id * 2, new.vendor_id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_ad AFTER DELETE ON item BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_au AFTER UPDATE OF name, vendor_id ON item BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2;
+        INSERT INTO vendor_search(rowid, vendor_id, name) VALUES (new.id * 2, new.vendor_id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_ai AFTER INSERT ON vendor BEGIN
+        INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description)
+        VALUES (new.id * 2 + 1, new.id, new.business_name, new.shop_category, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_ad AFTER DELETE ON vendor BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_au AFTER UPDATE OF business_name, shop_category, description ON vendor BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2 + 1;
+        INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description)
+        VALUES (new.id * 2 + 1, new.id, new.business_name, new.shop_category, new.description);
+    END""",
+]
+for statement in SEARCH_INDEX_DDL:
+    event.listen(db.metadata, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+
+# --- Request Identity ---
+# The signed-in user and vendor are each loaded at most once per request:
+# Flask-Login keeps current_user on g, and current_vendor() does the same for
+# session['vendor_id']. With IDENTITY_CACHE_SECONDS > 0 the rows also come
+# from a short-lived per-process cache, so most requests skip the lookup.
+IDENTITY_CACHE_SECONDS = env_int('IDENTITY_CACHE_SECONDS', 0)
+IDENTITY_CACHE_SIZE = env_int('IDENTITY_CACHE_SIZE', 10000)
+
+class IdentityCache:
+    """Column snapshots of recently loaded users/vendors, keyed by (model, id).
+
+    Hits are merged into the current session without a query, so they behave
+    like normally loaded rows. Entries are dropped by forget() (and again when
+    the forgetting transaction commits); other workers may serve the old row
+    until its TTL runs out.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    def get(self, model, ident):
+        if not self.ttl:
+            return db.session.get(model, ident)
+        key = (model.__name__, ident)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            instance = model(**entry[1])
+            make_transient_to_detached(instance)
+            return db.session.merge(instance, load=False)
+        instance = db.session.get(model, ident)
+        if instance is not None:
+            snapshot = {attr.key: getattr(instance, attr.key) for attr in db.inspect(model).column_attrs}
+            with self._lock:
+                if len(self._entries) >= self.max_size:
+                    self._entries.clear()
+                self._entries[key] = (time.monotonic() + self.ttl, snapshot)
+        return instance
+
+    def forget(self, model, ident):
+        if not self.ttl:
+            return
+        key = (model.__name__, ident)
+        self.discard([key])
+        db.session.info.setdefault('forget_identities', set()).add(key)
+
+    def discard(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+IDENTITY_CACHE = IdentityCache(IDENTITY_CACHE_SECONDS, IDENTITY_CACHE_SIZE)
+
+@event.listens_for(Session, 'after_commit')
+def forget_committed_identities(session):
+    IDENTITY_CACHE.discard(session.info.pop('forget_identities', ()))
+
+def hashing_busy(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
+
+def upgrade_password_hash(account, password):
+    """After a successful login, re-hash the password if the hashing method or cost changed."""
+    if not PASSWORD_HASHER.needs_rehash(account.password_hash):
+        return
+    try:
+        account.set_password(password)
+    except HashingBusy:
+        return  # try again at the next login
+    IDENTITY_CACHE.forget(type(account), account.id)
+    db.session.commit()
 
 # --- Required function for Flask-Login (FOR CUSTOMERS) ---
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return IDENTITY_CACHE.get(User, int(user_id))
+
+def current_vendor():
+    """The signed-in vendor, or None. Loaded once per request and kept on g."""
+    if 'vendor' not in g:
+        vendor_id = session.get('vendor_id')
+        g.vendor = IDENTITY_CACHE.get(Vendor, vendor_id) if vendor_id is not None else None
+    return g.vendor
+
+def vendor_required(view):
+    """Page routes: send signed-out vendors to the login page. Sets g.vendor_id."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'vendor_id' not in session:
+            flash('You must be logged in to see this page.')
+            return redirect(url_for('vendor.vendor_login'))
+        g.vendor_id = session['vendor_id']
+        return view(*args, **kwargs)
+    return wrapped
+
+def vendor_api_required(view):
+    """API routes: answer 401 unless a vendor is signed in. Sets g.vendor_id."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if 'vendor_id' not in session:
+            return jsonify({'error': 'Not authorized'}), 401
+        g.vendor_id = session['vendor_id']
+        return view(*args, **kwargs)
+    return wrapped
+
+# --- Keyset Pagination ---
+# Pages are addressed by an opaque cursor holding the sort key of the last row
+# shown, so page N costs the same indexed range scan as page 1.
+PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+def encode_cursor(values):
+    values = [value.isoformat() if isinstance(value, (datetime, date)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_cursor(token, columns):
+    """Turn a cursor token back into sort values; raises ValueError if it is malformed."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor.')
+    if not isinstance(values, list) or len(values) != len(columns):
+        raise ValueError('Invalid cursor.')
+    decoded = []
+    for (column, _), value in zip(columns, values):
+        if value is not None:
+            value = decode_cursor_value(column.type.python_type, value)
+        decoded.append(value)
+    return decoded
+
+def decode_cursor_value(python_type, value):
+    # A cursor comes from the client, so check each value against its column's type.
+    if python_type in (datetime, date):
+        if not isinstance(value, str):
+            raise ValueError('Invalid cursor.')
+        try:
+            return python_type.fromisoformat(value)
+        except ValueError:
+            raise ValueError('Invalid cursor.')
+    accepted = (int, float) if python_type is float else (python_type,)
+    if isinstance(value, bool) or not isinstance(value, accepted):
+        raise ValueError('Invalid cursor.')
+    return value
+
+def keyset_page(query, columns, cursor=None, limit=PAGE_SIZE, key=None):
+    """Return (rows, next_cursor) for `query` ordered by `columns`.
+
+    `columns` is a list of (column, descending) pairs ending in a unique
+    column; `key` extracts those values from a result row for the cursor.
+    """
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in columns])
+    if cursor:
+        values = decode_cursor(cursor, columns)
+        # The leading bound is redundant with the OR chain below but gives the
+        # planner an index range to seek to instead of walking from the start.
+        first_column, first_descending = columns[0]
+        query = query.filter(first_column <= values[0] if first_descending else first_column >= values[0])
+        after = None
+        for position in reversed(range(len(columns))):
+            column, descending = columns[position]
+            condition = column < values[position] if descending else column > values[position]
+            if after is not None:
+                condition = condition | ((column == values[position]) & after)
+            after = condition
+        query = query.filter(after)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(key(rows[-1]))
+    return rows, next_cursor
+
+def page_args():
+    """Read ?cursor= and ?limit= from the request."""
+    try:
+        limit = int(request.args.get('limit', PAGE_SIZE))
+    except ValueError:
+        limit = PAGE_SIZE
+    return request.args.get('cursor') or None, max(1, min(limit, MAX_PAGE_SIZE))
+
+def bill_to_dict(bill):
+    return {
+        'id': bill.id,
+        'vendor_id': bill.vendor_id,
+        'customer_id': bill.customer_id,
+        'total_amount': bill.total_amount,
+        'total_carbon_saved': bill.total_carbon_saved,
+        'mosscoins_to_award': bill.mosscoins_to_award,
+        'status': bill.status,
+        'created_at': bill.created_at.isoformat()
+    }
+
+def item_to_dict(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'price': item.price,
+        'unit': item.unit,
+        'stock': item.stock,
+        'carbon_saved_kg': item.carbon_saved_kg
+    }
+
+def vendor_to_dict(vendor):
+    return {
+        'id': vendor.id,
+        'business_name': vendor.business_name,
+        'shop_category': vendor.shop_category,
+        'description': vendor.description,
+        'logo_url': vendor.logo_url
+    }
 
 # --- FLASK ROUTES ---
-@app.route('/')
 def welcome_page():
     return render_template('index.html')
 
 # --- Customer Routes ---
 # ... (all customer routes are unchanged) ...
-@app.route('/consumer/login', methods=['GET', 'POST'])
+@consumer_bp.route('/consumer/login', methods=['GET', 'POST'])
 def consumer_login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         user = User.query.filter_by(email=email).first()
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except HashingBusy as e:
+            flash(str(e))
+            return redirect(url_for('consumer.consumer_login'))
+        if valid:
+            upgrade_password_hash(user, password)
             login_user(user)
-            return redirect(url_for('consumer_dashboard'))
+            return redirect(url_for('consumer.consumer_dashboard'))
         else:
             flash('Invalid email or password. Please try again.')
-            return redirect(url_for('consumer_login'))
+            return redirect(url_for('consumer.consumer_login'))
     return render_template('consumer_login.html')
 
-@app.route('/consumer/register', methods=['GET', 'POST'])
+@consumer_bp.route('/consumer/register', methods=['GET', 'POST'])
 def consumer_register():
     if request.method == 'POST':
         fullname = request.form.get('fullname')
@@ -144,15 +798,15 @@ def consumer_register():
         confirm_password = request.form.get('confirm-password')
         if password != confirm_password:
             flash("Passwords do not match. Please try again.")
-            return redirect(url_for('consumer_register'))
+            return redirect(url_for('consumer.consumer_register'))
         existing_user = User.query.filter_by(email=email).first()
         if existing_user:
             flash("An account with this email already exists.")
-            return redirect(url_for('consumer_register'))
+            return redirect(url_for('consumer.consumer_register'))
         existing_phone = User.query.filter_by(phone=phone).first()
         if existing_phone:
             flash("An account with this phone number already exists.")
-            return redirect(url_for('consumer_register'))
+            return redirect(url_for('consumer.consumer_register'))
         try:
             new_user = User(
                 fullname=fullname,
@@ -162,17 +816,23 @@ def consumer_register():
             )
             new_user.set_password(password)
             db.session.add(new_user)
+            db.session.flush()
+            move_leaderboard_score(new_user.id, None, new_user.total_co2_saved)
+            db.session.add(MossCoinLedger(
+                user_id=new_user.id, amount=new_user.mosscoin_balance,
+                balance_after=new_user.mosscoin_balance, reason='signup_bonus'
+            ))
             db.session.commit()
             flash("User registered successfully!")
-            return redirect(url_for('consumer_login'))
+            return redirect(url_for('consumer.consumer_login'))
         except Exception as e:
             flash(f"An error occurred: {e}")
             db.session.rollback()
-            return redirect(url_for('consumer_register'))
+            return redirect(url_for('consumer.consumer_register'))
     return render_template('consumer_register.html')
 
 
-@app.route('/consumer/dashboard')
+@consumer_bp.route('/consumer/dashboard')
 @login_required 
 def consumer_dashboard():
     GOAL_CO2 = 100.0 
@@ -182,32 +842,184 @@ def consumer_dashboard():
     return render_template(
         'consumer_dashboard.html', 
         user=current_user,
+        rank=leaderboard_rank(current_user.total_co2_saved, current_user.id),
         growth_percent=growth_percent,
         trees_planted=trees_planted
     )
 
-@app.route('/logout')
+@consumer_bp.route('/logout')
 @login_required
 def logout():
     logout_user()
     flash("You have been logged out.")
-    return redirect(url_for('consumer_login'))
+    return redirect(url_for('consumer.consumer_login'))
 
-@app.route('/consumer/log_purchase')
-@login_required
-def log_purchase():
-    bills = db.session.query(
+BILL_ORDER = [(Bill.created_at, True), (Bill.id, True)]
+
+def customer_bills_page(cursor, limit):
+    query = db.session.query(
         Bill, Vendor.business_name
     ).join(
         Vendor, Bill.vendor_id == Vendor.id
     ).filter(
         Bill.customer_id == current_user.id
-    ).order_by(
-        Bill.created_at.desc()
-    ).all()
-    return render_template('log_purchase.html', bills=bills)
+    )
+    return keyset_page(query, BILL_ORDER, cursor, limit, key=lambda row: (row[0].created_at, row[0].id))
+
+@consumer_bp.route('/consumer/log_purchase')
+@login_required
+def log_purchase():
+    cursor, limit = page_args()
+    try:
+        bills, next_cursor = customer_bills_page(cursor, limit)
+    except ValueError:
+        return redirect(url_for('consumer.log_purchase'))
+    return render_template('log_purchase.html', bills=bills, next_cursor=next_cursor)
+
+@api_bp.route('/api/consumer/bills')
+@login_required
+def api_consumer_bills():
+    cursor, limit = page_args()
+    try:
+        bills, next_cursor = customer_bills_page(cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'bills': [dict(bill_to_dict(bill), vendor_name=vendor_name) for bill, vendor_name in bills],
+        'next_cursor': next_cursor
+    }), 200
+
+# --- Live Events ---
+# Server-sent event streams: /api/consumer/bill-events carries the signed-in
+# customer's new and logged bills, so log_purchase updates without a reload,
+# and /api/vendor/stock-events carries low-stock alerts to the vendor
+# dashboard. Streams hold no database connection while idle and send a
+# comment every EVENT_STREAM_HEARTBEAT_SECONDS to keep proxies from closing
+# them. With EVENT_RELAY_PATH set, as gunicorn.conf.py does, events published
+# on one worker reach streams open on the others through a shared SQLite
+# file; otherwise they stay in this process.
+#
+# gunicorn's default gevent workers hold an idle stream as one greenlet, so a
+# worker keeps thousands open. On thread workers every open stream holds a
+# thread, so gunicorn.conf.py caps EVENT_STREAM_MAX_SUBSCRIBERS well below
+# the thread count. Past the cap a stream is refused with 503 and the page
+# polls instead, and each stream ends after EVENT_STREAM_MAX_SECONDS so the
+# slots go round the clients that want them.
+EVENT_STREAM_HEARTBEAT_SECONDS = env_int('EVENT_STREAM_HEARTBEAT_SECONDS', 25)
+EVENT_STREAM_RETRY_MS = env_int('EVENT_STREAM_RETRY_MS', 5000)
+EVENT_STREAM_MAX_SECONDS = env_int('EVENT_STREAM_MAX_SECONDS', 300)
+EVENT_STREAM_POLL_SECONDS = env_int('EVENT_STREAM_POLL_SECONDS', 30)
+EVENT_RELAY_PATH = os.environ.get('EVENT_RELAY_PATH')
+EVENTS = EventHub(
+    max_subscribers=env_int('EVENT_STREAM_MAX_SUBSCRIBERS', 5000),
+    max_pending=env_int('EVENT_STREAM_MAX_PENDING', 100),
+    relay=SQLiteRelay(EVENT_RELAY_PATH) if EVENT_RELAY_PATH else None
+)
+METRICS.gauge(
+    'mosspay_event_subscribers', 'Open server-sent event streams.',
+    callback=lambda: {(): EVENTS.subscriber_count})
+
+def customer_channel(customer_id):
+    return f'customer:{customer_id}'
+
+def vendor_channel(vendor_id):
+    return f'vendor:{vendor_id}'
+
+def format_sse(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n'
+
+def event_stream(channel):
+    """A text/event-stream response relaying events published to `channel`."""
+    try:
+        subscription = EVENTS.subscribe(channel)
+    except HubFull:
+        return jsonify({'error': 'Too many open event streams, try again shortly.'}), 503, {
+            'Retry-After': str(EVENT_STREAM_POLL_SECONDS)}
+    # Give the connection back to the pool; the stream itself never queries.
+    db.session.remove()
+
+    def stream():
+        try:
+            # A reconnecting client may have missed events, so it refetches its data.
+            yield f'retry: {EVENT_STREAM_RETRY_MS}\nevent: ready\ndata: {{}}\n\n'
+            closes_at = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+            while True:
+                remaining = closes_at - time.monotonic()
+                if remaining <= 0:
+                    return  # the browser reconnects after `retry` and resyncs on "ready"
+                published = subscription.get(min(EVENT_STREAM_HEARTBEAT_SECONDS, remaining))
+                if subscription.overflowed:
+                    subscription.overflowed = False
+                    yield 'event: resync\ndata: {}\n\n'
+                elif published is None:
+                    yield ': keep-alive\n\n'
+                else:
+                    yield format_sse(*published)
+        finally:
+            subscription.close()
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # stop nginx from buffering the stream
+    return response
+
+@api_bp.route('/api/consumer/bill-events')
+@login_required
+def api_bill_events():
+    return event_stream(customer_channel(current_user.id))
 
-@app.route('/api/consumer/log-purchase', methods=['POST'])
+def publish_bills_logged(bill_ids):
+    """Tell the customer's other open pages that these bills were logged (call after commit)."""
+    EVENTS.publish(customer_channel(current_user.id), 'bills_logged', {
+        'bill_ids': bill_ids,
+        'new_balance': current_user.mosscoin_balance,
+        'new_co2_saved': current_user.total_co2_saved
+    })
+
+# --- MossCoin Ledger ---
+class InsufficientMossCoins(Exception):
+    pass
+
+def change_mosscoins(user, amount, reason, bill_id=None, offer_id=None, reward_id=None,
+                     entries=None, **counters):
+    """Add `amount` (negative to debit) to the user's balance and append it to the ledger.
+
+    The balance, plus any extra User `counters` to increment, changes in one
+    conditional UPDATE, so concurrent debits can never overdraw or lose an
+    update. `entries` optionally splits the change into several ledger rows
+    (dicts with an amount and bill_id/offer_id/reward_id). Raises
+    InsufficientMossCoins. The caller commits.
+    """
+    columns = ['mosscoin_balance'] + list(counters)
+    values = {'mosscoin_balance': User.mosscoin_balance + amount}
+    values.update({name: getattr(User, name) + delta for name, delta in counters.items()})
+    statement = update(User).where(User.id == user.id)
+    if amount < 0:
+        statement = statement.where(User.mosscoin_balance >= -amount)
+    row = db.session.execute(
+        statement.values(values)
+        .returning(*[getattr(User, name) for name in columns])
+        .execution_options(synchronize_session=False)
+    ).first()
+    if row is None:
+        raise InsufficientMossCoins()
+    IDENTITY_CACHE.forget(User, user.id)
+    for name, value in zip(columns, row):
+        set_committed_value(user, name, value)
+    if entries is None:
+        entries = [{'amount': amount, 'bill_id': bill_id, 'offer_id': offer_id, 'reward_id': reward_id}]
+    balance = row[0] - amount
+    ledger_rows = []
+    for entry in entries:
+        balance += entry['amount']
+        ledger_rows.append(dict(
+            {'bill_id': None, 'offer_id': None, 'reward_id': None}, **entry,
+            user_id=user.id, balance_after=balance, reason=reason, created_at=datetime.utcnow()
+        ))
+    db.session.execute(insert(MossCoinLedger), ledger_rows)
+    return row[0]
+
+@api_bp.route('/api/consumer/log-purchase', methods=['POST'])
 @login_required
 def api_log_purchase():
     data = request.json
@@ -222,11 +1034,28 @@ def api_log_purchase():
     if bill.status == 'logged':
         return jsonify({'error': 'This bill has already been logged.'}), 400
     try:
-        current_user.mosscoin_balance += bill.mosscoins_to_award
-        current_user.total_co2_saved += bill.total_carbon_saved
-        current_user.green_purchases += 1
-        bill.status = 'logged'
+        # Claiming the bill takes the write lock, so two requests for the same
+        # bill cannot both be credited.
+        claimed = db.session.execute(
+            update(Bill)
+            .where(Bill.id == bill.id, Bill.status == 'pending')
+            .values(status='logged')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not claimed:
+            db.session.rollback()
+            return jsonify({'error': 'This bill has already been logged.'}), 400
+        old_co2_saved = db.session.query(User.total_co2_saved).filter(
+            User.id == current_user.id
+        ).with_for_update().scalar()
+        change_mosscoins(
+            current_user, bill.mosscoins_to_award, 'purchase', bill_id=bill.id,
+            total_co2_saved=bill.total_carbon_saved, green_purchases=1
+        )
+        move_leaderboard_score(current_user.id, old_co2_saved, current_user.total_co2_saved)
+        current_user.rank = leaderboard_rank(current_user.total_co2_saved, current_user.id)
         db.session.commit()
+        publish_bills_logged([bill.id])
         return jsonify({
             'message': 'Purchase logged!',
             'new_balance': current_user.mosscoin_balance,
@@ -236,34 +1065,363 @@ def api_log_purchase():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/consumer/discover_vendors')
+SETTLEMENT_LIMIT = 500
+
+@api_bp.route('/api/consumer/log-purchases', methods=['POST'])
+@login_required
+def api_log_purchases():
+    """Settle pending bills in one transaction: the given bill_ids, or else up to
+    SETTLEMENT_LIMIT of them, oldest first. remaining_count says how many are
+    still pending, so a client settling everything calls again until it is 0."""
+    bill_ids = (request.json or {}).get('bill_ids')
+    if bill_ids is not None:
+        try:
+            bill_ids = list(dict.fromkeys(int(bill_id) for bill_id in bill_ids))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'bill_ids must be a list of bill IDs.'}), 400
+        if len(bill_ids) > SETTLEMENT_LIMIT:
+            return jsonify({'error': f'At most {SETTLEMENT_LIMIT} bills per request.'}), 400
+        if not bill_ids:
+            return jsonify({'error': 'Missing bill IDs.'}), 400
+    try:
+        pending = (Bill.customer_id == current_user.id, Bill.status == 'pending')
+        claim = update(Bill).where(*pending)
+        if bill_ids is not None:
+            claim = claim.where(Bill.id.in_(bill_ids))
+        else:
+            claim = claim.where(Bill.id.in_(
+                db.select(Bill.id).where(*pending).order_by(Bill.id).limit(SETTLEMENT_LIMIT)))
+        claimed = db.session.execute(
+            claim.values(status='logged')
+            .returning(Bill.id, Bill.mosscoins_to_award, Bill.total_carbon_saved)
+            .execution_options(synchronize_session=False)
+        ).all()
+        claimed.sort()
+        results = [{
+            'bill_id': claimed_id, 'status': 'logged',
+            'mosscoins_awarded': coins, 'co2_saved': carbon
+        } for claimed_id, coins, carbon in claimed]
+        if claimed:
+            total_co2 = sum(carbon for _, _, carbon in claimed)
+            old_co2_saved = db.session.query(User.total_co2_saved).filter(
+                User.id == current_user.id
+            ).with_for_update().scalar()
+            change_mosscoins(
+                current_user, sum(coins for _, coins, _ in claimed), 'purchase',
+                entries=[{'amount': coins, 'bill_id': claimed_id} for claimed_id, coins, _ in claimed],
+                total_co2_saved=total_co2, green_purchases=len(claimed)
+            )
+            move_leaderboard_score(current_user.id, old_co2_saved, current_user.total_co2_saved)
+            current_user.rank = leaderboard_rank(current_user.total_co2_saved, current_user.id)
+        if bill_ids is not None and len(claimed) < len(bill_ids):
+            claimed_ids = {claimed_id for claimed_id, _, _ in claimed}
+            unclaimed = [bill_id for bill_id in bill_ids if bill_id not in claimed_ids]
+            found = dict(db.session.query(Bill.id, Bill.customer_id).filter(Bill.id.in_(unclaimed)).all())
+            for bill_id in unclaimed:
+                if bill_id not in found:
+                    error = 'Bill not found.'
+                elif found[bill_id] != current_user.id:
+                    error = 'Not authorized.'
+                else:
+                    error = 'This bill has already been logged.'
+                results.append({'bill_id': bill_id, 'status': 'error', 'error': error})
+        remaining = 0
+        if bill_ids is None and len(claimed) == SETTLEMENT_LIMIT:
+            remaining = db.session.query(func.count(Bill.id)).filter(*pending).scalar()
+        db.session.commit()
+        if claimed:
+            publish_bills_logged([claimed_id for claimed_id, _, _ in claimed])
+        return jsonify({
+            'message': f'Logged {len(claimed)} purchase(s)!',
+            'logged_count': len(claimed),
+            'remaining_count': remaining,
+            'results': results,
+            'new_balance': current_user.mosscoin_balance,
+            'new_co2_saved': current_user.total_co2_saved
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/consumer/mosscoin-ledger')
+@login_required
+def api_mosscoin_ledger():
+    cursor, limit = page_args()
+    try:
+        entries, next_cursor = keyset_page(
+            MossCoinLedger.query.filter_by(user_id=current_user.id),
+            [(MossCoinLedger.id, True)], cursor, limit, key=lambda entry: (entry.id,)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'balance': current_user.mosscoin_balance,
+        'entries': [{
+            'id': entry.id,
+            'amount': entry.amount,
+            'balance_after': entry.balance_after,
+            'reason': entry.reason,
+            'bill_id': entry.bill_id,
+            'offer_id': entry.offer_id,
+            'reward_id': entry.reward_id,
+            'created_at': entry.created_at.isoformat()
+        } for entry in entries],
+        'next_cursor': next_cursor
+    }), 200
+
+# --- Search ---
+SEARCH_RESULT_LIMIT = 100
+SUGGESTION_LIMIT = 8
+# Only the best-scoring matches are grouped into vendors, which bounds the
+# work for very common terms.
+SEARCH_SCAN_LIMIT = 5000
+# bm25 column weights: vendor_id, name, business_name, shop_category, description
+SEARCH_WEIGHTS = 'bm25(vendor_search, 0.0, 2.0, 4.0, 2.0, 1.0)'
+
+def search_index_available():
+    return db.engine.dialect.name == 'sqlite'
+
+def fts_query(search_term, prefix=False):
+    """Turn free text into an FTS5 MATCH expression, or None if it has no words."""
+    words = re.findall(r'\w+', search_term or '')
+    if not words:
+        return None
+    suffix = '*' if prefix else ''
+    return ' '.join(f'"{word}"{suffix}' for word in words)
+
+def search_vendors(search_term, limit=SEARCH_RESULT_LIMIT):
+    """Vendors whose profile or items match search_term, most relevant first."""
+    if not search_index_available():
+        vendor_ids = db.session.query(Item.vendor_id).filter(
+            Item.name.ilike(f'%{search_term}%')
+        ).distinct().limit(limit)
+        return Vendor.query.filter(Vendor.id.in_(vendor_ids)).all()
+    match = fts_query(search_term)
+    if not match:
+        return []
+    ranked_ids = [row.vendor_id for row in db.session.execute(text(
+        f"SELECT vendor_id, MIN(score) AS best FROM ("
+        f"SELECT vendor_id, {SEARCH_WEIGHTS} AS score FROM vendor_search WHERE vendor_search MATCH :match "
+        "ORDER BY score LIMIT :scan_limit"
+        ") GROUP BY vendor_id ORDER BY best LIMIT :limit"
+    ), {'match': match, 'scan_limit': SEARCH_SCAN_LIMIT, 'limit': limit})]
+    vendors = {vendor.id: vendor for vendor in Vendor.query.filter(Vendor.id.in_(ranked_ids))}
+    return [vendors[v_id] for v_id in ranked_ids if v_id in vendors]
+
+def search_suggestions(search_term, limit=SUGGESTION_LIMIT):
+    """Prefix-matched item and vendor names for the typeahead box."""
+    if not search_index_available():
+        items = db.session.query(Item.name, Item.vendor_id, Vendor.business_name).join(
+            Vendor, Item.vendor_id == Vendor.id
+        ).filter(Item.name.ilike(f'{search_term}%')).limit(limit).all()
+        return [{'type': 'item', 'name': name, 'vendor_id': v_id, 'vendor_name': vendor_name}
+                for name, v_id, vendor_name in items]
+    match = fts_query(search_term, prefix=True)
+    if not match:
+        return []
+    rows = db.session.execute(text(
+        f"SELECT rowid, vendor_id, name, business_name FROM vendor_search "
+        f"WHERE vendor_search MATCH :match ORDER BY {SEARCH_WEIGHTS} LIMIT :limit"
+    ), {'match': match, 'limit': limit}).all()
+    vendor_names = dict(db.session.query(Vendor.id, Vendor.business_name).filter(
+        Vendor.id.in_({row.vendor_id for row in rows})
+    ).all())
+    suggestions = []
+    for row in rows:
+        is_item = row.rowid % 2 == 0
+        suggestions.append({
+            'type': 'item' if is_item else 'vendor',
+            'name': row.name if is_item else row.business_name,
+            'vendor_id': row.vendor_id,
+            'vendor_name': vendor_names.get(row.vendor_id)
+        })
+    return suggestions
+
+@consumer_bp.route('/consumer/discover_vendors')
 @login_required
 def discover_vendors():
     search_term = request.args.get('q')
+    next_cursor = None
     if search_term:
-        vendor_ids = db.session.query(Item.vendor_id).filter(
-            Item.name.ilike(f'%{search_term}%')
-        ).distinct().all()
-        vendor_id_list = [v_id[0] for v_id in vendor_ids]
-        vendors = Vendor.query.filter(Vendor.id.in_(vendor_id_list)).all()
+        vendors = search_vendors(search_term)
     else:
-        vendors = Vendor.query.all()
-    return render_template('discover_vendors.html', vendors=vendors, search_term=search_term)
+        cursor, limit = page_args()
+        try:
+            vendors, next_cursor = vendors_page(cursor, limit)
+        except ValueError:
+            return redirect(url_for('consumer.discover_vendors'))
+    return render_template('discover_vendors.html', vendors=vendors, search_term=search_term, next_cursor=next_cursor)
+
+def vendors_page(cursor, limit):
+    return keyset_page(Vendor.query, [(Vendor.id, False)], cursor, limit, key=lambda vendor: (vendor.id,))
+
+@api_bp.route('/api/consumer/vendors')
+@login_required
+def api_vendors():
+    search_term = request.args.get('q', '').strip()
+    if search_term:
+        # Relevance-ranked results are capped at SEARCH_RESULT_LIMIT, not paged.
+        return jsonify({'vendors': [vendor_to_dict(v) for v in search_vendors(search_term)], 'next_cursor': None}), 200
+    cursor, limit = page_args()
+    try:
+        vendors, next_cursor = vendors_page(cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'vendors': [vendor_to_dict(v) for v in vendors], 'next_cursor': next_cursor}), 200
+
+@api_bp.route('/api/consumer/search-suggestions')
+@login_required
+def api_search_suggestions():
+    search_term = request.args.get('q', '').strip()
+    if not search_term:
+        return jsonify({'suggestions': []}), 200
+    return jsonify({'suggestions': search_suggestions(search_term)}), 200
 
-@app.route('/vendor_profile/<int:vendor_id>')
+@consumer_bp.route('/vendor_profile/<int:vendor_id>')
 @login_required
 def vendor_profile(vendor_id):
     vendor = Vendor.query.get_or_404(vendor_id)
-    items = Item.query.filter_by(vendor_id=vendor.id).all()
-    return render_template('vendor_profile.html', vendor=vendor, items=items)
+    cursor, limit = page_args()
+    try:
+        items, next_cursor = vendor_items_page(vendor.id, cursor, limit)
+    except ValueError:
+        return redirect(url_for('consumer.vendor_profile', vendor_id=vendor.id))
+    return render_template('vendor_profile.html', vendor=vendor, items=items, next_cursor=next_cursor)
+
+def vendor_items_page(vendor_id, cursor, limit):
+    return keyset_page(Item.query.filter_by(vendor_id=vendor_id), [(Item.id, False)], cursor, limit,
+                       key=lambda item: (item.id,))
+
+@api_bp.route('/api/consumer/vendors/<int:vendor_id>/items')
+@login_required
+def api_vendor_items(vendor_id):
+    cursor, limit = page_args()
+    try:
+        items, next_cursor = vendor_items_page(vendor_id, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'items': [item_to_dict(item) for item in items], 'next_cursor': next_cursor}), 200
+
+# --- Leaderboard ---
+# Ranks are positions in (total_co2_saved desc, id asc) order. Instead of
+# sorting the user table, two histograms are adjusted whenever a score
+# changes: LeaderboardBucket counts users per 1/16 kg of score and
+# LeaderboardScore per exact score and block of LEADERBOARD_ID_BLOCK ids. A
+# rank is the sum of the buckets above, the score rows above the user's
+# inside their bucket, the blocks of users tied with them on lower ids, and
+# an indexed count of at most one block of ids. So it costs the same however
+# many users share a score, as every new user does at the default. A power of
+# two keeps score * 16 exact, so Python and SQL agree on every bucket boundary.
+LEADERBOARD_BUCKETS_PER_KG = 16
+LEADERBOARD_ID_BLOCK = 1024
+LEADERBOARD_SIZE = 50
+LEADERBOARD_NEIGHBOURS = 2
+
+def leaderboard_bucket(score):
+    return int((score or 0) * LEADERBOARD_BUCKETS_PER_KG)
+
+def move_leaderboard_score(user_id, old_score, new_score):
+    """Record that a user's score went from old_score to new_score (None = new user)."""
+    new_score = new_score or 0
+    block = user_id // LEADERBOARD_ID_BLOCK
+    if old_score is not None:
+        old_score = old_score or 0
+        if old_score == new_score:
+            return
+        upsert_add(LeaderboardScore, [{'score': old_score, 'block': block, 'user_count': -1}], ('user_count',))
+        LeaderboardScore.query.filter(
+            LeaderboardScore.score == old_score, LeaderboardScore.block == block, LeaderboardScore.user_count <= 0
+        ).delete(synchronize_session=False)
+    upsert_add(LeaderboardScore, [{'score': new_score, 'block': block, 'user_count': 1}], ('user_count',))
+    old_bucket = None if old_score is None else leaderboard_bucket(old_score)
+    new_bucket = leaderboard_bucket(new_score)
+    if old_bucket != new_bucket:
+        upsert_add(LeaderboardBucket, [{'bucket': new_bucket, 'user_count': 1}] + (
+            [{'bucket': old_bucket, 'user_count': -1}] if old_bucket is not None else []
+        ), ('user_count',))
+
+def leaderboard_rank(score, user_id):
+    """1-based leaderboard position of the user with this score and id."""
+    score = score or 0
+    bucket = leaderboard_bucket(score)
+    block = user_id // LEADERBOARD_ID_BLOCK
+    above_buckets = db.session.query(
+        func.coalesce(func.sum(LeaderboardBucket.user_count), 0)
+    ).filter(LeaderboardBucket.bucket > bucket).scalar()
+    higher_in_bucket = db.session.query(func.coalesce(func.sum(LeaderboardScore.user_count), 0)).filter(
+        LeaderboardScore.score > score, LeaderboardScore.score < (bucket + 1) / LEADERBOARD_BUCKETS_PER_KG
+    ).scalar()
+    tied_in_blocks_ahead = db.session.query(func.coalesce(func.sum(LeaderboardScore.user_count), 0)).filter(
+        LeaderboardScore.score == score, LeaderboardScore.block < block
+    ).scalar()
+    tied_in_block_ahead = db.session.query(func.count(User.id)).filter(
+        User.total_co2_saved == score, User.id >= block * LEADERBOARD_ID_BLOCK, User.id < user_id
+    ).scalar()
+    return 1 + above_buckets + higher_in_bucket + tied_in_blocks_ahead + tied_in_block_ahead
+
+def leaderboard_neighbours(user, count=LEADERBOARD_NEIGHBOURS):
+    """Return [(rank, user)] for `count` users either side of `user`, plus the user."""
+    score = user.total_co2_saved or 0
+    rank = leaderboard_rank(score, user.id)
+    # Tied users first, then the next scores, each as its own index seek: one
+    # query with an OR would walk every tied user on the wrong side of the user.
+    above = User.query.filter(
+        User.total_co2_saved == score, User.id < user.id
+    ).order_by(User.id.desc()).limit(count).all()
+    if len(above) < count:
+        above += User.query.filter(User.total_co2_saved > score).order_by(
+            User.total_co2_saved.asc(), User.id.desc()
+        ).limit(count - len(above)).all()
+    below = User.query.filter(
+        User.total_co2_saved == score, User.id > user.id
+    ).order_by(User.id.asc()).limit(count).all()
+    if len(below) < count:
+        below += User.query.filter(User.total_co2_saved < score).order_by(
+            User.total_co2_saved.desc(), User.id.asc()
+        ).limit(count - len(below)).all()
+    window = list(reversed(above)) + [user] + below
+    first_rank = rank - len(above)
+    return [(first_rank + offset, neighbour) for offset, neighbour in enumerate(window)]
+
+LEADERBOARD_ORDER = [(User.total_co2_saved, True), (User.id, False)]
+
+def leaderboard_page(cursor, limit):
+    """Return (first_rank, users, next_cursor) for one page of the leaderboard."""
+    users, next_cursor = keyset_page(User.query, LEADERBOARD_ORDER, cursor, limit,
+                                     key=lambda user: (user.total_co2_saved, user.id))
+    first_rank = leaderboard_rank(users[0].total_co2_saved, users[0].id) if users and cursor else 1
+    return first_rank, users, next_cursor
 
-@app.route('/consumer/leaderboard')
+@consumer_bp.route('/consumer/leaderboard')
 @login_required
 def leaderboard():
-    ranked_users = User.query.order_by(User.total_co2_saved.desc()).all()
-    return render_template('leaderboard.html', users=ranked_users)
+    cursor, _ = page_args()
+    try:
+        first_rank, ranked_users, next_cursor = leaderboard_page(cursor, LEADERBOARD_SIZE)
+    except ValueError:
+        return redirect(url_for('consumer.leaderboard'))
+    neighbours = leaderboard_neighbours(current_user)
+    return render_template('leaderboard.html', users=ranked_users, first_rank=first_rank,
+                           next_cursor=next_cursor, neighbours=neighbours, me=current_user)
+
+@api_bp.route('/api/consumer/leaderboard')
+@login_required
+def api_leaderboard():
+    cursor, limit = page_args()
+    try:
+        first_rank, ranked_users, next_cursor = leaderboard_page(cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'users': [
+            {'rank': first_rank + offset, 'id': user.id, 'fullname': user.fullname,
+             'total_co2_saved': user.total_co2_saved}
+            for offset, user in enumerate(ranked_users)
+        ],
+        'next_cursor': next_cursor
+    }), 200
 
-@app.route('/consumer/my_sprout')
+@consumer_bp.route('/consumer/my_sprout')
 @login_required
 def my_sprout():
     GOAL_CO2 = 100.0 
@@ -277,19 +1435,99 @@ def my_sprout():
         trees_planted=trees_planted
     )
 
-@app.route('/consumer/redeem')
-@login_required
-def redeem():
-    vendor_offers = db.session.query(
-        Offer, Vendor.business_name
+# --- Reward Catalogue ---
+CATALOGUE_REVALIDATE_SECONDS = env_int('CATALOGUE_REVALIDATE_SECONDS', 5)
+
+class VersionedCache:
+    """Process-local copy of a dataset, reloaded when its CacheVersion row changes.
+
+    The version row is read at most once every `revalidate_seconds`, so a change
+    committed by another worker is picked up within that window and most calls
+    touch no database at all. Call invalidate() inside the transaction that
+    changes the underlying data; this worker rechecks the version once that
+    transaction commits.
+    """
+
+    def __init__(self, name, loader, revalidate_seconds):
+        self.name = name
+        self.loader = loader
+        self.revalidate_seconds = revalidate_seconds
+        self._lock = threading.Lock()
+        self._version = None
+        self._value = None
+        self._checked_at = float('-inf')
+
+    def get(self):
+        """Return (version, value), reloading the value if the version has moved."""
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked_at >= self.revalidate_seconds:
+                version = db.session.query(CacheVersion.version).filter_by(name=self.name).scalar() or 0
+                if version != self._version:
+                    self._value = self.loader()
+                    self._version = version
+                self._checked_at = now
+            return self._version, self._value
+
+    def invalidate(self):
+        upsert_add(CacheVersion, [{'name': self.name, 'version': 1}], ('version',))
+        db.session.info.setdefault('expire_caches', set()).add(self)
+
+    def expire(self):
+        with self._lock:
+            self._checked_at = float('-inf')
+
+@event.listens_for(Session, 'after_commit')
+def expire_committed_caches(session):
+    # Not before the commit: a get() in between would cache the old version again.
+    for cache in session.info.pop('expire_caches', ()):
+        cache.expire()
+
+def load_reward_catalogue():
+    offers = db.session.query(
+        Offer.id, Offer.title, Offer.description, Offer.mosscoin_cost, Vendor.id, Vendor.business_name
     ).join(
         Vendor, Offer.vendor_id == Vendor.id
     ).filter(
         Offer.status == 'active'
-    ).all()
-    return render_template('redeem.html', user=current_user, mock_rewards=MOCK_REWARDS_DB, vendor_offers=vendor_offers)
+    ).order_by(Offer.id).all()
+    return {
+        'vendor_offers': [{
+            'reward_id': f'offer_{offer_id}',
+            'title': title,
+            'description': description,
+            'cost': cost,
+            'vendor_id': vendor_id,
+            'vendor_name': vendor_name
+        } for offer_id, title, description, cost, vendor_id, vendor_name in offers],
+        'government_schemes': [
+            dict(reward, reward_id=reward_id) for reward_id, reward in MOCK_REWARDS_DB.items()
+        ]
+    }
+
+REWARD_CATALOGUE = VersionedCache('reward_catalogue', load_reward_catalogue, CATALOGUE_REVALIDATE_SECONDS)
+
+@consumer_bp.route('/consumer/redeem')
+@login_required
+def redeem():
+    _, catalogue = REWARD_CATALOGUE.get()
+    return render_template('redeem.html', user=current_user, catalogue=catalogue)
+
+@api_bp.route('/api/consumer/rewards-catalogue')
+@login_required
+def api_rewards_catalogue():
+    version, catalogue = REWARD_CATALOGUE.get()
+    etag = f'reward-catalogue-{version}'
+    headers = {'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = jsonify(dict(catalogue, version=version))
+        response.headers.update(headers)
+    response.set_etag(etag)
+    return response
 
-@app.route('/api/consumer/redeem-reward', methods=['POST'])
+@api_bp.route('/api/consumer/redeem-reward', methods=['POST'])
 @login_required
 def api_redeem_reward():
     data = request.json
@@ -313,34 +1551,41 @@ def api_redeem_reward():
     if current_user.mosscoin_balance < reward_cost:
         return jsonify({'error': 'Not enough MossCoins!'}), 400
     try:
-        current_user.mosscoin_balance -= reward_cost
+        change_mosscoins(
+            current_user, -reward_cost, 'redemption',
+            offer_id=real_id if reward_id.startswith('offer_') else None,
+            reward_id=reward_id if reward_id.startswith('gov_') else None
+        )
         db.session.commit()
         return jsonify({
             'message': 'Reward redeemed!',
             'new_balance': current_user.mosscoin_balance
         }), 200
+    except InsufficientMossCoins:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough MossCoins!'}), 400
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/consumer/eco_tips')
+@consumer_bp.route('/consumer/eco_tips')
 @login_required
 def eco_tips():
     return render_template('eco_tips.html')
 
-@app.route('/consumer/eco_advisor')
+@consumer_bp.route('/consumer/eco_advisor')
 @login_required
 def eco_advisor():
     return render_template('eco_advisor.html')
 
-@app.route('/consumer/refer_and_earn')
+@consumer_bp.route('/consumer/refer_and_earn')
 @login_required
 def refer_and_earn():
     name_part = current_user.fullname.split(' ')[0].upper()[:5]
     referral_code = f"{name_part}{current_user.id * 3}"
     return render_template('refer_and_earn.html', referral_code=referral_code)
 
-@app.route('/consumer/settings', methods=['GET', 'POST'])
+@consumer_bp.route('/consumer/settings', methods=['GET', 'POST'])
 @login_required
 def settings():
     if request.method == 'POST':
@@ -350,15 +1595,16 @@ def settings():
                 current_user.fullname = request.form.get('fullname')
                 current_user.email = request.form.get('email')
                 current_user.phone = request.form.get('phone')
+                IDENTITY_CACHE.forget(User, current_user.id)
                 db.session.commit()
                 flash('Profile updated successfully!')
         except Exception as e:
             db.session.rollback()
             flash(f'An error occurred: {e}')
-        return redirect(url_for('settings'))
+        return redirect(url_for('consumer.settings'))
     return render_template('settings.html', user=current_user)
 
-@app.route('/api/consumer/change-password', methods=['POST'])
+@api_bp.route('/api/consumer/change-password', methods=['POST'])
 @login_required
 def api_change_password():
     data = request.json
@@ -366,8 +1612,9 @@ def api_change_password():
     new_password = data.get('new_password')
     if not current_user.check_password(old_password):
         return jsonify({'error': 'Old password is not correct.'}), 400
+    current_user.set_password(new_password)
     try:
-        current_user.set_password(new_password)
+        IDENTITY_CACHE.forget(User, current_user.id)
         db.session.commit()
         return jsonify({'message': 'Password updated successfully!'}), 200
     except Exception as e:
@@ -375,21 +1622,27 @@ def api_change_password():
         return jsonify({'error': str(e)}), 500
 
 # --- Vendor Routes ---
-@app.route('/vendor/login', methods=['GET', 'POST'])
+@vendor_bp.route('/vendor/login', methods=['GET', 'POST'])
 def vendor_login():
     if request.method == 'POST':
         email = request.form.get('email')
         password = request.form.get('password')
         vendor = Vendor.query.filter_by(email=email).first()
-        if vendor and vendor.check_password(password):
+        try:
+            valid = vendor is not None and vendor.check_password(password)
+        except HashingBusy as e:
+            flash(str(e))
+            return redirect(url_for('vendor.vendor_login'))
+        if valid:
+            upgrade_password_hash(vendor, password)
             session['vendor_id'] = vendor.id
-            return redirect(url_for('vendor_dashboard'))
+            return redirect(url_for('vendor.vendor_dashboard'))
         else:
             flash('Invalid email or password. Please try again.')
-            return redirect(url_for('vendor_login'))
+            return redirect(url_for('vendor.vendor_login'))
     return render_template('vendor_login.html')
 
-@app.route('/vendor/register', methods=['GET', 'POST'])
+@vendor_bp.route('/vendor/register', methods=['GET', 'POST'])
 def vendor_register():
     if request.method == 'POST':
         business_name = request.form.get('business-name')
@@ -402,11 +1655,11 @@ def vendor_register():
         address = request.form.get('address')
         if password != confirm_password:
             flash("Passwords do not match. Please try again.")
-            return redirect(url_for('vendor_register'))
+            return redirect(url_for('vendor.vendor_register'))
         existing_vendor = Vendor.query.filter_by(email=email).first()
         if existing_vendor:
             flash("An account with this email already exists.")
-            return redirect(url_for('vendor_register'))
+            return redirect(url_for('vendor.vendor_register'))
         try:
             new_vendor = Vendor(
                 business_name=business_name,
@@ -420,73 +1673,137 @@ def vendor_register():
             db.session.add(new_vendor)
             db.session.commit()
             flash("Vendor registered successfully! Please log in.")
-            return redirect(url_for('vendor_login'))
+            return redirect(url_for('vendor.vendor_login'))
         except Exception as e:
             flash(f"An error occurred: {e}")
             db.session.rollback()
-            return redirect(url_for('vendor_register'))
+            return redirect(url_for('vendor.vendor_register'))
     return render_template('vendor_register.html')
 
-@app.route('/vendor/dashboard')
+# --- Low Stock ---
+# LowStockItem lists every item at or below its own low_stock_threshold.
+# Checkout adds items in the same transaction that takes their stock below the
+# threshold and then publishes a low_stock event to the vendor's stream; other
+# writes to stock or thresholds call sync_low_stock() before committing.
+DEFAULT_LOW_STOCK_THRESHOLD = 10
+
+def parse_low_stock_threshold(value):
+    try:
+        threshold = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('The low-stock threshold must be a whole number.')
+    if threshold < 0:
+        raise ValueError('The low-stock threshold cannot be negative.')
+    return threshold
+
+def sync_low_stock(*criteria):
+    """Bring the watchlist up to date for the items matching `criteria`. The caller commits."""
+    db.session.execute(
+        LowStockItem.__table__.delete().where(LowStockItem.item_id.in_(
+            db.select(Item.id).where(*criteria, Item.stock > Item.low_stock_threshold)
+        ))
+    )
+    db.session.execute(insert(LowStockItem).from_select(
+        ['item_id', 'vendor_id', 'since'],
+        db.select(Item.id, Item.vendor_id, db.literal(datetime.utcnow())).where(
+            *criteria, Item.stock <= Item.low_stock_threshold,
+            ~db.exists().where(LowStockItem.item_id == Item.id)
+        )
+    ))
+
+def low_stock_items(vendor_id):
+    return Item.query.join(
+        LowStockItem, LowStockItem.item_id == Item.id
+    ).filter(
+        LowStockItem.vendor_id == vendor_id
+    ).order_by(Item.stock, Item.id).all()
+
+def low_stock_to_dict(item):
+    return {
+        'id': item.id,
+        'name': item.name,
+        'unit': item.unit,
+        'stock': item.stock,
+        'low_stock_threshold': item.low_stock_threshold
+    }
+
+@api_bp.route('/api/vendor/low-stock')
+@vendor_api_required
+def api_low_stock():
+    return jsonify({'items': [low_stock_to_dict(item) for item in low_stock_items(g.vendor_id)]}), 200
+
+@api_bp.route('/api/vendor/items/<int:item_id>/low-stock-threshold', methods=['POST'])
+@vendor_api_required
+def api_set_low_stock_threshold(item_id):
+    try:
+        threshold = parse_low_stock_threshold((request.json or {}).get('threshold'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    item = Item.query.filter_by(id=item_id, vendor_id=g.vendor_id).first()
+    if not item:
+        return jsonify({'error': 'Item not found.'}), 404
+    item.low_stock_threshold = threshold
+    db.session.flush()
+    sync_low_stock(Item.id == item.id)
+    db.session.commit()
+    return jsonify(low_stock_to_dict(item)), 200
+
+@api_bp.route('/api/vendor/stock-events')
+@vendor_api_required
+def api_stock_events():
+    return event_stream(vendor_channel(g.vendor_id))
+
+@vendor_bp.route('/vendor/dashboard')
+@vendor_required
 def vendor_dashboard():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    
-    vendor = Vendor.query.get(session['vendor_id'])
+    vendor = current_vendor()
     if not vendor:
         session.pop('vendor_id', None)
         flash('Could not find vendor. Please log in again.')
-        return redirect(url_for('vendor_login'))
-    
-    # --- NEW: LOW STOCK QUERY ---
-    # Find all items for this vendor with stock <= 10
-    low_stock_items = Item.query.filter(
-        Item.vendor_id == session['vendor_id'],
-        Item.stock <= 10
-    ).order_by(Item.stock.asc()).all()
+        return redirect(url_for('vendor.vendor_login'))
     
     return render_template(
         'vendor_dashboard.html', 
         vendor=vendor, 
-        low_stock_items=low_stock_items  # <-- Pass the list to the template
+        low_stock_items=low_stock_items(vendor.id)
     )
 
-@app.route('/vendor/logout')
+@vendor_bp.route('/vendor/logout')
 def vendor_logout():
     session.pop('vendor_id', None)
     flash("You have been logged out.")
-    return redirect(url_for('vendor_login'))
+    return redirect(url_for('vendor.vendor_login'))
 
-@app.route('/vendor/manage_items')
+@vendor_bp.route('/vendor/manage_items')
+@vendor_required
 def manage_items():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    vendor_items = Item.query.filter_by(vendor_id=session['vendor_id']).all()
+    vendor_items = Item.query.filter_by(vendor_id=g.vendor_id).all()
     return render_template('manage_items.html', items=vendor_items, carbon_db=MOCK_CARBON_DB)
 
-@app.route('/api/vendor/add-item', methods=['POST'])
+@api_bp.route('/api/vendor/add-item', methods=['POST'])
+@vendor_api_required
 def add_item():
-    if 'vendor_id' not in session:
-        return jsonify({'error': 'Not authorized'}), 401
     data = request.json
     item_name_from_form = data['name']
-    carbon_value = 0.0
-    for mock_name, mock_value in MOCK_CARBON_DB.items():
-        if mock_name.lower() == item_name_from_form.lower():
-            carbon_value = mock_value
-            break
+    carbon_match = CARBON_INDEX.lookup(item_name_from_form)
+    try:
+        threshold = parse_low_stock_threshold(data.get('low_stock_threshold', DEFAULT_LOW_STOCK_THRESHOLD))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         new_item = Item(
             name=item_name_from_form,
             price=float(data['price']),
             unit=data['unit'],
             stock=int(data['stock']),
-            carbon_saved_kg=carbon_value,
-            vendor_id=session['vendor_id']
+            carbon_saved_kg=carbon_match.carbon_kg,
+            vendor_id=g.vendor_id,
+            low_stock_threshold=threshold
         )
         db.session.add(new_item)
+        db.session.flush()
+        sync_low_stock(Item.id == new_item.id)
+        ITEM_CATALOGUES.invalidate(g.vendor_id)
         db.session.commit()
         return jsonify({
             'id': new_item.id,
@@ -494,27 +1811,448 @@ def add_item():
             'price': new_item.price,
             'unit': new_item.unit,
             'stock': new_item.stock,
-            'carbon_saved_kg': new_item.carbon_saved_kg
+            'low_stock_threshold': new_item.low_stock_threshold,
+            'carbon_saved_kg': new_item.carbon_saved_kg,
+            'carbon_match': carbon_match.name,
+            'carbon_confidence': carbon_match.confidence,
+            'carbon_suggestions': list(carbon_match.suggestions)
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/vendor/generate_bill')
+@api_bp.route('/api/vendor/carbon-lookup', methods=['POST'])
+@vendor_api_required
+def api_carbon_lookup():
+    names = (request.json or {}).get('names')
+    if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+        return jsonify({'error': 'Expected a list of item names.'}), 400
+    if len(names) > CARBON_LOOKUP_LIMIT:
+        return jsonify({'error': f'At most {CARBON_LOOKUP_LIMIT} names per request.'}), 400
+    return jsonify({'results': [match._asdict() for match in CARBON_INDEX.lookup_many(names)]}), 200
+
+# --- Inventory Import ---
+# Uploads are read row by row and written in batches, so memory stays flat
+# however long the file is. A JSON array has to be parsed whole, so it is
+# capped at IMPORT_JSON_MAX_BYTES; larger files should use JSON Lines or CSV.
+IMPORT_BATCH_SIZE = 1000
+IMPORT_ERROR_LIMIT = 1000
+IMPORT_JSON_MAX_BYTES = 10 * 1024 * 1024
+
+def import_format(upload):
+    requested = request.args.get('format') or request.form.get('format')
+    if requested:
+        return requested.lower()
+    filename = ((upload.filename if upload else None) or '').lower()
+    mimetype = upload.mimetype if upload else request.mimetype
+    if filename.endswith('.csv') or mimetype == 'text/csv':
+        return 'csv'
+    if filename.endswith(('.json', '.jsonl', '.ndjson')) or mimetype in (
+            'application/json', 'application/x-ndjson', 'application/jsonl'):
+        return 'json'
+    return None
+
+def import_records(stream, file_format):
+    """Yield (row number, record) from a CSV, JSON Lines or JSON array upload.
+
+    Records are dicts, except JSON Lines rows, which are yielded as text and
+    decoded by parse_import_row so a bad line only fails that row.
+    """
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    if file_format == 'csv':
+        for number, row in enumerate(csv.DictReader(text_stream), start=2):  # line 1 is the header
+            yield number, {(key or '').strip().lower(): value for key, value in row.items()}
+        return
+    first = text_stream.readline()
+    while first and not first.strip():
+        first = text_stream.readline()
+    if first.lstrip().startswith('['):
+        body = first + text_stream.read(IMPORT_JSON_MAX_BYTES)
+        if text_stream.read(1):
+            raise ValueError(f'JSON arrays are limited to {IMPORT_JSON_MAX_BYTES // (1024 * 1024)} MB; '
+                             'upload JSON Lines or CSV instead.')
+        yield from enumerate(json.loads(body), start=1)
+        return
+    if first:
+        yield 1, first
+    for number, line in enumerate(text_stream, start=2):
+        if line.strip():
+            yield number, line
+
+def parse_import_row(record):
+    """Validate one uploaded row and return its Item values; raises ValueError."""
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Invalid JSON: {e.msg}.')
+    if not isinstance(record, dict):
+        raise ValueError('Expected an object with name, price, unit and stock.')
+    name = str(record.get('name') or '').strip()
+    unit = str(record.get('unit') or '').strip()
+    if not name:
+        raise ValueError('Missing name.')
+    if len(name) > 200:
+        raise ValueError('Name is longer than 200 characters.')
+    if not unit:
+        raise ValueError('Missing unit.')
+    if len(unit) > 50:
+        raise ValueError('Unit is longer than 50 characters.')
+    try:
+        price = float(record.get('price'))
+    except (TypeError, ValueError):
+        raise ValueError('Price must be a number.')
+    if not math.isfinite(price) or price < 0:
+        raise ValueError('Price must be zero or more.')
+    try:
+        stock = int(str(record.get('stock')).strip())
+    except ValueError:
+        raise ValueError('Stock must be a whole number.')
+    if stock < 0:
+        raise ValueError('Stock must be zero or more.')
+    carbon_kg = record.get('carbon_saved_kg')
+    if carbon_kg in (None, ''):
+        carbon_kg = None
+    else:
+        try:
+            carbon_kg = float(carbon_kg)
+        except (TypeError, ValueError):
+            raise ValueError('carbon_saved_kg must be a number.')
+        if not math.isfinite(carbon_kg) or carbon_kg < 0:
+            raise ValueError('carbon_saved_kg must be zero or more.')
+    return {'name': name, 'price': price, 'unit': unit, 'stock': stock, 'carbon_saved_kg': carbon_kg}
+
+def upsert_items(vendor_id, rows):
+    """Insert or update a batch of parsed rows keyed on (vendor, name).
+
+    Returns (inserted, updated, unmatched), where unmatched lists the names
+    that got no carbon value, with the factor names suggested for them.
+    """
+    by_name = {row['name']: row for row in rows}  # a repeated name keeps its last row
+    unknown_carbon = [row for row in by_name.values() if row['carbon_saved_kg'] is None]
+    matches = CARBON_INDEX.lookup_many([row['name'] for row in unknown_carbon])
+    unmatched = []
+    for row, match in zip(unknown_carbon, matches):
+        row['carbon_saved_kg'] = match.carbon_kg
+        if match.name is None:
+            unmatched.append({'name': row['name'], 'suggestions': list(match.suggestions)})
+    existing = dict(db.session.query(Item.name, func.min(Item.id)).filter(
+        Item.vendor_id == vendor_id, Item.name.in_(by_name.keys())
+    ).group_by(Item.name))
+    updates = [dict(row, id=existing[name]) for name, row in by_name.items() if name in existing]
+    inserts = [dict(row, vendor_id=vendor_id) for name, row in by_name.items() if name not in existing]
+    if updates:
+        db.session.execute(update(Item), updates)
+    if inserts:
+        db.session.execute(insert(Item), inserts)
+    sync_low_stock(Item.vendor_id == vendor_id, Item.name.in_(by_name.keys()))
+    ITEM_CATALOGUES.invalidate(vendor_id)
+    return len(inserts), len(updates), unmatched
+
+@api_bp.route('/api/vendor/import-items', methods=['POST'])
+@vendor_api_required
+def api_import_items():
+    """Create or update items in bulk from an uploaded CSV, JSON Lines or JSON array file.
+
+    Columns are name, price, unit, stock and optionally carbon_saved_kg; rows
+    without a carbon value are matched against the carbon factor table, and
+    those it cannot place confidently are listed in unmatched_carbon with
+    suggestions. Items are matched to existing ones by name. Each batch is
+    committed as it completes, and the response lists the rows that were
+    rejected.
+    """
+    upload = request.files.get('file')
+    file_format = import_format(upload)
+    if file_format not in ('csv', 'json'):
+        return jsonify({'error': 'Upload a .csv, .json or .jsonl file, or pass format=csv|json.'}), 400
+    counts = {'rows': 0, 'inserted': 0, 'updated': 0, 'failed': 0}
+    errors = []
+    unmatched_carbon = []
+    batch = []
+
+    def write_batch():
+        inserted, updated, unmatched = upsert_items(g.vendor_id, batch)
+        db.session.commit()
+        unmatched_carbon.extend(unmatched[:IMPORT_ERROR_LIMIT - len(unmatched_carbon)])
+        counts['inserted'] += inserted
+        counts['updated'] += updated
+        batch.clear()
+
+    try:
+        for number, record in import_records(upload.stream if upload else request.stream, file_format):
+            counts['rows'] += 1
+            try:
+                batch.append(parse_import_row(record))
+            except ValueError as e:
+                counts['failed'] += 1
+                if len(errors) < IMPORT_ERROR_LIMIT:
+                    errors.append({'row': number, 'error': str(e)})
+                continue
+            if len(batch) == IMPORT_BATCH_SIZE:
+                write_batch()
+        if batch:
+            write_batch()
+    except (ValueError, csv.Error) as e:  # unreadable file: earlier batches stay imported
+        db.session.rollback()
+        return jsonify(dict(counts, error=f'Could not read the file: {e}', errors=errors)), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    return jsonify(dict(counts, errors=errors, errors_truncated=counts['failed'] > len(errors),
+                        unmatched_carbon=unmatched_carbon)), 200
+
+# --- Item Catalogue ---
+# Each vendor's items are kept in a VersionedCache (versioned per vendor in
+# cache_version), with the least recently used vendors dropped beyond
+# ITEM_CATALOGUE_VENDORS. Adding or importing items bumps the version, as does
+# a sale that sells an item out; other sales leave the snapshot's stock figures
+# behind, which is safe because checkout takes stock with a conditional UPDATE
+# that also returns the current price and carbon value.
+ITEM_CATALOGUE_VENDORS = env_int('ITEM_CATALOGUE_VENDORS', 500)
+CATALOGUE_FIELDS = ('id', 'name', 'price', 'unit', 'carbon_saved_kg', 'stock')
+CatalogueItem = namedtuple('CatalogueItem', CATALOGUE_FIELDS)
+
+class VersionedCacheLRU:
+    """VersionedCaches for many keys (e.g. one per vendor), keeping the `max_size` most recently used."""
+
+    def __init__(self, name, loader, revalidate_seconds, max_size):
+        self.name = name
+        self.loader = loader
+        self.revalidate_seconds = revalidate_seconds
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._caches = OrderedDict()
+
+    def _cache(self, key):
+        with self._lock:
+            cache = self._caches.pop(key, None)
+            if cache is None:
+                cache = VersionedCache(f'{self.name}:{key}', lambda: self.loader(key), self.revalidate_seconds)
+            self._caches[key] = cache
+            if len(self._caches) > self.max_size:
+                self._caches.popitem(last=False)
+        return cache
+
+    def get(self, key):
+        return self._cache(key).get()
+
+    def invalidate(self, key):
+        self._cache(key).invalidate()
+
+def catalogue_item(row):
+    return CatalogueItem(*(getattr(row, field) for field in CATALOGUE_FIELDS))
+
+def load_item_catalogue(vendor_id):
+    items = {
+        row.id: catalogue_item(row) for row in db.session.query(
+            *(getattr(Item, field) for field in CATALOGUE_FIELDS)
+        ).filter(Item.vendor_id == vendor_id).order_by(Item.id)
+    }
+    # The JSON for generate_bill.js is encoded once per version; sold-out items are left out.
+    body = json.dumps({
+        'fields': CATALOGUE_FIELDS,
+        'items': [list(item) for item in items.values() if item.stock > 0]
+    }, separators=(',', ':'))
+    return {'items': items, 'body': body}
+
+ITEM_CATALOGUES = VersionedCacheLRU('item_catalogue', load_item_catalogue, CATALOGUE_REVALIDATE_SECONDS,
+                                    ITEM_CATALOGUE_VENDORS)
+
+@api_bp.route('/api/vendor/catalogue')
+@vendor_api_required
+def api_item_catalogue():
+    version, catalogue = ITEM_CATALOGUES.get(g.vendor_id)
+    etag = f'item-catalogue-{g.vendor_id}-{version}'
+    headers = {'Cache-Control': 'private, no-cache'}
+    if request.if_none_match.contains(etag):
+        response = Response(status=304, headers=headers)
+    else:
+        response = Response(catalogue['body'], mimetype='application/json', headers=headers)
+    response.set_etag(etag)
+    return response
+
+@vendor_bp.route('/vendor/generate_bill')
+@vendor_required
 def generate_bill():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    vendor_items = Item.query.filter(
-        Item.vendor_id == session['vendor_id'],
-        Item.stock > 0
-    ).all()
-    return render_template('generate_bill.html', items=vendor_items)
+    return render_template('generate_bill.html')
 
-@app.route('/api/vendor/send-bill-to-phone', methods=['POST'])
+# --- Billing ---
+def upsert_add(model, rows, counters):
+    """Insert `rows` into `model`, adding the `counters` columns onto rows that already exist."""
+    if not rows:
+        return
+    dialect = db.engine.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        statement = dialect_insert(model)
+        keys = [column.name for column in model.__table__.primary_key.columns]
+        statement = statement.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: getattr(model, name) + statement.excluded[name] for name in counters}
+        )
+        db.session.execute(statement, rows)
+        return
+    for row in rows:
+        key = {name: row[name] for name in row if name not in counters}
+        updated = db.session.execute(
+            update(model).filter_by(**key).values(
+                {name: getattr(model, name) + row[name] for name in counters}
+            )
+        )
+        if updated.rowcount == 0:
+            db.session.execute(insert(model), [row])
+
+def record_sale_rollups(sales):
+    """Fold new bills into the vendors' daily rollups, inside the caller's transaction.
+
+    `sales` is a list of (bill row, {item_id: quantity}); rows landing on the
+    same rollup are summed first, so each table takes one upsert.
+    """
+    totals, customers, items = {}, {}, {}
+    for bill, quantities in sales:
+        day = bill['created_at'].date()
+        key = (bill['vendor_id'], day)
+        count, amount, carbon = totals.get(key, (0, 0, 0))
+        totals[key] = (count + 1, amount + bill['total_amount'], carbon + bill['total_carbon_saved'])
+        key = (bill['vendor_id'], day, bill['customer_id'])
+        customers[key] = customers.get(key, 0) + 1
+        for item_id, quantity in quantities.items():
+            key = (bill['vendor_id'], day, item_id)
+            items[key] = items.get(key, 0) + quantity
+    upsert_add(VendorDailySales, [
+        {'vendor_id': vendor_id, 'day': day, 'bill_count': count, 'total_sales': amount, 'total_co2': carbon}
+        for (vendor_id, day), (count, amount, carbon) in totals.items()
+    ], ('bill_count', 'total_sales', 'total_co2'))
+    upsert_add(VendorDailyCustomer, [
+        {'vendor_id': vendor_id, 'day': day, 'customer_id': customer_id, 'bill_count': count}
+        for (vendor_id, day, customer_id), count in customers.items()
+    ], ('bill_count',))
+    upsert_add(VendorDailyItem, [
+        {'vendor_id': vendor_id, 'day': day, 'item_id': item_id, 'quantity': quantity}
+        for (vendor_id, day, item_id), quantity in items.items()
+    ], ('quantity',))
+
+class CheckoutError(Exception):
+    """A cart that cannot be turned into a bill; carries the HTTP status to return."""
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+def parse_cart(cart):
+    """Collapse the cart lines into {item_id: quantity}, merging repeated items."""
+    quantities = {}
+    for cart_item in cart:
+        try:
+            item_id = int(cart_item['id'])
+            quantity = int(cart_item['quantity'])
+        except (KeyError, TypeError, ValueError):
+            raise CheckoutError('Every cart line needs a numeric id and quantity.')
+        if quantity <= 0:
+            raise CheckoutError(f'Quantity for item ID {item_id} must be positive.')
+        quantities[item_id] = quantities.get(item_id, 0) + quantity
+    return quantities
+
+def create_bill(vendor_id, customer, cart):
+    """Create a pending bill for `customer` in a single transaction.
+
+    The cart is checked against the vendor's catalogue snapshot, so a cart
+    naming unknown items is turned away without touching the database. Stock
+    is then taken by one conditional UPDATE, so two tills selling the last
+    unit cannot both succeed, and the same statement returns the current
+    price and carbon value to bill at. Bill lines are inserted in bulk, and
+    items the sale takes below their low-stock threshold join the watchlist
+    in the same transaction. Raises CheckoutError.
+    """
+    quantities = parse_cart(cart)
+    _, catalogue = ITEM_CATALOGUES.get(vendor_id)
+    names = {item_id: catalogue['items'][item_id].name for item_id in quantities if item_id in catalogue['items']}
+    if len(names) < len(quantities):  # possibly added since the snapshot was taken
+        names.update(db.session.query(Item.id, Item.name).filter(
+            Item.id.in_(quantities.keys() - names.keys()), Item.vendor_id == vendor_id
+        ))
+    for item_id in quantities:
+        if item_id not in names:
+            raise CheckoutError(f'Item ID {item_id} not found.')
+    try:
+        # stock = stock - qty only where stock >= qty; a short result means
+        # there is not enough stock for at least one line.
+        delta = case(quantities, value=Item.id)
+        updated = db.session.execute(
+            update(Item)
+            .where(Item.id.in_(quantities.keys()), Item.vendor_id == vendor_id, Item.stock >= delta)
+            .values(stock=Item.stock - delta)
+            .returning(Item.id, Item.stock, Item.low_stock_threshold, Item.price, Item.carbon_saved_kg, Item.unit)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if len(updated) != len(quantities):
+            db.session.rollback()
+            sold_out = Item.query.filter(
+                Item.id.in_(quantities.keys()),
+                Item.stock < case(quantities, value=Item.id)
+            ).first()
+            name = sold_out.name if sold_out else 'an item'
+            left = sold_out.stock if sold_out else 0
+            raise CheckoutError(f'Not enough stock for {name}. Only {left} left.', 409)
+        total_amount = sum(price * quantities[item_id] for item_id, _, _, price, _, _ in updated)
+        total_carbon = sum(carbon * quantities[item_id] for item_id, _, _, _, carbon, _ in updated)
+        bill_row = {
+            'vendor_id': vendor_id,
+            'customer_id': customer.id,
+            'total_amount': total_amount,
+            'total_carbon_saved': total_carbon,
+            'mosscoins_to_award': int(total_carbon * 10),
+            'status': 'pending',
+            'created_at': datetime.utcnow()
+        }
+        new_bill = Bill(**bill_row)
+        db.session.add(new_bill)
+        db.session.flush()
+        db.session.execute(insert(BillItem), [
+            {
+                'bill_id': new_bill.id,
+                'item_id': item_id,
+                'quantity': quantities[item_id],
+                'price_at_sale': price,
+                'carbon_at_sale': carbon
+            }
+            for item_id, _, _, price, carbon, _ in updated
+        ])
+        record_sale_rollups([(bill_row, quantities)])
+        # Items this sale took from above their threshold to at or below it.
+        low_stock = [
+            {'id': item_id, 'name': names[item_id], 'unit': unit, 'stock': stock, 'low_stock_threshold': threshold}
+            for item_id, stock, threshold, _, _, unit in updated
+            if stock <= threshold < stock + quantities[item_id]
+        ]
+        if low_stock:
+            db.session.execute(insert(LowStockItem), [
+                {'item_id': item['id'], 'vendor_id': vendor_id, 'since': new_bill.created_at}
+                for item in low_stock
+            ])
+        if any(stock == 0 for _, stock, _, _, _, _ in updated):
+            ITEM_CATALOGUES.invalidate(vendor_id)  # sold out: drop it from the till's item list
+        db.session.commit()
+    except CheckoutError:
+        raise
+    except Exception:
+        db.session.rollback()
+        raise
+    if low_stock:
+        current_app.logger.info('Low stock for vendor %s: %s', vendor_id, ', '.join(item['name'] for item in low_stock))
+        EVENTS.publish(vendor_channel(vendor_id), 'low_stock', {'items': low_stock})
+    channel = customer_channel(customer.id)
+    if EVENTS.has_subscribers(channel):  # skip reloading the bill when nobody is listening
+        vendor = db.session.get(Vendor, vendor_id)
+        EVENTS.publish(channel, 'bill_created', dict(bill_to_dict(new_bill), vendor_name=vendor.business_name))
+    return new_bill
+
+@api_bp.route('/api/vendor/send-bill-to-phone', methods=['POST'])
+@vendor_api_required
 def send_bill_to_phone():
-    if 'vendor_id' not in session:
-        return jsonify({'error': 'Not authorized'}), 401
     data = request.json
     phone_number = data.get('phone')
     cart = data.get('cart') 
@@ -523,57 +2261,283 @@ def send_bill_to_phone():
     customer = User.query.filter_by(phone=phone_number).first()
     if not customer:
         return jsonify({'error': f'No MossPay user found with phone number {phone_number}.'}), 404
-    total_amount = 0
-    total_carbon = 0
-    with db.session.no_autoflush:
-        for cart_item in cart:
-            item_id = cart_item['id']
-            quantity = cart_item['quantity']
-            item_in_db = Item.query.get(item_id)
-            if not item_in_db:
-                return jsonify({'error': f'Item ID {item_id} not found.'}), 400
-            if item_in_db.stock < quantity:
-                return jsonify({'error': f'Not enough stock for {item_in_db.name}. Only {item_in_db.stock} left.'}), 400
-            total_amount += item_in_db.price * quantity
-            total_carbon += item_in_db.carbon_saved_kg * quantity
-    mosscoins = int(total_carbon * 10)
-    try:
-        new_bill = Bill(
-            vendor_id=session['vendor_id'],
-            customer_id=customer.id,
-            total_amount=total_amount,
-            total_carbon_saved=total_carbon,
-            mosscoins_to_award=mosscoins,
-            status='pending'
-        )
-        db.session.add(new_bill)
-        db.session.commit()
-        for cart_item in cart:
-            item_in_db = Item.query.get(cart_item['id'])
-            bill_item_entry = BillItem(
-                bill_id=new_bill.id,
-                item_id=item_in_db.id,
-                quantity=cart_item['quantity'],
-                price_at_sale=item_in_db.price,
-                carbon_at_sale=item_in_db.carbon_saved_kg
-            )
-            db.session.add(bill_item_entry)
-            item_in_db.stock -= cart_item['quantity']
-        db.session.commit() 
+    try:
+        new_bill = create_bill(g.vendor_id, customer, cart)
         return jsonify({
             'message': f'Bill sent to {customer.fullname}!',
             'bill_id': new_bill.id
         }), 201
+    except CheckoutError as e:
+        return jsonify({'error': e.message}), e.status_code
     except Exception as e:
-        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/vendor/manage_profile', methods=['GET', 'POST'])
+# --- POS Batch Upload ---
+# Tills that lose their connection queue bills locally and upload them later
+# as JSON Lines, one {"client_id", "phone", "cart", "created_at"} object per
+# line. The client_id is generated on the till and stored on the bill, unique
+# per vendor, so re-sending a queue after a timeout returns the bills already
+# made instead of billing the customer twice. Bills are applied POS_BATCH_CHUNK
+# at a time, each chunk in one transaction with its customers, items and
+# earlier uploads looked up in bulk.
+POS_BATCH_CHUNK = env_int('POS_BATCH_CHUNK', 200)
+POS_BATCH_MAX_BILLS = env_int('POS_BATCH_MAX_BILLS', 10000)
+POS_BATCH_RETRIES = 3
+POS_BILL_MAX_LINES = 100
+POS_CLOCK_SKEW = timedelta(minutes=5)
+
+class StockChanged(Exception):
+    """Stock moved between reading and updating a chunk; the chunk is retried."""
+
+def parse_pos_bill(line, now):
+    """Validate one uploaded bill; raises CheckoutError."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise CheckoutError(f'Invalid JSON: {e.msg}.')
+    if not isinstance(record, dict):
+        raise CheckoutError('Expected an object with client_id, phone and cart.')
+    client_id = str(record.get('client_id') or '').strip()
+    phone = str(record.get('phone') or '').strip()
+    cart = record.get('cart')
+    if not client_id:
+        raise CheckoutError('Missing client_id.')
+    if len(client_id) > 64:
+        raise CheckoutError('client_id is longer than 64 characters.')
+    if not phone or not isinstance(cart, list) or not cart:
+        raise CheckoutError('Missing phone number or items.')
+    if len(cart) > POS_BILL_MAX_LINES:
+        raise CheckoutError(f'A bill can have at most {POS_BILL_MAX_LINES} lines.')
+    created_at = now
+    if record.get('created_at'):
+        try:
+            created_at = datetime.fromisoformat(str(record['created_at']))
+        except ValueError:
+            raise CheckoutError('created_at must be an ISO 8601 time.')
+        if created_at.tzinfo is not None:
+            created_at = created_at.astimezone(timezone.utc).replace(tzinfo=None)
+        if created_at > now + POS_CLOCK_SKEW:
+            raise CheckoutError('created_at is in the future.')
+        created_at = min(created_at, now)
+    return {'client_id': client_id, 'phone': phone, 'quantities': parse_cart(cart), 'created_at': created_at}
+
+def apply_pos_bills(vendor_id, bills):
+    """Create a chunk of parsed POS bills in one transaction; returns (results, events).
+
+    Bills are checked in upload order against one read of the customers and
+    items involved, so each one sees the stock left by those before it. Stock
+    for the whole chunk is then taken by one conditional UPDATE; if another
+    sale got there first it comes back short and StockChanged is raised for
+    the caller to retry. `results` holds one outcome per bill, and `events`
+    the (channel, type, data) to publish once the caller has committed.
+    """
+    existing = dict(db.session.query(Bill.client_id, Bill.id).filter(
+        Bill.vendor_id == vendor_id, Bill.client_id.in_([bill['client_id'] for bill in bills])
+    ))
+    new_bills = [bill for bill in bills if bill['client_id'] not in existing]
+    customers = dict(db.session.query(User.phone, User.id).filter(
+        User.phone.in_({bill['phone'] for bill in new_bills})
+    )) if new_bills else {}
+    items = {
+        row.id: row for row in db.session.query(
+            Item.id, Item.name, Item.unit, Item.stock, Item.low_stock_threshold
+        ).filter(Item.id.in_(set().union(*(bill['quantities'] for bill in new_bills))), Item.vendor_id == vendor_id)
+    } if new_bills else {}
+
+    results, accepted = [], []
+    stock = {item_id: row.stock for item_id, row in items.items()}
+    for bill in bills:
+        result = {'line': bill['line'], 'client_id': bill['client_id']}
+        results.append(result)
+        if bill['client_id'] in existing:
+            result.update(status='duplicate', bill_id=existing[bill['client_id']])
+            continue
+        error = None
+        if bill['phone'] not in customers:
+            error = f"No MossPay user found with phone number {bill['phone']}."
+        else:
+            for item_id, quantity in bill['quantities'].items():
+                if item_id not in items:
+                    error = f'Item ID {item_id} not found.'
+                elif stock[item_id] < quantity:
+                    error = f'Not enough stock for {items[item_id].name}. Only {stock[item_id]} left.'
+                if error:
+                    break
+        if error:
+            result.update(status='error', error=error)
+            continue
+        for item_id, quantity in bill['quantities'].items():
+            stock[item_id] -= quantity
+        accepted.append((bill, result))
+    if not accepted:
+        return results, []
+
+    sold = {}
+    for bill, _ in accepted:
+        for item_id, quantity in bill['quantities'].items():
+            sold[item_id] = sold.get(item_id, 0) + quantity
+    delta = case(sold, value=Item.id)
+    updated = db.session.execute(
+        update(Item)
+        .where(Item.id.in_(sold.keys()), Item.vendor_id == vendor_id, Item.stock >= delta)
+        .values(stock=Item.stock - delta)
+        .returning(Item.id, Item.stock, Item.low_stock_threshold, Item.price, Item.carbon_saved_kg)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(updated) != len(sold):
+        raise StockChanged()
+    prices = {item_id: (price, carbon) for item_id, _, _, price, carbon in updated}
+
+    bill_rows = []
+    for bill, _ in accepted:
+        total_amount = sum(prices[item_id][0] * quantity for item_id, quantity in bill['quantities'].items())
+        total_carbon = sum(prices[item_id][1] * quantity for item_id, quantity in bill['quantities'].items())
+        bill_rows.append({
+            'vendor_id': vendor_id,
+            'customer_id': customers[bill['phone']],
+            'client_id': bill['client_id'],
+            'total_amount': total_amount,
+            'total_carbon_saved': total_carbon,
+            'mosscoins_to_award': int(total_carbon * 10),
+            'status': 'pending',
+            'created_at': bill['created_at']
+        })
+    bill_ids = db.session.scalars(
+        insert(Bill).returning(Bill.id, sort_by_parameter_order=True), bill_rows
+    ).all()
+    db.session.execute(insert(BillItem), [
+        {
+            'bill_id': bill_id,
+            'item_id': item_id,
+            'quantity': quantity,
+            'price_at_sale': prices[item_id][0],
+            'carbon_at_sale': prices[item_id][1]
+        }
+        for bill_id, (bill, _) in zip(bill_ids, accepted)
+        for item_id, quantity in bill['quantities'].items()
+    ])
+    record_sale_rollups([(row, bill['quantities']) for row, (bill, _) in zip(bill_rows, accepted)])
+    now = datetime.utcnow()
+    low_stock = [
+        {'id': item_id, 'name': items[item_id].name, 'unit': items[item_id].unit,
+         'stock': left, 'low_stock_threshold': threshold}
+        for item_id, left, threshold, _, _ in updated
+        if left <= threshold < items[item_id].stock
+    ]
+    if low_stock:
+        db.session.execute(insert(LowStockItem), [
+            {'item_id': item['id'], 'vendor_id': vendor_id, 'since': now} for item in low_stock
+        ])
+    if any(left == 0 for _, left, _, _, _ in updated):
+        ITEM_CATALOGUES.invalidate(vendor_id)
+
+    events = []
+    if low_stock:
+        events.append((vendor_channel(vendor_id), 'low_stock', {'items': low_stock}))
+    vendor_name = None
+    for bill_id, row, (_, result) in zip(bill_ids, bill_rows, accepted):
+        result.update(status='created', bill_id=bill_id)
+        channel = customer_channel(row['customer_id'])
+        if EVENTS.has_subscribers(channel):
+            if vendor_name is None:
+                vendor_name = db.session.get(Vendor, vendor_id).business_name
+            events.append((channel, 'bill_created', dict(bill_to_dict(Bill(id=bill_id, **row)), vendor_name=vendor_name)))
+    return results, events
+
+def write_pos_chunk(vendor_id, bills):
+    """Apply a chunk with retries, publish its events and return its results."""
+    for attempt in range(POS_BATCH_RETRIES):
+        try:
+            results, events = apply_pos_bills(vendor_id, bills)
+            db.session.commit()
+            break
+        except (StockChanged, IntegrityError):  # a concurrent sale or upload of the same bills
+            db.session.rollback()
+    else:
+        return [
+            {'line': bill['line'], 'client_id': bill['client_id'], 'status': 'error',
+             'error': 'Stock changed while saving; upload this bill again.'}
+            for bill in bills
+        ]
+    for channel, event_type, data in events:
+        if event_type == 'low_stock':
+            current_app.logger.info('Low stock for vendor %s: %s', vendor_id,
+                                    ', '.join(item['name'] for item in data['items']))
+        EVENTS.publish(channel, event_type, data)
+    return results
+
+@api_bp.route('/api/vendor/bills/batch', methods=['POST'])
+@vendor_api_required
+def api_upload_bills():
+    """Create bills queued by an offline till from a JSON Lines upload.
+
+    Each line is {"client_id", "phone", "cart", "created_at"}; created_at is
+    optional and defaults to now. The response has one result per line, in
+    order, with status created, duplicate (uploaded before; bill_id is the
+    existing bill) or error. Chunks are committed as they complete, so a
+    failed upload can simply be sent again; a server error part-way answers
+    500 with the results so far. At most POS_BATCH_MAX_BILLS lines are read;
+    `truncated` is set when the upload had more.
+    """
+    counts = {'received': 0, 'created': 0, 'duplicates': 0, 'failed': 0}
+    results = []
+    chunk = []
+    seen = set()
+    now = datetime.utcnow()
+    truncated = False
+
+    def write_chunk():
+        for result in write_pos_chunk(g.vendor_id, chunk):
+            results.append(result)
+            counts[{'created': 'created', 'duplicate': 'duplicates', 'error': 'failed'}[result['status']]] += 1
+        chunk.clear()
+
+    try:
+        text_stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        for number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            if counts['received'] == POS_BATCH_MAX_BILLS:
+                truncated = True
+                break
+            counts['received'] += 1
+            try:
+                bill = parse_pos_bill(line, now)
+                if bill['client_id'] in seen:
+                    raise CheckoutError('client_id repeated in this upload.')
+            except CheckoutError as e:
+                counts['failed'] += 1
+                results.append({'line': number, 'client_id': None, 'status': 'error', 'error': e.message})
+                continue
+            seen.add(bill['client_id'])
+            bill['line'] = number
+            chunk.append(bill)
+            if len(chunk) == POS_BATCH_CHUNK:
+                write_chunk()
+        if chunk:
+            write_chunk()
+    except UnicodeDecodeError as e:  # unreadable upload: earlier chunks stay saved
+        db.session.rollback()
+        return jsonify(dict(counts, error=f'Could not read the upload: {e}', results=results)), 400
+    except Exception:
+        # Earlier chunks are committed, so report them; the chunk being written was rolled back.
+        db.session.rollback()
+        current_app.logger.exception('POS upload failed for vendor %s', g.vendor_id)
+        for bill in chunk:
+            counts['failed'] += 1
+            results.append({'line': bill['line'], 'client_id': bill['client_id'], 'status': 'error',
+                            'error': 'Not saved; upload this bill again.'})
+        results.sort(key=lambda result: result['line'])
+        return jsonify(dict(counts, truncated=truncated, results=results,
+                            error='The upload stopped on a server error. Bills not listed as created '
+                                  'or duplicate were not saved; send the upload again.')), 500
+    results.sort(key=lambda result: result['line'])
+    return jsonify(dict(counts, truncated=truncated, results=results)), 200
+
+@vendor_bp.route('/vendor/manage_profile', methods=['GET', 'POST'])
+@vendor_required
 def manage_profile():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    vendor = Vendor.query.get(session['vendor_id'])
+    vendor = current_vendor()
     if request.method == 'POST':
         vendor.business_name = request.form.get('business_name')
         vendor.contact_name = request.form.get('contact_name')
@@ -584,116 +2548,243 @@ def manage_profile():
         vendor.logo_url = request.form.get('logo_url')
         vendor.website_url = request.form.get('website_url')
         try:
+            IDENTITY_CACHE.forget(Vendor, vendor.id)
             db.session.commit()
             flash('Profile updated successfully!')
         except Exception as e:
             db.session.rollback()
             flash(f'Error updating profile: {e}')
-        return redirect(url_for('manage_profile'))
+        return redirect(url_for('vendor.manage_profile'))
     return render_template('manage_profile.html', vendor=vendor)
 
-@app.route('/vendor/manage_offers', methods=['GET', 'POST'])
+@vendor_bp.route('/vendor/manage_offers', methods=['GET', 'POST'])
+@vendor_required
 def manage_offers():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    
     if request.method == 'POST':
         title = request.form.get('title')
         description = request.form.get('description')
         mosscoin_cost = request.form.get('mosscoin_cost')
         try:
             new_offer = Offer(
-                vendor_id=session['vendor_id'],
+                vendor_id=g.vendor_id,
                 title=title,
                 description=description,
                 mosscoin_cost=int(mosscoin_cost)
             )
             db.session.add(new_offer)
+            REWARD_CATALOGUE.invalidate()
             db.session.commit()
             flash('New offer created successfully!')
         except Exception as e:
             db.session.rollback()
             flash(f'Error creating offer: {e}')
-        return redirect(url_for('manage_offers'))
+        return redirect(url_for('vendor.manage_offers'))
 
-    offers = Offer.query.filter_by(vendor_id=session['vendor_id'], status='active').all()
+    offers = Offer.query.filter_by(vendor_id=g.vendor_id, status='active').all()
     return render_template('manage_offers.html', offers=offers)
 
-@app.route('/vendor/transaction_history')
+@vendor_bp.route('/vendor/offers/<int:offer_id>/expire', methods=['POST'])
+@vendor_required
+def expire_offer(offer_id):
+    expired = db.session.execute(
+        update(Offer)
+        .where(Offer.id == offer_id, Offer.vendor_id == g.vendor_id, Offer.status == 'active')
+        .values(status='expired')
+    )
+    if expired.rowcount:
+        REWARD_CATALOGUE.invalidate()
+        flash('Offer deactivated.')
+    else:
+        flash('Offer not found or already inactive.')
+    db.session.commit()
+    return redirect(url_for('vendor.manage_offers'))
+
+@vendor_bp.route('/vendor/transaction_history')
+@vendor_required
 def transaction_history():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
+    cursor, limit = page_args()
+    try:
+        transactions, next_cursor = vendor_transactions_page(g.vendor_id, cursor, limit)
+    except ValueError:
+        return redirect(url_for('vendor.transaction_history'))
     
-    transactions = db.session.query(
+    return render_template('transaction_history.html', transactions=transactions, next_cursor=next_cursor)
+
+def vendor_transactions_page(vendor_id, cursor, limit):
+    query = db.session.query(
         Bill, User.fullname
     ).join(
         User, Bill.customer_id == User.id
     ).filter(
-        Bill.vendor_id == session['vendor_id']
-    ).order_by(
-        Bill.created_at.desc()
-    ).all()
-    
-    return render_template('transaction_history.html', transactions=transactions)
+        Bill.vendor_id == vendor_id
+    )
+    return keyset_page(query, BILL_ORDER, cursor, limit, key=lambda row: (row[0].created_at, row[0].id))
+
+@api_bp.route('/api/vendor/transactions')
+@vendor_api_required
+def api_vendor_transactions():
+    cursor, limit = page_args()
+    try:
+        transactions, next_cursor = vendor_transactions_page(g.vendor_id, cursor, limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({
+        'transactions': [dict(bill_to_dict(bill), customer_name=fullname) for bill, fullname in transactions],
+        'next_cursor': next_cursor
+    }), 200
+
+# --- Transaction Export ---
+EXPORT_BATCH_ROWS = 1000
+EXPORT_COLUMNS = [
+    'bill_id', 'created_at', 'status', 'customer_name', 'item_id', 'item_name',
+    'quantity', 'price_at_sale', 'carbon_at_sale', 'line_total', 'bill_total'
+]
+
+def export_rows(vendor_id, start, end):
+    """Yield one tuple per bill line, streamed from the database in batches."""
+    query = db.select(
+        Bill.id, Bill.created_at, Bill.status, User.fullname, BillItem.item_id, Item.name,
+        BillItem.quantity, BillItem.price_at_sale, BillItem.carbon_at_sale, Bill.total_amount
+    ).join(
+        BillItem, BillItem.bill_id == Bill.id
+    ).join(
+        User, User.id == Bill.customer_id
+    ).join(
+        Item, Item.id == BillItem.item_id
+    ).where(
+        Bill.vendor_id == vendor_id
+    ).order_by(Bill.created_at, Bill.id, BillItem.id)
+    if start:
+        query = query.where(Bill.created_at >= start)
+    if end:
+        query = query.where(Bill.created_at < end + timedelta(days=1))
+    result = db.session.execute(query.execution_options(yield_per=EXPORT_BATCH_ROWS))
+    for (bill_id, created_at, status, customer_name, item_id, item_name,
+         quantity, price, carbon, bill_total) in result:
+        yield (bill_id, created_at.isoformat(), status, customer_name, item_id, item_name,
+               quantity, price, carbon, round(price * quantity, 2), bill_total)
+
+def csv_chunks(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if count % EXPORT_BATCH_ROWS == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(zip(EXPORT_COLUMNS, row))))
+        if len(lines) == EXPORT_BATCH_ROWS:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+@api_bp.route('/api/vendor/transactions/export')
+@vendor_api_required
+def api_export_transactions():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'ndjson'):
+        return jsonify({'error': 'Format must be csv or ndjson.'}), 400
+    try:
+        start = parse_day(request.args.get('start'))
+        end = parse_day(request.args.get('end'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    rows = export_rows(g.vendor_id, start, end)
+    if export_format == 'csv':
+        chunks, mimetype = csv_chunks(rows), 'text/csv'
+    else:
+        chunks, mimetype = ndjson_chunks(rows), 'application/x-ndjson'
+    filename = f"mosspay-transactions-{start or 'all'}-{end or date.today()}.{export_format}"
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+AGE_BUCKETS = ["18-25", "26-35", "36-50", "51+", "Unknown"]
 
-@app.route('/vendor/customer_insights')
+def years_before(day, years):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:  # 29 February in a non-leap year
+        return day.replace(year=day.year - years, day=28)
+
+def parse_day(value):
+    """A YYYY-MM-DD query argument as a date, or None when absent; raises ValueError if malformed."""
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError(f'Invalid date {value!r}; expected YYYY-MM-DD.')
+
+@vendor_bp.route('/vendor/customer_insights')
+@vendor_required
 def customer_insights():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    
-    v_id = session['vendor_id']
-    
-    stats = db.session.query(
-        func.sum(Bill.total_amount),
-        func.count(Bill.customer_id.distinct()),
-        func.sum(Bill.total_carbon_saved)
-    ).filter(Bill.vendor_id == v_id).first()
+    v_id = g.vendor_id
+    try:
+        start = parse_day(request.args.get('start'))
+        end = parse_day(request.args.get('end'))
+    except ValueError as e:
+        abort(400, description=str(e))
+
+    # Every figure comes from the daily rollups, so the cost follows the
+    # number of days in the range rather than the number of bills.
+    def in_range(model, query):
+        query = query.filter(model.vendor_id == v_id)
+        if start:
+            query = query.filter(model.day >= start)
+        if end:
+            query = query.filter(model.day <= end)
+        return query
+
+    stats = in_range(VendorDailySales, db.session.query(
+        func.sum(VendorDailySales.total_sales),
+        func.sum(VendorDailySales.total_co2)
+    )).first()
     
     total_sales = stats[0] or 0
-    total_customers = stats[1] or 0
-    total_co2 = stats[2] or 0
+    total_co2 = stats[1] or 0
+
+    customer_ids = in_range(
+        VendorDailyCustomer, db.session.query(VendorDailyCustomer.customer_id)
+    ).distinct().subquery()
+    total_customers = db.session.query(func.count()).select_from(customer_ids).scalar() or 0
     
-    top_items = db.session.query(
-        Item.name, func.sum(BillItem.quantity).label('total_sold')
-    ).join(
-        BillItem, BillItem.item_id == Item.id
+    total_sold = func.sum(VendorDailyItem.quantity).label('total_sold')
+    top_items = in_range(VendorDailyItem, db.session.query(
+        Item.name, total_sold
     ).join(
-        Bill, Bill.id == BillItem.bill_id
-    ).filter(
-        Bill.vendor_id == v_id
-    ).group_by(
+        Item, Item.id == VendorDailyItem.item_id
+    )).group_by(
         Item.name
     ).order_by(
         desc('total_sold')
     ).limit(5).all()
     
-    age_buckets = {"18-25": 0, "26-35": 0, "36-50": 0, "51+": 0, "Unknown": 0}
-    customers = db.session.query(User.dob).join(
-        Bill, Bill.customer_id == User.id
-    ).filter(Bill.vendor_id == v_id).distinct().all()
-    
-    def calculate_age(born):
-        today = date.today()
-        return today.year - born.year - ((today.month, today.day) < (born.month, born.day))
-    
-    for customer in customers:
-        if customer.dob:
-            age = calculate_age(customer.dob)
-            if 18 <= age <= 25:
-                age_buckets["18-25"] += 1
-            elif 26 <= age <= 35:
-                age_buckets["26-35"] += 1
-            elif 36 <= age <= 50:
-                age_buckets["36-50"] += 1
-            elif age >= 51:
-                age_buckets["51+"] += 1
-            else:
-                age_buckets["Unknown"] += 1
-        else:
-            age_buckets["Unknown"] += 1
+    # Bucket ages in SQL by comparing dob with the birthday cut-offs for today.
+    today = date.today()
+    age_bucket = case(
+        (User.dob.is_(None), 'Unknown'),
+        (User.dob > years_before(today, 18), 'Unknown'),
+        (User.dob > years_before(today, 26), '18-25'),
+        (User.dob > years_before(today, 36), '26-35'),
+        (User.dob > years_before(today, 51), '36-50'),
+        else_='51+'
+    ).label('age_bucket')
+    age_counts = db.session.query(age_bucket, func.count(User.id)).join(
+        customer_ids, customer_ids.c.customer_id == User.id
+    ).group_by(age_bucket).all()
+    age_buckets = dict.fromkeys(AGE_BUCKETS, 0)
+    age_buckets.update(age_counts)
             
     return render_template(
         'customer_insights.html',
@@ -701,16 +2792,15 @@ def customer_insights():
         total_customers=total_customers,
         total_co2=total_co2,
         top_items=top_items,
-        age_buckets=age_buckets
+        age_buckets=age_buckets,
+        start=start,
+        end=end
     )
 
-@app.route('/vendor/settings', methods=['GET', 'POST'])
+@vendor_bp.route('/vendor/settings', methods=['GET', 'POST'])
+@vendor_required
 def vendor_settings():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-
-    vendor = Vendor.query.get(session['vendor_id'])
+    vendor = current_vendor()
     
     if request.method == 'POST':
         form_name = request.form.get('form_name')
@@ -719,21 +2809,20 @@ def vendor_settings():
                 vendor.contact_name = request.form.get('contact_name')
                 vendor.email = request.form.get('email')
                 vendor.mobile = request.form.get('mobile')
+                IDENTITY_CACHE.forget(Vendor, vendor.id)
                 db.session.commit()
                 flash('Account details updated successfully!')
             except Exception as e:
                 db.session.rollback()
                 flash(f'An error occurred: {e}')
-        return redirect(url_for('vendor_settings'))
+        return redirect(url_for('vendor.vendor_settings'))
 
     return render_template('vendor_settings.html', vendor=vendor)
 
-@app.route('/api/vendor/change-password', methods=['POST'])
+@api_bp.route('/api/vendor/change-password', methods=['POST'])
+@vendor_api_required
 def api_vendor_change_password():
-    if 'vendor_id' not in session:
-        return jsonify({'error': 'Not authorized'}), 401
-    
-    vendor = Vendor.query.get(session['vendor_id'])
+    vendor = current_vendor()
     data = request.json
     old_password = data.get('old_password')
     new_password = data.get('new_password')
@@ -741,8 +2830,9 @@ def api_vendor_change_password():
     if not vendor.check_password(old_password):
         return jsonify({'error': 'Old password is not correct.'}), 400
         
+    vendor.set_password(new_password)
     try:
-        vendor.set_password(new_password)
+        IDENTITY_CACHE.forget(Vendor, vendor.id)
         db.session.commit()
         return jsonify({'message': 'Password updated successfully!'}), 200
     except Exception as e:
@@ -750,19 +2840,461 @@ def api_vendor_change_password():
         return jsonify({'error': str(e)}), 500
 
 # --- NEW: MY SUBSCRIPTION ROUTE ---
-@app.route('/vendor/my_subscription')
+@vendor_bp.route('/vendor/my_subscription')
+@vendor_required
 def my_subscription():
-    if 'vendor_id' not in session:
-        flash('You must be logged in to see this page.')
-        return redirect(url_for('vendor_login'))
-    
     # We just pass a mock plan name for now
     current_plan = "MossPay Basic" 
     
     return render_template('my_subscription.html', current_plan=current_plan)
 
+# --- CLI Commands ---
+# --- Rebuilds of derived data ---
+def rebuild_leaderboard_data():
+    """Recompute the leaderboard histograms and every User.rank from scratch."""
+    bucket_expr = db.cast(User.total_co2_saved * LEADERBOARD_BUCKETS_PER_KG, db.Integer)
+    counts = db.session.query(bucket_expr, func.count(User.id)).group_by(bucket_expr).all()
+    LeaderboardBucket.query.delete()
+    db.session.add_all([
+        LeaderboardBucket(bucket=bucket or 0, user_count=user_count)
+        for bucket, user_count in counts
+    ])
+    score_expr = func.coalesce(User.total_co2_saved, 0)
+    block_expr = User.id // LEADERBOARD_ID_BLOCK
+    LeaderboardScore.query.delete()
+    db.session.execute(insert(LeaderboardScore).from_select(
+        ['score', 'block', 'user_count'],
+        db.select(score_expr, block_expr, func.count(User.id)).group_by(score_expr, block_expr)
+    ))
+    # Walk the ranking in keyset-paginated chunks so memory stays flat.
+    position = 0
+    last = None
+    while True:
+        chunk = db.session.query(User.id, User.total_co2_saved).order_by(
+            User.total_co2_saved.desc(), User.id.asc()
+        )
+        if last is not None:
+            chunk = chunk.filter(
+                (User.total_co2_saved < last[1]) |
+                ((User.total_co2_saved == last[1]) & (User.id > last[0]))
+            )
+        chunk = chunk.limit(5000).all()
+        if not chunk:
+            break
+        db.session.execute(update(User), [
+            {'id': user_id, 'rank': position + offset}
+            for offset, (user_id, _) in enumerate(chunk, start=1)
+        ])
+        position += len(chunk)
+        last = chunk[-1]
+    db.session.commit()
+    return len(counts)
+
+def rebuild_search_index_data():
+    """Create the vendor/item full-text index and refill it; False if FTS5 is unavailable."""
+    if not search_index_available():
+        return False
+    for statement in SEARCH_INDEX_DDL:
+        db.session.execute(text(statement))
+    db.session.execute(text("DELETE FROM vendor_search"))
+    db.session.execute(text(
+        "INSERT INTO vendor_search(rowid, vendor_id, name) SELECT id * 2, vendor_id, name FROM item"
+    ))
+    db.session.execute(text(
+        "INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description) "
+        "SELECT id * 2 + 1, id, business_name, shop_category, description FROM vendor"
+    ))
+    db.session.commit()
+    return True
+
+def rebuild_sales_rollup_data():
+    """Recompute every vendor's daily sales rollups from the bill tables."""
+    day = func.date(Bill.created_at)
+    VendorDailySales.query.delete()
+    VendorDailyCustomer.query.delete()
+    VendorDailyItem.query.delete()
+    db.session.execute(insert(VendorDailySales).from_select(
+        ['vendor_id', 'day', 'bill_count', 'total_sales', 'total_co2'],
+        db.select(Bill.vendor_id, day, func.count(Bill.id),
+                  func.sum(Bill.total_amount), func.sum(Bill.total_carbon_saved)
+        ).group_by(Bill.vendor_id, day)
+    ))
+    db.session.execute(insert(VendorDailyCustomer).from_select(
+        ['vendor_id', 'day', 'customer_id', 'bill_count'],
+        db.select(Bill.vendor_id, day, Bill.customer_id, func.count(Bill.id)
+        ).group_by(Bill.vendor_id, day, Bill.customer_id)
+    ))
+    db.session.execute(insert(VendorDailyItem).from_select(
+        ['vendor_id', 'day', 'item_id', 'quantity'],
+        db.select(Bill.vendor_id, day, BillItem.item_id, func.sum(BillItem.quantity)
+        ).join(BillItem, BillItem.bill_id == Bill.id).group_by(Bill.vendor_id, day, BillItem.item_id)
+    ))
+    db.session.commit()
+
+def rebuild_low_stock_data():
+    """Recompute the low-stock watchlist from item stock and thresholds; returns its size."""
+    LowStockItem.query.delete()
+    db.session.execute(insert(LowStockItem).from_select(
+        ['item_id', 'vendor_id', 'since'],
+        db.select(Item.id, Item.vendor_id, func.current_timestamp()).where(Item.stock <= Item.low_stock_threshold)
+    ))
+    db.session.commit()
+    return LowStockItem.query.count()
+
+# --- Schema Migrations ---
+# Each migration runs once, in order, and its version is recorded in
+# schema_version. The migrations themselves live in schema_migrations.py,
+# frozen as they shipped; a schema change is a new version there and here.
+def record_opening_balances():
+    # Users without ledger rows get one entry explaining their balance.
+    db.session.execute(insert(MossCoinLedger).from_select(
+        ['user_id', 'amount', 'balance_after', 'reason'],
+        db.select(User.id, User.mosscoin_balance, User.mosscoin_balance, db.literal('opening_balance'))
+        .where(~db.exists().where(MossCoinLedger.user_id == User.id))
+    ))
+
+MIGRATIONS = [
+    (1, 'create missing tables', schema_migrations.v1_create_tables),
+    (2, 'backfill leaderboard, search index and sales rollups', schema_migrations.v2_backfill_derived_data),
+    (3, 'hot-path secondary indexes', schema_migrations.v3_hot_path_indexes),
+    (4, 'mosscoin ledger opening balances', schema_migrations.v4_mosscoin_ledger),
+    (5, 'cache version counters', schema_migrations.v5_cache_versions),
+    (6, 'item vendor/name index for imports', schema_migrations.v6_item_vendor_name_index),
+    (7, 'per-item low-stock thresholds and watchlist', schema_migrations.v7_low_stock_watchlist),
+    (8, 'bill client ids for POS batch uploads', schema_migrations.v8_bill_client_ids),
+    (9, 'leaderboard buckets of 1/16 kg', schema_migrations.v9_finer_leaderboard_buckets),
+    (10, 'leaderboard counts per score and id block', schema_migrations.v10_leaderboard_scores),
+]
+
+def pending_migrations():
+    """Versions in MIGRATIONS that this database has not applied yet."""
+    if not db.inspect(db.engine).has_table(SchemaVersion.__tablename__):
+        return [version for version, _, _ in MIGRATIONS]
+    applied = {version for (version,) in db.session.query(SchemaVersion.version)}
+    return [version for version, _, _ in MIGRATIONS if version not in applied]
+
+def migrate_database():
+    """Apply pending migrations and return the versions that were applied."""
+    SchemaVersion.__table__.create(bind=db.engine, checkfirst=True)
+    applied = {version for (version,) in db.session.query(SchemaVersion.version)}
+    db.session.commit()
+    newly_applied = []
+    for version, description, migration in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            migration(db.session.connection())
+            db.session.add(SchemaVersion(version=version, description=description))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        newly_applied.append(version)
+    return newly_applied
+
+# --- Synthetic Data ---
+SEED_PASSWORD = 'mosspay-seed'
+SEED_CATEGORIES = ['Grocery', 'Organic Produce', 'Zero Waste', 'Dairy', 'Household', 'Bakery']
+SEED_OFFERS = [
+    ('{pct}% Off Jute Bags', 'Bring your MossCoins and save on reusable bags.'),
+    ('Free Cloth Bag', 'A free organic cotton tote with any purchase.'),
+    ('{pct}% Off Local Produce', 'Discount on fruit and vegetables from nearby farms.'),
+    ('Refill Discount', '{pct}% off when you refill your own containers.'),
+]
+
+def seed_synthetic_data(users, vendors, items_per_vendor, bills, offers, max_lines=5, days=365,
+                        batch_size=20000, seed=0, log=print):
+    """Bulk-insert a synthetic dataset on top of any existing rows and rebuild derived data.
+
+    Rows are written with explicit ids through executemany inserts on the
+    tables themselves (skipping the ORM's per-row bookkeeping), in batches of
+    `batch_size` committed one at a time. Every seeded account shares the
+    password SEED_PASSWORD.
+    """
+    rng = random.Random(seed)
+    password_hash = PASSWORD_HASHER.hash(SEED_PASSWORD)
+    first_user, first_vendor, first_item, first_bill, first_line = [
+        (db.session.query(func.max(column)).scalar() or 0) + 1
+        for column in (User.id, Vendor.id, Item.id, Bill.id, BillItem.id)
+    ]
+    now = datetime.utcnow()
+
+    def insert_rows(model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == batch_size:
+                db.session.execute(model.__table__.insert(), batch)
+                db.session.commit()
+                batch = []
+        if batch:
+            db.session.execute(model.__table__.insert(), batch)
+            db.session.commit()
+
+    log(f'{vendors} vendors...')
+    insert_rows(Vendor, ({
+        'id': vendor_id,
+        'business_name': f'Green Store {vendor_id}',
+        'contact_name': f'Owner {vendor_id}',
+        'mobile': f'7{vendor_id:09d}',
+        'address': f'{vendor_id} Market Road',
+        'email': f'vendor{vendor_id}@seed.mosspay.test',
+        'password_hash': password_hash,
+        'shop_category': rng.choice(SEED_CATEGORIES),
+        'description': 'Local shop selling eco-friendly everyday goods.'
+    } for vendor_id in range(first_vendor, first_vendor + vendors)))
+
+    # Items of vendor k are first_item + k * items_per_vendor onwards.
+    products = list(MOCK_CARBON_DB.items())
+    item_count = vendors * items_per_vendor
+    prices = [round(rng.uniform(10, 500), 2) for _ in range(item_count)]
+    carbon = [products[offset % len(products)][1] for offset in range(item_count)]
+
+    def item_rows():
+        for offset in range(item_count):
+            yield {
+                'id': first_item + offset,
+                'name': products[offset % len(products)][0],
+                'price': prices[offset],
+                'unit': 'pcs',
+                'stock': rng.randint(0, 500),
+                'carbon_saved_kg': carbon[offset],
+                'vendor_id': first_vendor + offset // items_per_vendor
+            }
+
+    log(f'{item_count} items...')
+    insert_rows(Item, item_rows())
+
+    log(f'{users} users...')
+    insert_rows(User, ({
+        'id': user_id,
+        'fullname': f'Seed User {user_id}',
+        'email': f'user{user_id}@seed.mosspay.test',
+        'phone': f'8{user_id:09d}',
+        'dob': date(rng.randint(1950, 2006), rng.randint(1, 12), rng.randint(1, 28)),
+        'password_hash': password_hash,
+        'mosscoin_balance': 150,
+        'total_co2_saved': 0.0,
+        'green_purchases': 0,
+        'eco_streak': rng.randint(0, 30),
+        'rank': 0
+    } for user_id in range(first_user, first_user + users)))
+
+    # Logged bills count towards the customer's totals, as if settled in the app.
+    user_co2 = [0.0] * users
+    user_coins = [0] * users
+    user_purchases = [0] * users
+    line_ids = iter(range(first_line, first_line + bills * max_lines))
+
+    log(f'{bills} bills...')
+    bill_batch, line_batch = [], []
+    for bill_id in range(first_bill, first_bill + bills):
+        customer = rng.randrange(users)
+        vendor = rng.randrange(vendors)
+        offsets = rng.sample(range(vendor * items_per_vendor, (vendor + 1) * items_per_vendor),
+                             rng.randint(1, min(max_lines, items_per_vendor)))
+        total_amount = 0.0
+        total_carbon = 0.0
+        for offset in offsets:
+            quantity = rng.randint(1, 3)
+            total_amount += prices[offset] * quantity
+            total_carbon += carbon[offset] * quantity
+            line_batch.append({
+                'id': next(line_ids), 'bill_id': bill_id, 'item_id': first_item + offset,
+                'quantity': quantity, 'price_at_sale': prices[offset], 'carbon_at_sale': carbon[offset]
+            })
+        status = 'logged' if rng.random() < 0.8 else 'pending'
+        coins = int(total_carbon * 10)
+        if status == 'logged':
+            user_co2[customer] += total_carbon
+            user_coins[customer] += coins
+            user_purchases[customer] += 1
+        bill_batch.append({
+            'id': bill_id, 'vendor_id': first_vendor + vendor, 'customer_id': first_user + customer,
+            'total_amount': round(total_amount, 2), 'total_carbon_saved': total_carbon,
+            'mosscoins_to_award': coins, 'status': status,
+            'created_at': now - timedelta(seconds=rng.randrange(days * 86400))
+        })
+        if len(bill_batch) == batch_size:
+            db.session.execute(Bill.__table__.insert(), bill_batch)
+            db.session.execute(BillItem.__table__.insert(), line_batch)
+            db.session.commit()
+            bill_batch, line_batch = [], []
+    if bill_batch:
+        db.session.execute(Bill.__table__.insert(), bill_batch)
+        db.session.execute(BillItem.__table__.insert(), line_batch)
+        db.session.commit()
+
+    log('customer totals...')
+    changed = [offset for offset in range(users) if user_purchases[offset]]
+    for start in range(0, len(changed), batch_size):
+        db.session.execute(update(User), [{
+            'id': first_user + offset,
+            'total_co2_saved': user_co2[offset],
+            'mosscoin_balance': 150 + user_coins[offset],
+            'green_purchases': user_purchases[offset]
+        } for offset in changed[start:start + batch_size]])
+        db.session.commit()
+
+    log(f'{offers} offers...')
+    def offer_rows():
+        for offer_id in range(offers):
+            title, description = rng.choice(SEED_OFFERS)
+            pct = rng.choice([5, 10, 15, 20])
+            yield {
+                'vendor_id': first_vendor + rng.randrange(vendors),
+                'title': title.format(pct=pct),
+                'description': description.format(pct=pct),
+                'mosscoin_cost': rng.choice([100, 250, 500, 1000]),
+                'status': 'active' if rng.random() < 0.7 else 'expired',
+                'created_at': now - timedelta(seconds=rng.randrange(days * 86400))
+            }
+    insert_rows(Offer, offer_rows())
+    REWARD_CATALOGUE.invalidate()
+
+    log('leaderboard, sales rollups, low-stock watchlist and ledger...')
+    rebuild_leaderboard_data()
+    rebuild_sales_rollup_data()
+    rebuild_low_stock_data()
+    record_opening_balances()
+    db.session.commit()
+    return {'users': users, 'vendors': vendors, 'items': item_count, 'bills': bills, 'offers': offers}
+
+# --- CLI Commands ---
+@cli_bp.cli.command('db-upgrade')
+def db_upgrade():
+    """Create or upgrade the database schema to the latest version."""
+    applied = migrate_database()
+    if applied:
+        print(f"Applied migrations: {', '.join(map(str, applied))}")
+    else:
+        print('Database is up to date.')
+
+@cli_bp.cli.command('rebuild-leaderboard')
+def rebuild_leaderboard():
+    """Recompute the leaderboard histograms and every User.rank from scratch."""
+    print(f'Rebuilt {rebuild_leaderboard_data()} leaderboard buckets.')
+
+@cli_bp.cli.command('rebuild-search-index')
+def rebuild_search_index():
+    """Create the vendor/item full-text index and refill it from the tables."""
+    if rebuild_search_index_data():
+        print('Rebuilt the search index.')
+    else:
+        print('Full-text search needs SQLite FTS5; falling back to LIKE queries.')
+
+@cli_bp.cli.command('rebuild-sales-rollups')
+def rebuild_sales_rollups():
+    """Recompute every vendor's daily sales rollups from the bill tables."""
+    rebuild_sales_rollup_data()
+    print('Rebuilt the sales rollups.')
+
+@cli_bp.cli.command('rebuild-low-stock')
+def rebuild_low_stock():
+    """Recompute the low-stock watchlist from item stock and thresholds."""
+    print(f'{rebuild_low_stock_data()} item(s) are low on stock.')
+
+@cli_bp.cli.command('build-assets')
+def build_assets():
+    """Write gzip/brotli variants of the static text assets for the hashed asset URLs."""
+    written, removed = ASSETS.build()
+    print(f'Wrote {written} compressed asset(s), removed {removed} stale one(s).')
+
+@cli_bp.cli.command('seed-data')
+@click.option('--users', default=10000, show_default=True)
+@click.option('--vendors', default=200, show_default=True)
+@click.option('--items-per-vendor', default=40, show_default=True)
+@click.option('--bills', default=100000, show_default=True)
+@click.option('--offers', default=500, show_default=True)
+@click.option('--max-lines', default=5, show_default=True, help='Most line items per bill.')
+@click.option('--days', default=365, show_default=True, help='Spread bills over this many past days.')
+@click.option('--batch-size', default=20000, show_default=True)
+@click.option('--seed', default=0, show_default=True, help='Random seed; the same seed gives the same data.')
+def seed_data(users, vendors, items_per_vendor, bills, offers, max_lines, days, batch_size, seed):
+    """Fill the database with synthetic users, vendors, items, bills and offers."""
+    migrate_database()
+    started = time.perf_counter()
+    counts = seed_synthetic_data(users, vendors, items_per_vendor, bills, offers, max_lines=max_lines,
+                                 days=days, batch_size=batch_size, seed=seed)
+    print(f"Seeded {', '.join(f'{count} {name}' for name, count in counts.items())} "
+          f"in {time.perf_counter() - started:.0f}s. Password for every account: {SEED_PASSWORD}")
+
+# --- Application Factory ---
+# Production runs under a pre-forking server (see gunicorn.conf.py and
+# wsgi.py): the master builds the app and, once ready, calls preload(), so the carbon factor
+# index, hashed asset table and reward catalogue are loaded once and shared
+# copy-on-write, then each worker calls after_fork() and opens its own
+# database connections on first use. Identity state stays per worker, as do
+# metrics unless METRICS_DIR is set, events unless EVENT_RELAY_PATH is set and
+# rate-limit buckets unless RATE_LIMIT_STORE is set.
+def create_app(config=None):
+    """Build the app: configuration, extensions, blueprints and request hooks.
+
+    `config` overrides settings read from the environment. The engine is
+    created here but does not connect until the first query.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///' + os.path.join(basedir, 'mosspay.db'))
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'a-very-secret-key-you-should-change')
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    login_manager.init_app(app)
+    ASSETS.init_app(app)
+    for blueprint in (consumer_bp, vendor_bp, api_bp, cli_bp):
+        app.register_blueprint(blueprint)
+    app.add_url_rule('/', 'welcome_page', welcome_page)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    app.register_error_handler(HashingBusy, hashing_busy)
+
+    if METRICS_ENABLED:
+        app.before_request(start_request_metrics)
+        app.after_request(remember_response_status)
+        app.teardown_request(record_request_metrics)
+    if PROFILE_DIR:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        app.before_request(start_request_profile)
+        app.after_request(add_profile_header)
+        app.teardown_request(save_request_profile)
+    app.before_request(admit_request)  # after the metrics hooks, so shed requests are counted
+    app.teardown_request(release_write_slot)
+    if PROXY_COUNT:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_COUNT)
+    return app
+
+def preload(app):
+    """Load shared read-only data in the master, then close its connections before workers fork.
+
+    Skipped, with a warning, while migrations are pending: the cached data
+    lives in tables that may not exist yet.
+    """
+    with app.app_context():
+        pending = pending_migrations()
+        if pending:
+            app.logger.warning('Not preloading caches: run `flask db-upgrade` (pending migrations %s)',
+                               ', '.join(map(str, pending)))
+        else:
+            REWARD_CATALOGUE.get()
+        for engine in db.engines.values():
+            engine.dispose()
+    # Objects that exist now are never collected, so the collector's
+    # bookkeeping does not write to (and copy) the pages workers share.
+    gc.freeze()
+
+def after_fork(app):
+    """Start a forked worker with an empty connection pool, leaving the master's sockets alone."""
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    if METRICS_ENABLED:
+        METRICS.start_snapshots()
+    EVENTS.start_relay()
+
 # --- Main ---
 if __name__ == '__main__':
+    app = create_app()
     with app.app_context():
-        db.create_all() 
+        migrate_database()
     app.run(debug=True)
\ No newline at end of file
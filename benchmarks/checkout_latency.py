@@ -0,0 +1,82 @@
+"""Checkout latency against cart size for /api/vendor/send-bill-to-phone.
+
+Runs against a throwaway SQLite database so it never touches mosspay.db:
+
+    python benchmarks/checkout_latency.py --sizes 1 5 10 20 40 80 --runs 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 10, 20, 40, 80])
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limits
+
+    from datetime import date
+    from sqlalchemy import event
+    from app import create_app, db, User, Vendor, Item
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        vendor = Vendor(business_name='Bench Store', contact_name='Bench', mobile='9000000000',
+                        address='Bench Street', email='bench@vendor.test', password_hash='x')
+        customer = User(fullname='Bench Customer', email='bench@user.test', phone='9999999999',
+                        dob=date(1990, 1, 1), password_hash='x')
+        db.session.add_all([vendor, customer])
+        db.session.flush()
+        max_size = max(args.sizes)
+        stock = args.runs * len(args.sizes) + 1
+        db.session.add_all([
+            Item(name=f'Item {n}', price=10.0 + n, unit='pcs', stock=stock,
+                 carbon_saved_kg=0.5, vendor_id=vendor.id)
+            for n in range(max_size)
+        ])
+        db.session.commit()
+        vendor_id = vendor.id
+        item_ids = [item.id for item in Item.query.order_by(Item.id)]
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a, **kw: statements.append(1))
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['vendor_id'] = vendor_id
+
+    print(f'{"lines":>6} {"p50 ms":>9} {"p95 ms":>9} {"max ms":>9} {"queries":>8}')
+    try:
+        for size in args.sizes:
+            cart = [{'id': item_id, 'quantity': 1} for item_id in item_ids[:size]]
+            timings = []
+            statements.clear()
+            for _ in range(args.runs):
+                started = time.perf_counter()
+                response = client.post('/api/vendor/send-bill-to-phone',
+                                       json={'phone': '9999999999', 'cart': cart})
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 201, response.get_json()
+            timings.sort()
+            p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+            print(f'{size:>6} {statistics.median(timings):>9.2f} {p95:>9.2f} '
+                  f'{timings[-1]:>9.2f} {len(statements) / args.runs:>8.1f}')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Concurrent checkouts and page reads against one SQLite file.
+
+Writer threads post bills through /api/vendor/send-bill-to-phone while
+reader threads page through the vendor's transactions and the customer's
+bills. Reports throughput, p95 latency and any failed requests, such as
+"database is locked". All threads share one interpreter, so latencies
+include GIL contention; the failure count is the figure to watch.
+Compare journal modes with:
+
+    python benchmarks/concurrent_checkout.py --journal-mode WAL
+    python benchmarks/concurrent_checkout.py --journal-mode DELETE --busy-timeout-ms 0
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--readers', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--journal-mode', default='WAL')
+    parser.add_argument('--busy-timeout-ms', type=int, default=5000)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limits
+    os.environ['SQLITE_JOURNAL_MODE'] = args.journal_mode
+    os.environ['SQLITE_BUSY_TIMEOUT_MS'] = str(args.busy_timeout_ms)
+    os.environ.setdefault('DB_POOL_SIZE', str(args.writers + args.readers))
+
+    from datetime import date
+    from app import create_app, db, migrate_database, User, Vendor, Item
+    app = create_app()
+    app.logger.disabled = True  # failures are tallied below instead of logged
+
+    with app.app_context():
+        migrate_database()
+        vendor = Vendor(business_name='Bench Store', contact_name='Bench', mobile='9000000000',
+                        address='Bench Street', email='bench@vendor.test', password_hash='x')
+        customer = User(fullname='Bench Customer', email='bench@user.test', phone='9999999999',
+                        dob=date(1990, 1, 1), password_hash='x')
+        db.session.add_all([vendor, customer])
+        db.session.flush()
+        items = [Item(name=f'Item {n}', price=10.0, unit='pcs', stock=10 ** 9,
+                      carbon_saved_kg=0.5, vendor_id=vendor.id) for n in range(10)]
+        db.session.add_all(items)
+        db.session.commit()
+        vendor_id, customer_id = vendor.id, customer.id
+        cart = [{'id': item.id, 'quantity': 1} for item in items]
+
+    deadline = time.perf_counter() + args.seconds
+    results = {'write': [], 'read': []}
+    failures = []
+    lock = threading.Lock()
+
+    def run(kind):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['vendor_id'] = vendor_id
+            sess['_user_id'] = str(customer_id)
+        timings = []
+        turn = 0
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            if kind == 'write':
+                response = client.post('/api/vendor/send-bill-to-phone',
+                                       json={'phone': '9999999999', 'cart': cart})
+            else:
+                url = '/api/vendor/transactions' if turn % 2 else '/api/consumer/bills'
+                response = client.get(url)
+            timings.append(time.perf_counter() - started)
+            turn += 1
+            if response.status_code >= 400:
+                with lock:
+                    error = (response.get_json() or {}).get('error') or ''
+                    failures.append((kind, response.status_code, error.splitlines()[0] if error else ''))
+        with lock:
+            results[kind].extend(timings)
+
+    threads = [threading.Thread(target=run, args=('write',)) for _ in range(args.writers)]
+    threads += [threading.Thread(target=run, args=('read',)) for _ in range(args.readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    os.remove(db_path)
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    print(f'journal_mode={args.journal_mode} busy_timeout={args.busy_timeout_ms}ms '
+          f'writers={args.writers} readers={args.readers} seconds={args.seconds}')
+    for kind in ('write', 'read'):
+        timings = results[kind]
+        print(f'{kind:>6}: {len(timings) / args.seconds:8.1f} req/s  '
+              f'p50 {percentile(timings, 0.5) * 1000:7.2f} ms  p95 {percentile(timings, 0.95) * 1000:7.2f} ms')
+    print(f'failed requests: {len(failures)}')
+    for kind, status, error in failures[:5]:
+        print(f'  {kind} {status}: {error}')
+
+
+if __name__ == '__main__':
+    main()
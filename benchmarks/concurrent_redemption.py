@@ -0,0 +1,103 @@
+"""Concurrent MossCoin redemptions against one balance.
+
+Many threads redeem the same offer for the same customer at once. Reports
+redemption throughput and then audits the result: the final balance must
+equal the starting balance minus the successful redemptions, must never go
+negative, and must match the ledger.
+
+    python benchmarks/concurrent_redemption.py --threads 16 --balance 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--balance', type=int, default=2000)
+    parser.add_argument('--cost', type=int, default=1)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limits
+    os.environ.setdefault('DB_POOL_SIZE', str(args.threads))
+
+    from datetime import date
+    from sqlalchemy import func
+    from app import create_app, db, migrate_database, User, Vendor, Offer, MossCoinLedger
+    app = create_app()
+    app.logger.disabled = True
+
+    with app.app_context():
+        migrate_database()
+        vendor = Vendor(business_name='Bench Store', contact_name='Bench', mobile='9000000000',
+                        address='Bench Street', email='bench@vendor.test', password_hash='x')
+        customer = User(fullname='Bench Customer', email='bench@user.test', phone='9999999999',
+                        dob=date(1990, 1, 1), password_hash='x', mosscoin_balance=args.balance)
+        db.session.add_all([vendor, customer])
+        db.session.flush()
+        offer = Offer(vendor_id=vendor.id, title='Bench offer', mosscoin_cost=args.cost)
+        db.session.add(offer)
+        db.session.add(MossCoinLedger(user_id=customer.id, amount=args.balance,
+                                      balance_after=args.balance, reason='opening_balance'))
+        db.session.commit()
+        customer_id, reward_id = customer.id, f'offer_{offer.id}'
+
+    outcomes = {'redeemed': 0, 'refused': 0, 'failed': 0}
+    lock = threading.Lock()
+    started = time.perf_counter()
+    deadline = started + args.seconds
+    finished = threading.Event()
+
+    def run():
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(customer_id)
+        while time.perf_counter() < deadline and not finished.is_set():
+            response = client.post('/api/consumer/redeem-reward', json={'reward_id': reward_id})
+            outcome = ('redeemed' if response.status_code == 200 else
+                       'refused' if response.status_code == 400 else 'failed')
+            with lock:
+                outcomes[outcome] += 1
+            if outcome == 'refused':
+                finished.set()
+
+    threads = [threading.Thread(target=run) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    with app.app_context():
+        balance = db.session.get(User, customer_id).mosscoin_balance
+        ledger_total, debits = db.session.query(
+            func.sum(MossCoinLedger.amount),
+            func.count(MossCoinLedger.id).filter(MossCoinLedger.amount < 0)
+        ).filter(MossCoinLedger.user_id == customer_id).one()
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+
+    expected = args.balance - outcomes['redeemed'] * args.cost
+    print(f"threads={args.threads} redeemed={outcomes['redeemed']} refused={outcomes['refused']} "
+          f"failed={outcomes['failed']} in {elapsed:.2f}s "
+          f"({outcomes['redeemed'] / elapsed:.1f} redemptions/s)")
+    print(f'balance={balance} expected={expected} ledger_total={ledger_total} ledger_debits={debits}')
+    consistent = balance == expected == ledger_total and debits == outcomes['redeemed'] and balance >= 0
+    print('consistent' if consistent else 'LOST OR DUPLICATED UPDATES')
+    sys.exit(0 if consistent else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+"""Drive the main routes in-process and record latency, throughput and queries per request.
+
+Point it at a database filled by `flask seed-data` (a copy, since checkout
+writes bills and takes stock):
+
+    DATABASE_URL=sqlite:////tmp/mosspay.db flask seed-data --users 100000 --bills 1000000
+    python benchmarks/harness.py --database /tmp/mosspay.db --concurrency 8 --label baseline
+    python benchmarks/harness.py --database /tmp/mosspay.db --compare benchmarks/results/<run>.json
+
+Each run is written to benchmarks/results/ as JSON so later runs can be compared.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEARCH_TERMS = ['organic', 'jute', 'milk', 'rice', 'green store', 'soap', 'local apples']
+
+
+def scenarios(sample):
+    """name -> (identity, request builder); builders take a random.Random and return client kwargs."""
+    def checkout(rng):
+        vendor_id, item_ids = rng.choice(sample['vendor_items'])
+        cart = [{'id': item_id, 'quantity': 1} for item_id in rng.sample(item_ids, min(3, len(item_ids)))]
+        return vendor_id, {'method': 'POST', 'path': '/api/vendor/send-bill-to-phone',
+                           'json': {'phone': rng.choice(sample['phones']), 'cart': cart}}
+
+    def vendor_get(path):
+        return lambda rng: (rng.choice(sample['vendor_items'])[0], {'method': 'GET', 'path': path})
+
+    def consumer_get(path):
+        return lambda rng: (rng.choice(sample['user_ids']), {'method': 'GET', 'path': path})
+
+    return {
+        'checkout': ('vendor', checkout),
+        'customer_insights': ('vendor', vendor_get('/vendor/customer_insights')),
+        'vendor_transactions': ('vendor', vendor_get('/api/vendor/transactions')),
+        'vendor_dashboard': ('vendor', vendor_get('/vendor/dashboard')),
+        'leaderboard': ('consumer', consumer_get('/consumer/leaderboard')),
+        'consumer_dashboard': ('consumer', consumer_get('/consumer/dashboard')),
+        'consumer_bills': ('consumer', consumer_get('/api/consumer/bills')),
+        'redeem': ('consumer', consumer_get('/consumer/redeem')),
+        'search': ('consumer', lambda rng: (rng.choice(sample['user_ids']), {
+            'method': 'GET', 'path': '/api/consumer/vendors', 'query_string': {'q': rng.choice(SEARCH_TERMS)}
+        })),
+    }
+
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='SQLite file to use (default: DATABASE_URL or mosspay.db)')
+    parser.add_argument('--scenarios', nargs='+', help='subset of scenarios to run (default: all)')
+    parser.add_argument('--requests', type=int, default=500, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output-dir', default=os.path.join(ROOT, 'benchmarks', 'results'))
+    parser.add_argument('--compare', help='earlier results file to compare against')
+    args = parser.parse_args()
+
+    if args.database:
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.abspath(args.database)
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limits
+
+    from sqlalchemy import event, func
+    from app import create_app, db, User, Item
+    app = create_app()
+
+    app.logger.disabled = True
+    with app.app_context():
+        rng = random.Random(args.seed)
+        user_count = db.session.query(func.count(User.id)).scalar()
+        if not user_count:
+            sys.exit('The database has no users; fill it with `flask seed-data` first.')
+        users = db.session.query(User.id, User.phone).order_by(func.random()).limit(1000).all()
+        vendor_items = {}
+        for vendor_id, item_id in db.session.query(Item.vendor_id, Item.id).filter(Item.stock > 100):
+            vendor_items.setdefault(vendor_id, []).append(item_id)
+        sample = {
+            'user_ids': [user_id for user_id, _ in users],
+            'phones': [phone for _, phone in users],
+            'vendor_items': sorted(vendor_items.items())[:1000],
+        }
+        local = threading.local()
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count_statement(*_):
+            local.statements = getattr(local, 'statements', 0) + 1
+
+    available = scenarios(sample)
+    names = args.scenarios or list(available)
+    unknown = set(names) - set(available)
+    if unknown:
+        sys.exit(f"Unknown scenarios: {', '.join(sorted(unknown))}. Choose from {', '.join(available)}.")
+
+    def run_one(identity, build, worker_rng):
+        ident, kwargs = build(worker_rng)
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            if identity == 'vendor':
+                sess['vendor_id'] = ident
+            else:
+                sess['_user_id'] = str(ident)
+                sess['_fresh'] = True
+        method = kwargs.pop('method')
+        path = kwargs.pop('path')
+        local.statements = 0
+        started = time.perf_counter()
+        response = client.open(path, method=method, **kwargs)
+        elapsed = time.perf_counter() - started
+        return elapsed, local.statements, response.status_code < 400
+
+    results = {}
+    print(f'{"scenario":<20} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"req/s":>8} {"queries":>8} {"errors":>7}')
+    for name in names:
+        identity, build = available[name]
+        seeds = [rng.random() for _ in range(args.requests)]
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            outcomes = list(pool.map(lambda seed: run_one(identity, build, random.Random(seed)), seeds))
+        wall = time.perf_counter() - started
+        timings = sorted(elapsed * 1000 for elapsed, _, _ in outcomes)
+        results[name] = {
+            'requests': len(outcomes),
+            'errors': sum(1 for _, _, ok in outcomes if not ok),
+            'p50_ms': round(statistics.median(timings), 3),
+            'p95_ms': round(percentile(timings, 0.95), 3),
+            'p99_ms': round(percentile(timings, 0.99), 3),
+            'throughput_rps': round(len(outcomes) / wall, 1),
+            'queries_per_request': round(sum(count for _, count, _ in outcomes) / len(outcomes), 2),
+        }
+        row = results[name]
+        print(f'{name:<20} {row["p50_ms"]:>8.2f} {row["p95_ms"]:>8.2f} {row["p99_ms"]:>8.2f} '
+              f'{row["throughput_rps"]:>8.1f} {row["queries_per_request"]:>8.2f} {row["errors"]:>7}')
+
+    run = {
+        'label': args.label,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'git_revision': git_revision(),
+        'database': app.config['SQLALCHEMY_DATABASE_URI'],
+        'users': user_count,
+        'concurrency': args.concurrency,
+        'requests_per_scenario': args.requests,
+        'scenarios': results,
+    }
+    os.makedirs(args.output_dir, exist_ok=True)
+    path = os.path.join(args.output_dir, f"{datetime.now():%Y%m%d-%H%M%S}-{args.label}.json")
+    with open(path, 'w') as f:
+        json.dump(run, f, indent=2)
+    print(f'Saved {path}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f'\nAgainst {baseline["label"]} ({baseline.get("git_revision")}, {baseline["started_at"]}):')
+        print(f'{"scenario":<20} {"p50":>9} {"p95":>9} {"p99":>9} {"req/s":>9} {"queries":>9}')
+        for name, row in results.items():
+            before = baseline['scenarios'].get(name)
+            if not before:
+                continue
+            change = [f'{(row[key] - before[key]) / before[key] * 100:>+8.1f}%' if before[key] else f'{"n/a":>9}'
+                      for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps')]
+            queries = f'{row["queries_per_request"] - before["queries_per_request"]:>+9.2f}'
+            print(f'{name:<20} {" ".join(change)} {queries}')
+
+
+if __name__ == '__main__':
+    main()
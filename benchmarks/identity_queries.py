@@ -0,0 +1,93 @@
+"""Queries and latency per request on the dashboard routes, with and without the identity cache.
+
+Runs against a throwaway SQLite database so it never touches mosspay.db:
+
+    python benchmarks/identity_queries.py --runs 200 --ttl 30
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = [
+    ('consumer', '/consumer/dashboard'),
+    ('consumer', '/consumer/redeem'),
+    ('consumer', '/consumer/my_sprout'),
+    ('vendor', '/vendor/dashboard'),
+    ('vendor', '/vendor/manage_profile'),
+    ('vendor', '/vendor/settings'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=200)
+    parser.add_argument('--ttl', type=int, default=30, help='IDENTITY_CACHE_SECONDS for the cached pass')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    from datetime import date
+    from sqlalchemy import event
+    from app import create_app, db, User, Vendor, Item, IDENTITY_CACHE, rebuild_leaderboard_data
+    app = create_app()
+
+    with app.app_context():
+        db.create_all()
+        vendor = Vendor(business_name='Bench Store', contact_name='Bench', mobile='9000000000',
+                        address='Bench Street', email='bench@vendor.test', password_hash='x')
+        customer = User(fullname='Bench Customer', email='bench@user.test', phone='9999999999',
+                        dob=date(1990, 1, 1), password_hash='x')
+        db.session.add_all([vendor, customer])
+        db.session.flush()
+        db.session.add_all([
+            Item(name=f'Item {n}', price=10.0, unit='pcs', stock=n % 20,
+                 carbon_saved_kg=0.5, vendor_id=vendor.id)
+            for n in range(50)
+        ])
+        rebuild_leaderboard_data()
+        db.session.commit()
+        vendor_id, customer_id = vendor.id, customer.id
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute',
+                     lambda *a, **kw: statements.append(1))
+
+    clients = {'consumer': app.test_client(), 'vendor': app.test_client()}
+    with clients['consumer'].session_transaction() as sess:
+        sess['_user_id'] = str(customer_id)
+        sess['_fresh'] = True
+    with clients['vendor'].session_transaction() as sess:
+        sess['vendor_id'] = vendor_id
+
+    print(f'{"route":<24} {"cache":>6} {"p50 ms":>9} {"p95 ms":>9} {"queries":>8}')
+    try:
+        for route_kind, path in ROUTES:
+            for ttl in (0, args.ttl):
+                IDENTITY_CACHE.ttl = ttl
+                client = clients[route_kind]
+                client.get(path)  # warm the caches
+                timings = []
+                statements.clear()
+                for _ in range(args.runs):
+                    started = time.perf_counter()
+                    response = client.get(path)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, (path, response.status_code)
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                print(f'{path:<24} {"on" if ttl else "off":>6} {statistics.median(timings):>9.2f} '
+                      f'{p95:>9.2f} {len(statements) / args.runs:>8.1f}')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Login burst against the password hashing pool, with page views running alongside.
+
+Runs against a throwaway SQLite database so it never touches mosspay.db:
+
+    python benchmarks/login_burst.py --logins 64 --concurrency 16 --workers 2 --queue 32
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def summary(timings):
+    if not timings:
+        return f'{"-":>9} {"-":>9}'
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    return f'{statistics.median(timings):>9.1f} {p95:>9.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=64)
+    parser.add_argument('--concurrency', type=int, default=16, help='request threads posting logins')
+    parser.add_argument('--workers', type=int, default=2, help='PASSWORD_HASH_WORKERS')
+    parser.add_argument('--queue', type=int, default=32, help='PASSWORD_HASH_QUEUE')
+    parser.add_argument('--method', default='scrypt', help='PASSWORD_HASH_METHOD')
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    os.environ.setdefault('RATE_LIMIT_ENABLED', '0')  # measure the app, not the limits
+    os.environ['PASSWORD_HASH_WORKERS'] = str(args.workers)
+    os.environ['PASSWORD_HASH_QUEUE'] = str(args.queue)
+    os.environ['PASSWORD_HASH_METHOD'] = args.method
+
+    from datetime import date
+    from app import create_app, db, User, PASSWORD_HASHER
+    app = create_app()
+
+    app.logger.disabled = True
+    with app.app_context():
+        db.create_all()
+        password_hash = PASSWORD_HASHER.hash('bench-password')
+        db.session.add_all([
+            User(fullname=f'Bench User {n}', email=f'bench{n}@user.test', phone=f'9{n:09d}',
+                 dob=date(1990, 1, 1), password_hash=password_hash)
+            for n in range(args.logins)
+        ])
+        db.session.commit()
+
+    login_timings, page_timings, statuses = [], [], {}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def login(n):
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/consumer/login', data={'email': f'bench{n}@user.test',
+                                                        'password': 'bench-password'})
+        elapsed = (time.perf_counter() - started) * 1000
+        ok = response.status_code == 302 and response.location.endswith('/consumer/dashboard')
+        with lock:
+            login_timings.append(elapsed)
+            statuses['ok' if ok else 'rejected'] = statuses.get('ok' if ok else 'rejected', 0) + 1
+
+    def browse():
+        client = app.test_client()
+        while not done.is_set():
+            started = time.perf_counter()
+            client.get('/')
+            page_timings.append((time.perf_counter() - started) * 1000)
+
+    try:
+        browser = threading.Thread(target=browse)
+        browser.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(login, range(args.logins)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        browser.join()
+
+        stats = PASSWORD_HASHER.stats()
+        print(f'method {stats["method"]}, {args.workers} hash workers, queue {args.queue}, '
+              f'{args.concurrency} login threads')
+        print(f'{"":<14} {"p50 ms":>9} {"p95 ms":>9}')
+        print(f'{"login":<14} {summary(login_timings)}')
+        print(f'{"page view":<14} {summary(page_timings)}')
+        print(f'{"hash":<14} {stats["hash_seconds_p50"] * 1000:>9.1f} {stats["hash_seconds_p95"] * 1000:>9.1f}')
+        print(f'{"queue wait":<14} {stats["wait_seconds_p50"] * 1000:>9.1f} {stats["wait_seconds_p95"] * 1000:>9.1f}')
+        print(f'logins ok {statuses.get("ok", 0)}, rejected {statuses.get("rejected", 0)}, '
+              f'{statuses.get("ok", 0) / elapsed:.1f} logins/s')
+    finally:
+        os.remove(db_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cost of the rate limiter and write concurrency cap, alone and per request.
+
+First times a bucket take on each store, from one thread and from several at
+once (as a gthread worker would), then a cheap API write through the test
+client with admission control off, on with in-memory buckets and on with the
+shared SQLite store, and finally the admission hooks alone. Runs against throwaway SQLite
+files so it never touches mosspay.db:
+
+    python benchmarks/rate_limiter_overhead.py --takes 100000 --threads 4 --requests 2000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def time_takes(store, limit, takes, threads, keys):
+    """Microseconds per take with `threads` threads sharing `takes` takes."""
+    per_thread = takes // threads
+
+    def work(offset):
+        for n in range(per_thread):
+            store.take(f'bench:ip:{(n + offset) % keys}', limit)
+
+    workers = [threading.Thread(target=work, args=(n * 7919,)) for n in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return (time.perf_counter() - started) * 1e6 / (per_thread * threads)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--takes', type=int, default=100000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--keys', type=int, default=10000, help='distinct client keys')
+    parser.add_argument('--requests', type=int, default=2000, help='requests per configuration and round')
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    store_dir = tempfile.mkdtemp()
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+    # Generous limits: this measures the checks, not the rejections.
+    os.environ['RATE_LIMITS_JSON'] = '{"api": {"ip": "1000000/second", "vendor": "1000000/second"}}'
+
+    from flask import session
+    import app as mosspay
+    from rate_limits import Limit, MemoryStore, SQLiteStore
+    app = mosspay.create_app()
+
+    limit = Limit(1000000, 1)
+    print(f'{"store":<8} {"threads":>7} {"us/take":>9}')
+    for name, make_store in (('memory', MemoryStore),
+                             ('sqlite', lambda: SQLiteStore(os.path.join(store_dir, 'limits.db')))):
+        for threads in sorted({1, args.threads}):
+            takes = args.takes if name == 'memory' else args.takes // 10
+            print(f'{name:<8} {threads:>7} {time_takes(make_store(), limit, takes, threads, args.keys):>9.2f}')
+
+    with app.app_context():
+        db = mosspay.db
+        db.create_all()
+        vendor = mosspay.Vendor(business_name='Bench Store', contact_name='Bench', mobile='9000000000',
+                                address='Bench Street', email='bench@vendor.test', password_hash='x')
+        db.session.add(vendor)
+        db.session.commit()
+        vendor_id = vendor.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['vendor_id'] = vendor_id
+
+    def run():
+        timings = []
+        for _ in range(args.requests):
+            started = time.perf_counter()
+            # Rejected by the view before touching the database, so the limiter is most of the work left.
+            response = client.post('/api/vendor/change-password', json={})
+            timings.append((time.perf_counter() - started) * 1e6)
+            assert response.status_code == 400, response.status_code
+        return statistics.median(timings)
+
+    configurations = [
+        ('off', 0, 0, None),
+        ('memory', 1, 16, MemoryStore()),
+        ('sqlite', 1, 16, SQLiteStore(os.path.join(store_dir, 'requests.db'))),
+    ]
+    def configure(enabled, max_writes, store):
+        mosspay.RATE_LIMIT_ENABLED = enabled
+        mosspay.MAX_CONCURRENT_WRITES = max_writes
+        if store is not None:
+            mosspay.RATE_LIMITER.store = store
+
+    best = {}
+    hook_us = {}
+    try:
+        run()  # warm up
+        # Configurations take turns so drift in machine speed hits them all alike.
+        for _ in range(args.rounds):
+            for name, *settings in configurations:
+                configure(*settings)
+                median = run()
+                best[name] = min(best.get(name, median), median)
+        # Request timings vary by more than the limiter costs, so time the hooks on their own too.
+        with app.test_request_context('/api/vendor/change-password', method='POST', json={}):
+            session['vendor_id'] = vendor_id
+            for name, *settings in configurations:
+                configure(*settings)
+                started = time.perf_counter()
+                for _ in range(args.requests):
+                    assert mosspay.admit_request() is None
+                    mosspay.release_write_slot(None)
+                hook_us[name] = (time.perf_counter() - started) * 1e6 / args.requests
+    finally:
+        os.remove(db_path)
+
+    print(f'\n{"admission":<10} {"p50 us/request":>15} {"overhead us":>12} {"hooks us":>9}')
+    for name, _, _, _ in configurations:
+        print(f'{name:<10} {best[name]:>15.1f} {best[name] - best["off"]:>12.1f} {hook_us[name]:>9.2f}')
+
+
+if __name__ == '__main__':
+    main()
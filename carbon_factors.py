@@ -0,0 +1,139 @@
+"""Carbon-factor matching for item names.
+
+CarbonFactorIndex is built once from a {name: kg CO2 saved} table and answers
+lookups through hash indexes on normalized names, falling back to a trigram
+index for fuzzy matches. Lookup cost depends on the query, not on the size of
+the factor table.
+
+A fuzzy match is only applied when it is confident (at least
+`apply_confidence`), unambiguous and based on more than one word of the
+query; otherwise the candidates are returned as suggestions and the carbon
+value is left at zero, so a guess never inflates CO2 savings or rewards.
+"""
+import re
+from collections import Counter, defaultdict
+from typing import NamedTuple, Optional
+
+UNIT_WORDS = {'kg', 'g', 'l', 'ml', 'pack', 'bags', 'pcs', 'pc'}
+
+
+class CarbonMatch(NamedTuple):
+    query: str
+    name: Optional[str]     # canonical factor name that matched, or None
+    carbon_kg: float
+    confidence: float       # 1.0 exact, lower for token/fuzzy matches, 0.0 no match
+    method: Optional[str]   # 'exact', 'tokens', 'fuzzy' or None
+    suggestions: tuple = ()  # factor names worth offering when nothing was applied
+
+
+def normalize(name):
+    """Lowercase, drop punctuation and glue quantities to their units ("1 L" -> "1l")."""
+    text = re.sub(r'[^a-z0-9.]+', ' ', (name or '').lower())
+    text = re.sub(r'(\d)\s+(?=(?:%s)\b)' % '|'.join(sorted(UNIT_WORDS, key=len, reverse=True)), r'\1', text)
+    return ' '.join(token.strip('.') for token in text.split() if token.strip('.'))
+
+
+def token_key(normalized):
+    return ' '.join(sorted(normalized.split()))
+
+
+def words(normalized):
+    """Tokens that describe the product, ignoring quantities like "1l" or "500g"."""
+    return {token for token in normalized.split() if not token[0].isdigit()}
+
+
+def trigrams(normalized):
+    padded = f'  {normalized} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class CarbonFactorIndex:
+
+    def __init__(self, factors, min_confidence=0.55, apply_confidence=0.75, tie_margin=0.05,
+                 max_suggestions=3):
+        self.min_confidence = min_confidence        # lowest confidence worth suggesting
+        self.apply_confidence = apply_confidence    # lowest fuzzy confidence applied automatically
+        self.tie_margin = tie_margin                # runners-up this close make a match ambiguous
+        self.max_suggestions = max_suggestions
+        self._names = []
+        self._values = []
+        self._trigram_counts = []
+        self._word_counts = []
+        self._exact = {}
+        self._tokens = {}
+        self._postings = defaultdict(list)
+        self._word_postings = defaultdict(list)
+        for name, carbon_kg in factors.items():
+            self.add(name, carbon_kg)
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, name, carbon_kg):
+        normalized = normalize(name)
+        entry = len(self._names)
+        grams = trigrams(normalized)
+        self._names.append(name)
+        self._values.append(float(carbon_kg))
+        self._trigram_counts.append(len(grams))
+        self._word_counts.append(len(words(normalized)))
+        self._exact.setdefault(normalized, entry)
+        self._tokens.setdefault(token_key(normalized), entry)
+        for gram in grams:
+            self._postings[gram].append(entry)
+        for word in words(normalized):
+            self._word_postings[word].append(entry)
+
+    def _match(self, query, normalized):
+        entry = self._exact.get(normalized)
+        if entry is not None:
+            return CarbonMatch(query, self._names[entry], self._values[entry], 1.0, 'exact')
+        entry = self._tokens.get(token_key(normalized))
+        if entry is not None:
+            return CarbonMatch(query, self._names[entry], self._values[entry], 0.95, 'tokens')
+        grams = trigrams(normalized)
+        shared_grams = Counter()
+        for gram in grams:
+            shared_grams.update(self._postings.get(gram, ()))
+        query_words = words(normalized)
+        shared_words = Counter()
+        for word in query_words:
+            shared_words.update(self._word_postings.get(word, ()))
+        scored = []
+        for entry, count in shared_grams.items():
+            # Dice coefficient over the trigram sets, or for whole-word hits
+            # ("cheese" in "Local Cheese (500g)") the mean of containment and
+            # Jaccard over the word sets, whichever is higher. Fuzzy matches
+            # are reported at 0.9 of that score.
+            dice = 2 * count / (len(grams) + self._trigram_counts[entry])
+            common = shared_words.get(entry, 0)
+            word_score = 0.0
+            if common:
+                union = len(query_words) + self._word_counts[entry] - common
+                word_score = 0.5 * common / len(query_words) + 0.5 * common / union
+            confidence = round(max(dice, word_score) * 0.9, 3)
+            if confidence >= self.min_confidence:
+                scored.append((confidence, dice, entry))
+        if not scored:
+            return CarbonMatch(query, None, 0.0, 0.0, None)
+        scored.sort(key=lambda candidate: (-candidate[0], -candidate[1], candidate[2]))
+        confidence, _, best_entry = scored[0]
+        ambiguous = len(scored) > 1 and scored[1][0] >= confidence - self.tie_margin
+        if confidence < self.apply_confidence or ambiguous or len(query_words) < 2:
+            suggestions = tuple(self._names[entry] for _, _, entry in scored[:self.max_suggestions])
+            return CarbonMatch(query, None, 0.0, 0.0, None, suggestions)
+        return CarbonMatch(query, self._names[best_entry], self._values[best_entry], confidence, 'fuzzy')
+
+    def lookup(self, name):
+        return self._match(name, normalize(name))
+
+    def lookup_many(self, names):
+        """Resolve many names at once; repeated names are matched only once."""
+        cache = {}
+        results = []
+        for name in names:
+            normalized = normalize(name)
+            if normalized not in cache:
+                cache[normalized] = self._match(name, normalized)
+            results.append(cache[normalized]._replace(query=name))
+        return results
@@ -0,0 +1,187 @@
+"""Publish/subscribe for server-sent event streams.
+
+Each subscriber is a small bounded deque plus a threading.Event, so an idle
+stream costs one blocked wait and no polling (one greenlet under gevent).
+On its own a hub reaches subscribers in its process only. Given a
+SQLiteRelay, what one worker publishes is also appended to a SQLite file
+shared by the workers on the host, and each worker polls that file and
+delivers the others' events to its own subscribers, a fraction of a second
+later.
+"""
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+
+class HubFull(Exception):
+    pass
+
+
+class Subscription:
+
+    def __init__(self, hub, channel, max_pending):
+        self.hub = hub
+        self.channel = channel
+        self.overflowed = False  # set when events were dropped because the client fell behind
+        self._events = deque(maxlen=max_pending)
+        self._ready = threading.Event()
+
+    def put(self, event):
+        if len(self._events) == self._events.maxlen:
+            self.overflowed = True
+        self._events.append(event)
+        self._ready.set()
+
+    def get(self, timeout):
+        """Return the next (id, type, data) event, or None if none arrives within `timeout` seconds."""
+        self._ready.clear()
+        if not self._events:
+            self._ready.wait(timeout)
+        try:
+            return self._events.popleft()
+        except IndexError:
+            return None
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+class EventHub:
+
+    def __init__(self, max_subscribers=5000, max_pending=100, relay=None):
+        self.max_subscribers = max_subscribers
+        self.max_pending = max_pending
+        self.relay = relay
+        self._lock = threading.Lock()
+        self._channels = {}
+        self._count = 0
+        self._ids = itertools.count(1)
+
+    @property
+    def subscriber_count(self):
+        return self._count
+
+    def subscribe(self, channel):
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise HubFull()
+            subscription = Subscription(self, channel, self.max_pending)
+            self._channels.setdefault(channel, set()).add(subscription)
+            self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is None or subscription not in subscribers:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._channels[subscription.channel]
+            self._count -= 1
+
+    def has_subscribers(self, channel):
+        """False only if nobody can be listening; with a relay, subscribers may be in other workers."""
+        return self.relay is not None or channel in self._channels
+
+    def start_relay(self):
+        """Start delivering other workers' events here; call once in each worker."""
+        if self.relay is not None:
+            self.relay.start(self)
+
+    def publish(self, channel, event_type, data):
+        """Queue an event for everyone subscribed to `channel`; returns how many there were here."""
+        if self.relay is not None:
+            self.relay.send(channel, event_type, data)
+        return self.deliver(channel, event_type, data)
+
+    def deliver(self, channel, event_type, data):
+        """Queue an event for this process's subscribers to `channel` only."""
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        if subscribers:
+            event = (next(self._ids), event_type, data)
+            for subscription in subscribers:
+                subscription.put(event)
+        return len(subscribers)
+
+
+class SQLiteRelay:
+    """Carries published events between the worker processes on one host.
+
+    Events go into a table of a SQLite file, tagged with the publishing
+    process. Each worker polls the table every `poll_seconds` for rows from
+    other processes. Rows older than `keep_seconds` are deleted every
+    `prune_every` sends. A failing file loses events rather than requests:
+    pages resync when their stream reconnects.
+    """
+
+    def __init__(self, path, poll_seconds=0.2, keep_seconds=60, prune_every=1000, timeout=1.0):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.keep_seconds = keep_seconds
+        self.prune_every = prune_every
+        self.timeout = timeout
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._poller_pid = None
+        self._sent = 0
+
+    def _connection(self):
+        # One connection per process, opened again in a forked worker; callers hold _lock.
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                       check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('PRAGMA synchronous=OFF')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS relay_event (id INTEGER PRIMARY KEY, origin INTEGER NOT NULL, '
+                'channel TEXT NOT NULL, event_type TEXT NOT NULL, data TEXT NOT NULL, created REAL NOT NULL)'
+            )
+            self._pid = os.getpid()
+        return self._db
+
+    def send(self, channel, event_type, data):
+        try:
+            with self._lock:
+                connection = self._connection()
+                connection.execute(
+                    'INSERT INTO relay_event (origin, channel, event_type, data, created) VALUES (?, ?, ?, ?, ?)',
+                    (os.getpid(), channel, event_type, json.dumps(data), time.time())
+                )
+                self._sent += 1
+                if self._sent % self.prune_every == 0:
+                    connection.execute('DELETE FROM relay_event WHERE created < ?', (time.time() - self.keep_seconds,))
+        except sqlite3.Error:
+            self.errors += 1
+
+    def start(self, hub):
+        """Poll for other processes' events from a daemon thread, delivering them to `hub`."""
+        if self._poller_pid == os.getpid():
+            return
+        self._poller_pid = os.getpid()
+        with self._lock:
+            last_id = self._connection().execute('SELECT coalesce(max(id), 0) FROM relay_event').fetchone()[0]
+
+        def poll():
+            nonlocal last_id
+            while True:
+                time.sleep(self.poll_seconds)
+                try:
+                    with self._lock:
+                        rows = self._connection().execute(
+                            'SELECT id, channel, event_type, data FROM relay_event '
+                            'WHERE id > ? AND origin != ? ORDER BY id', (last_id, os.getpid())
+                        ).fetchall()
+                except sqlite3.Error:
+                    self.errors += 1
+                    continue
+                for last_id, channel, event_type, data in rows:
+                    hub.deliver(channel, event_type, json.loads(data))
+
+        threading.Thread(target=poll, name='event-relay', daemon=True).start()
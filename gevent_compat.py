@@ -0,0 +1,35 @@
+"""Real OS threads when gevent has monkey-patched threading.
+
+gunicorn.conf.py patches the standard library before the app is loaded, so
+under gevent workers threading.Lock, threading.local and thread pools all
+turn into greenlet versions. Most code wants that. The few places that need
+actual threads (CPU-bound password hashing, one SQLite connection per
+process) get them from here, and get the standard ones when gevent is not
+installed or not in use.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from gevent import monkey
+except ImportError:  # without gevent nothing is ever patched
+    monkey = None
+
+
+def threading_patched():
+    return monkey is not None and monkey.is_module_patched('threading')
+
+
+def original(name):
+    """threading.<name> as it was before any monkey-patching, e.g. original('Lock')."""
+    if monkey is None:
+        return getattr(threading, name)
+    return monkey.get_original('threading', name)
+
+
+def native_executor(max_workers, thread_name_prefix=''):
+    """A thread pool on OS threads whose futures a greenlet can wait on without blocking its worker."""
+    if threading_patched():
+        from gevent.threadpool import ThreadPoolExecutor as GeventThreadPoolExecutor
+        return GeventThreadPoolExecutor(max_workers=max_workers)
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
@@ -0,0 +1,91 @@
+"""Gunicorn settings for running MossPay in production.
+
+    pip install gunicorn gevent
+    flask db-upgrade && gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is loaded once in the master (preload_app), its caches are filled in
+when_ready and it is then forked, so read-only data is shared between
+workers; each worker then opens its own database connections. Workers are
+gevent ones, so an idle event stream costs a greenlet rather than a thread.
+The standard library is monkey-patched here, before the app is loaded, so
+the locks and queues it creates at import are gevent ones too. Every setting
+can be overridden from the environment:
+
+    BIND                 address to listen on (0.0.0.0:8000)
+    WEB_CONCURRENCY      worker processes (2 x CPU cores + 1)
+    WORKER_CLASS         gevent (default), or gthread where gevent cannot be
+                         installed; thread workers hold few event streams
+    WORKER_CONNECTIONS   open connections per gevent worker (5000)
+    WORKER_THREADS       threads per gthread worker (4)
+    MAX_REQUESTS         requests before a worker is recycled (10000, 0 = never)
+    EVENT_STREAM_MAX_SUBSCRIBERS
+                         open event streams per worker (nine tenths of
+                         WORKER_CONNECTIONS on gevent; a quarter of
+                         WORKER_THREADS, at least 1, on gthread)
+    EVENT_RELAY_PATH     SQLite file that carries events between workers, so
+                         a bill made on one reaches streams open on another
+    METRICS_DIR          where workers share metrics snapshots, so /metrics
+                         reports all of them
+The last two default to a temporary directory for this server, removed when
+it exits.
+"""
+import os
+
+worker_class = os.environ.get('WORKER_CLASS', 'gevent')
+if worker_class == 'gevent':
+    from gevent import monkey
+    monkey.patch_all()
+
+import multiprocessing
+import shutil
+import tempfile
+
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('WORKER_THREADS', 4))
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 5000))
+preload_app = True
+
+# Set here, before the app is loaded, so the app picks them up. On gevent the
+# cap leaves connections for ordinary requests; on gthread an open event
+# stream holds a thread for as long as it lasts, so most threads are kept for
+# ordinary requests and pages past the cap poll instead.
+os.environ.setdefault('EVENT_STREAM_MAX_SUBSCRIBERS', str(
+    worker_connections * 9 // 10 if worker_class == 'gevent' else max(1, threads // 4)))
+# One directory per server, so events and counts from a previous run never mix with this one's.
+server_dir = os.path.join(tempfile.gettempdir(), f'mosspay-{os.getpid()}')
+os.makedirs(server_dir, exist_ok=True)
+os.environ.setdefault('EVENT_RELAY_PATH', os.path.join(server_dir, 'events.db'))
+os.environ.setdefault('METRICS_DIR', os.path.join(server_dir, 'metrics'))
+
+timeout = 30
+graceful_timeout = 30
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', 10000))
+max_requests_jitter = max_requests // 10
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before any worker forks.
+    from app import preload
+    from wsgi import app
+    preload(app)
+
+
+def post_fork(server, worker):
+    from app import after_fork
+    from wsgi import app
+    after_fork(app)
+
+
+def worker_exit(server, worker):
+    # Leave the final counts behind; the next scrape folds them into the totals.
+    from app import METRICS, METRICS_ENABLED
+    if METRICS_ENABLED:
+        METRICS.save_snapshot()
+
+
+def on_exit(server):
+    shutil.rmtree(server_dir, ignore_errors=True)
@@ -0,0 +1,257 @@
+"""In-process counters, gauges and histograms rendered in the Prometheus text format.
+
+Each metric keeps one small record per label combination behind its own
+lock, so recording a value is a dict lookup and a few additions. Label
+values should come from a bounded set (endpoint names, status codes).
+
+Under a pre-forking server each worker has its own registry. Given a
+`snapshot_dir`, every process writes its values there as <pid>.json about
+once a second, and render() sums the files of all processes, so a scrape
+answered by any worker reports the whole server. Counts from workers that
+have exited are folded into exited.json and kept; their gauges are dropped.
+"""
+import bisect
+import fcntl
+import glob
+import json
+import os
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+
+def format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Base metric; given a `callback` returning {label values: value}, it is read at render time."""
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.callback = callback
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def snapshot(self):
+        """{label values: value} as of now."""
+        if self.callback is not None:
+            return dict(self.callback())
+        with self._lock:
+            return dict(self._values)
+
+    def combine(self, value, other):
+        return value + other
+
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in sorted((self.snapshot() if values is None else values).items()):
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f'{self.name}{format_labels(self.labels, key)} {format_value(value)}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            record = self._values.get(key)
+            if record is None:
+                record = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            record[0][slot] += 1
+            record[1] += value
+            record[2] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {key: [list(counts), total, count] for key, (counts, total, count) in self._values.items()}
+
+    def combine(self, record, other):
+        return [[a + b for a, b in zip(record[0], other[0])], record[1] + other[1], record[2] + other[2]]
+
+    def _render_sample(self, key, record):
+        counts, total, count = record
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += bucket_count
+            labels = format_labels(self.labels, key, [('le', format_value(float(bound)))])
+            lines.append(f'{self.name}_bucket{labels} {cumulative}')
+        labels = format_labels(self.labels, key)
+        lines.append(f'{self.name}_sum{labels} {format_value(total)}')
+        lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class Registry:
+    """The metrics of one process, optionally shared with sibling processes through `snapshot_dir`."""
+
+    def __init__(self, snapshot_dir=None, snapshot_seconds=1.0):
+        self.metrics = []
+        self.snapshot_dir = snapshot_dir
+        self.snapshot_seconds = snapshot_seconds
+        self._writer_pid = None
+        if snapshot_dir:
+            os.makedirs(snapshot_dir, exist_ok=True)
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, *args, **kwargs):
+        return self.register(Counter(*args, **kwargs))
+
+    def gauge(self, *args, **kwargs):
+        return self.register(Gauge(*args, **kwargs))
+
+    def histogram(self, *args, **kwargs):
+        return self.register(Histogram(*args, **kwargs))
+
+    def render(self):
+        lines = []
+        if not self.snapshot_dir:
+            for metric in self.metrics:
+                lines.extend(metric.render())
+            return '\n'.join(lines) + '\n'
+        self.save_snapshot()
+        totals = self.combined_snapshots()
+        for metric in self.metrics:
+            lines.extend(metric.render(totals.get(metric.name, {})))
+        return '\n'.join(lines) + '\n'
+
+    # --- Sharing between processes ---
+    def snapshot(self):
+        return {metric.name: [[list(key), value] for key, value in metric.snapshot().items()]
+                for metric in self.metrics}
+
+    def save_snapshot(self):
+        """Write this process's values to <snapshot_dir>/<pid>.json."""
+        if not self.snapshot_dir:
+            return
+        path = os.path.join(self.snapshot_dir, f'{os.getpid()}.json')
+        temporary = f'{path}.{threading.get_ident()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(temporary, path)
+
+    def start_snapshots(self):
+        """Save snapshots every `snapshot_seconds` from a daemon thread; call once in each worker."""
+        if not self.snapshot_dir or self._writer_pid == os.getpid():
+            return
+        self._writer_pid = os.getpid()
+
+        def write():
+            while True:
+                time.sleep(self.snapshot_seconds)
+                try:
+                    self.save_snapshot()
+                except OSError:
+                    pass  # e.g. the directory was removed at shutdown; try again next time
+
+        threading.Thread(target=write, name='metrics-snapshots', daemon=True).start()
+
+    def combined_snapshots(self):
+        """{metric name: {label values: value}} summed over all processes' snapshots."""
+        with open(os.path.join(self.snapshot_dir, 'lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            self._fold_exited()
+            snapshots = [(path, self._load(path)) for path in glob.glob(os.path.join(self.snapshot_dir, '*.json'))]
+        totals = {}
+        for path, snapshot in snapshots:
+            self._add(totals, snapshot, live=os.path.basename(path) != 'exited.json')
+        return totals
+
+    def _add(self, totals, snapshot, live):
+        # Gauges describe processes as they are now, so only live ones count.
+        metrics = {metric.name: metric for metric in self.metrics}
+        for name, samples in snapshot.items():
+            metric = metrics.get(name)
+            if metric is None or (not live and metric.kind == 'gauge'):
+                continue
+            values = totals.setdefault(name, {})
+            for key, value in samples:
+                key = tuple(key)
+                values[key] = metric.combine(values[key], value) if key in values else value
+
+    def _fold_exited(self):
+        # Move the counts of processes that have exited into exited.json, so files do not pile up.
+        exited_path = os.path.join(self.snapshot_dir, 'exited.json')
+        gone = []
+        for path in glob.glob(os.path.join(self.snapshot_dir, '*.json')):
+            pid = os.path.basename(path)[:-len('.json')]
+            if pid.isdigit() and not process_alive(int(pid)):
+                gone.append(path)
+        if not gone:
+            return
+        totals = {}
+        for path in [exited_path] + gone:
+            self._add(totals, self._load(path), live=False)
+        with open(exited_path + '.tmp', 'w') as f:
+            json.dump({name: [[list(key), value] for key, value in values.items()]
+                       for name, values in totals.items()}, f)
+        os.replace(exited_path + '.tmp', exited_path)
+        for path in gone:
+            os.remove(path)
+
+    @staticmethod
+    def _load(path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
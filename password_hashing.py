@@ -0,0 +1,124 @@
+"""Password hashing on a bounded worker pool.
+
+Hashing is deliberately slow, so a burst of logins would otherwise occupy
+every request thread. PasswordHasher runs hashes on at most `workers`
+threads and lets at most `max_queue` more requests wait; past that it raises
+HashingBusy straight away so the caller can answer quickly. hashlib's scrypt
+and pbkdf2 release the GIL, so other requests keep running meanwhile. Under
+gevent the pool still runs on OS threads, so a hash never stalls a worker's
+other greenlets. Hash and queue-wait times go to the optional
+`hash_histogram` and `wait_histogram` (metrics.Histogram), observed by the
+caller once its hash is done.
+"""
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as FutureTimeout
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from gevent_compat import native_executor, original
+
+
+class HashingBusy(Exception):
+    pass
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class PasswordHasher:
+
+    def __init__(self, method='scrypt', workers=2, max_queue=32, timeout=10.0, window=1000,
+                 hash_histogram=None, wait_histogram=None):
+        self.method = method
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.hash_histogram = hash_histogram
+        self.wait_histogram = wait_histogram
+        self._executor = native_executor(workers, thread_name_prefix='password-hash')
+        # Taken by pool threads as well as request threads or greenlets, so these are OS-level.
+        self._slots = original('BoundedSemaphore')(workers + max_queue)
+        self._lock = original('Lock')()
+        self._queued = 0
+        self._running = 0
+        self._completed = 0
+        self._rejected = 0
+        self._hash_seconds = deque(maxlen=window)
+        self._wait_seconds = deque(maxlen=window)
+        self._prefix = None
+
+    @property
+    def prefix(self):
+        """Method part of hashes made with the current settings, e.g. "scrypt:32768:8:1"."""
+        if self._prefix is None:
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._prefix
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        return password_hash.split('$', 1)[0] != self.prefix
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._rejected += 1
+            raise HashingBusy('Too many sign-ins in progress. Please try again in a moment.')
+        submitted = time.perf_counter()
+        with self._lock:
+            self._queued += 1
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                self._queued -= 1
+                self._running += 1
+            try:
+                return function(*args), started - submitted, time.perf_counter() - started
+            finally:
+                finished = time.perf_counter()
+                with self._lock:
+                    self._running -= 1
+                    self._completed += 1
+                    self._wait_seconds.append(started - submitted)
+                    self._hash_seconds.append(finished - started)
+                self._slots.release()
+
+        try:
+            result, waited, took = self._executor.submit(task).result(timeout=self.timeout)
+        except FutureTimeout:
+            raise HashingBusy('Password check timed out. Please try again in a moment.')
+        # Observed here rather than in the pool thread, so the histograms' locks stay on the caller's side.
+        if self.wait_histogram is not None:
+            self.wait_histogram.observe(waited)
+        if self.hash_histogram is not None:
+            self.hash_histogram.observe(took)
+        return result
+
+    def stats(self):
+        method = self.prefix
+        with self._lock:
+            hash_seconds = list(self._hash_seconds)
+            wait_seconds = list(self._wait_seconds)
+            return {
+                'method': method,
+                'workers': self.workers,
+                'max_queue': self.max_queue,
+                'running': self._running,
+                'queued': self._queued,
+                'completed': self._completed,
+                'rejected': self._rejected,
+                'hash_seconds_p50': percentile(hash_seconds, 0.5),
+                'hash_seconds_p95': percentile(hash_seconds, 0.95),
+                'wait_seconds_p50': percentile(wait_seconds, 0.5),
+                'wait_seconds_p95': percentile(wait_seconds, 0.95),
+            }
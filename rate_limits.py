@@ -0,0 +1,194 @@
+"""Token-bucket rate limits and a concurrency cap for admitting requests.
+
+A limit such as "10/minute" is a bucket holding up to 10 tokens that refills
+at 10 per minute; each request takes one, and a request finding the bucket
+empty is told how many seconds until a token is back. Buckets live in a
+MemoryStore (per process) or a SQLiteStore, a small local database file that
+the worker processes on one host share so a limit holds across all of them.
+
+ConcurrencyLimiter caps how many requests run at once and lets a few more
+wait briefly for a slot; past that it raises Overloaded so the caller can
+answer 503 straight away instead of piling work onto the database.
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from gevent_compat import original
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+class Overloaded(Exception):
+    pass
+
+
+class Limit:
+    """`count` requests per `period` seconds, allowing bursts of up to `count`."""
+
+    def __init__(self, count, period):
+        if count <= 0 or period <= 0:
+            raise ValueError('A limit needs a positive count and period.')
+        self.count = count
+        self.period = period
+        self.rate = count / period
+
+    @classmethod
+    def parse(cls, spec):
+        """Read "<count>/<second|minute|hour|day>", e.g. "30/minute"."""
+        count, _, period = spec.partition('/')
+        try:
+            return cls(int(count), PERIODS[period.strip().lower().rstrip('s')])
+        except (KeyError, ValueError):
+            raise ValueError(f'Invalid rate limit {spec!r}; expected e.g. "30/minute".')
+
+    def __repr__(self):
+        return f'Limit({self.count}, {self.period})'
+
+
+class MemoryStore:
+    """Buckets in a dict, for one process. The least recently used are dropped past `max_keys`."""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, limit, cost=1):
+        """Take `cost` tokens; returns 0 if they were there, else the seconds until they will be."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (limit.count, now))
+            tokens = min(limit.count, tokens + (now - updated) * limit.rate)
+            if tokens >= cost:
+                tokens -= cost
+                wait = 0.0
+            else:
+                wait = (cost - tokens) / limit.rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteStore:
+    """Buckets in a SQLite file shared by the processes on one host.
+
+    Each take is a single UPSERT, so it is atomic without an explicit
+    transaction. Times come from the wall clock, as monotonic clocks are not
+    comparable between processes. Rows for buckets that have refilled are
+    deleted every `prune_every` takes.
+    """
+
+    TAKE = """
+        INSERT INTO rate_bucket (key, tokens, updated, full_at)
+        VALUES (:key, :count - :cost, :now, :now + :cost / :rate)
+        ON CONFLICT (key) DO UPDATE SET
+            tokens = min(:count, tokens + (:now - updated) * :rate) - :cost,
+            updated = :now,
+            full_at = :now + (:count - min(:count, tokens + (:now - updated) * :rate) + :cost) / :rate
+        WHERE min(:count, tokens + (:now - updated) * :rate) >= :cost
+        RETURNING tokens
+    """
+    AVAILABLE = 'SELECT min(:count, tokens + (:now - updated) * :rate) FROM rate_bucket WHERE key = :key'
+
+    def __init__(self, path, timeout=1.0, prune_every=1000):
+        self.path = path
+        self.timeout = timeout
+        self.prune_every = prune_every
+        self._local = original('local')()  # per OS thread, so one connection per gevent worker
+        self._takes = 0
+        self._connection()
+
+    def _connection(self):
+        # One connection per OS thread, opened again in a forked worker.
+        local = self._local
+        if getattr(local, 'pid', None) != os.getpid():
+            local.connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                               check_same_thread=False)
+            local.connection.execute('PRAGMA journal_mode=WAL')
+            local.connection.execute('PRAGMA synchronous=OFF')  # losing recent takes in a crash is harmless
+            local.connection.execute(
+                'CREATE TABLE IF NOT EXISTS rate_bucket '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, full_at REAL NOT NULL)'
+            )
+            local.pid = os.getpid()
+        return local.connection
+
+    def take(self, key, limit, cost=1):
+        """Take `cost` tokens; returns 0 if they were there, else the seconds until they will be."""
+        connection = self._connection()
+        params = {'key': key, 'count': limit.count, 'rate': limit.rate, 'cost': cost, 'now': time.time()}
+        self._takes += 1
+        if self._takes % self.prune_every == 0:
+            connection.execute('DELETE FROM rate_bucket WHERE full_at < ?', (params['now'],))
+        if connection.execute(self.TAKE, params).fetchone() is not None:
+            return 0.0
+        available = connection.execute(self.AVAILABLE, params).fetchone()[0]
+        return (cost - available) / limit.rate
+
+
+class RateLimiter:
+    """Checks requests against limits in a store; a failing store lets requests through."""
+
+    def __init__(self, store):
+        self.store = store
+        self.errors = 0
+
+    def hit(self, key, limit, cost=1):
+        """Returns 0 if the request is allowed, else the whole seconds to wait before retrying."""
+        try:
+            wait = self.store.take(key, limit, cost)
+        except sqlite3.Error:
+            self.errors += 1
+            return 0
+        return max(1, math.ceil(wait)) if wait > 0 else 0
+
+
+class ConcurrencyLimiter:
+    """At most `max_active` holders at once, with up to `max_waiting` more waiting `timeout` seconds."""
+
+    def __init__(self, max_active, max_waiting=0, timeout=0.0):
+        self.max_active = max_active
+        self.max_waiting = max_waiting
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(max_active)
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiting = 0
+        self._rejected = 0
+
+    def acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                queue_full = self._waiting >= self.max_waiting
+                if not queue_full:
+                    self._waiting += 1
+            acquired = False
+            if not queue_full:
+                acquired = self._slots.acquire(timeout=self.timeout)
+                with self._lock:
+                    self._waiting -= 1
+            if not acquired:
+                with self._lock:
+                    self._rejected += 1
+                raise Overloaded('The server is busy. Please try again in a moment.')
+        with self._lock:
+            self._active += 1
+
+    def release(self):
+        with self._lock:
+            self._active -= 1
+        self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_active': self.max_active,
+                'active': self._active,
+                'waiting': self._waiting,
+                'rejected': self._rejected,
+            }
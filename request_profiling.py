@@ -0,0 +1,86 @@
+"""Per-request profilers whose output can be written to disk.
+
+Two kinds, both limited to the thread serving the request:
+
+* ``pstats``: cProfile, saved as a .prof file for ``python -m pstats`` or snakeviz.
+* ``collapsed``: a background thread samples the request thread's stack every
+  few milliseconds; saved as collapsed stacks ("outer;inner count" per line)
+  for flamegraph.pl or speedscope.
+"""
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_FORMATS = ('pstats', 'collapsed')
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'
+
+
+class StackSampler:
+
+    def __init__(self, thread_id, interval=0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame_label(frame))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f'{stack} {count}\n')
+
+
+class RequestProfile:
+    """A running profile of the current thread; stop() it, then save() it."""
+
+    def __init__(self, profile_format, sample_interval=0.005):
+        self.profile_format = profile_format
+        self.started = time.perf_counter()
+        self.elapsed = None
+        if profile_format == 'collapsed':
+            self._profiler = StackSampler(threading.get_ident(), sample_interval)
+            self._profiler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    @property
+    def extension(self):
+        return '.collapsed' if self.profile_format == 'collapsed' else '.prof'
+
+    def stop(self):
+        if self.profile_format == 'collapsed':
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        self.elapsed = time.perf_counter() - self.started
+
+    def save(self, path):
+        if self.profile_format == 'collapsed':
+            self._profiler.write(path)
+        else:
+            self._profiler.dump_stats(path)
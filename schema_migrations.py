@@ -0,0 +1,334 @@
+"""Frozen schema migrations, applied in order by app.migrate_database().
+
+Each function is one entry of app.MIGRATIONS and takes the connection of the
+migration's transaction. It describes the database as it was when that
+migration shipped: tables and indexes are declared here on a MetaData of
+the migration's own, and backfills are written against those tables, never
+against the app's current models. So a migration does the same thing on a
+fresh database today as it did on the databases it first ran on.
+
+A migration is never edited once it has shipped. A schema change is a new
+function here and a new entry in app.MIGRATIONS; scripts/check_migrations.py
+fails if the migrated schema and the models drift apart.
+"""
+from sqlalchemy import (MetaData, Table, Column, Index, ForeignKey, Integer, Float, String, Text, Date,
+                        DateTime, func, literal, insert, select, update, text, cast, inspect)
+
+
+def stub_tables(metadata, *names):
+    """Tables that exist already, declared only so foreign keys can name them."""
+    for name in names:
+        Table(name, metadata, Column('id', Integer, primary_key=True))
+
+
+# --- 1: create missing tables ---
+V1 = MetaData()
+Table('user', V1,
+      Column('id', Integer, primary_key=True),
+      Column('fullname', String(150), nullable=False),
+      Column('email', String(150), unique=True, nullable=False),
+      Column('phone', String(20), unique=True, nullable=False),
+      Column('dob', Date, nullable=False),
+      Column('password_hash', String(256), nullable=False),
+      Column('mosscoin_balance', Integer),
+      Column('total_co2_saved', Float),
+      Column('green_purchases', Integer),
+      Column('eco_streak', Integer),
+      Column('rank', Integer))
+Table('vendor', V1,
+      Column('id', Integer, primary_key=True),
+      Column('business_name', String(150), nullable=False),
+      Column('contact_name', String(150), nullable=False),
+      Column('mobile', String(20), nullable=False),
+      Column('udyam_id', String(50)),
+      Column('address', String(300), nullable=False),
+      Column('email', String(150), unique=True, nullable=False),
+      Column('password_hash', String(256), nullable=False),
+      Column('description', Text),
+      Column('logo_url', String(300)),
+      Column('shop_category', String(100)),
+      Column('website_url', String(300)))
+Table('item', V1,
+      Column('id', Integer, primary_key=True),
+      Column('name', String(200), nullable=False),
+      Column('price', Float, nullable=False),
+      Column('unit', String(50), nullable=False),
+      Column('stock', Integer, nullable=False),
+      Column('carbon_saved_kg', Float),
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), nullable=False))
+Table('bill', V1,
+      Column('id', Integer, primary_key=True),
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), nullable=False),
+      Column('customer_id', Integer, ForeignKey('user.id'), nullable=False),
+      Column('total_amount', Float, nullable=False),
+      Column('total_carbon_saved', Float, nullable=False),
+      Column('mosscoins_to_award', Integer),
+      Column('status', String(20)),
+      Column('created_at', DateTime))
+Table('bill_item', V1,
+      Column('id', Integer, primary_key=True),
+      Column('bill_id', Integer, ForeignKey('bill.id'), nullable=False),
+      Column('item_id', Integer, ForeignKey('item.id'), nullable=False),
+      Column('quantity', Integer, nullable=False),
+      Column('price_at_sale', Float, nullable=False),
+      Column('carbon_at_sale', Float, nullable=False))
+Table('vendor_daily_sales', V1,
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), primary_key=True),
+      Column('day', Date, primary_key=True),
+      Column('bill_count', Integer, nullable=False),
+      Column('total_sales', Float, nullable=False),
+      Column('total_co2', Float, nullable=False))
+Table('vendor_daily_customer', V1,
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), primary_key=True),
+      Column('day', Date, primary_key=True),
+      Column('customer_id', Integer, ForeignKey('user.id'), primary_key=True),
+      Column('bill_count', Integer, nullable=False))
+Table('vendor_daily_item', V1,
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), primary_key=True),
+      Column('day', Date, primary_key=True),
+      Column('item_id', Integer, ForeignKey('item.id'), primary_key=True),
+      Column('quantity', Integer, nullable=False))
+Table('leaderboard_bucket', V1,
+      Column('bucket', Integer, primary_key=True, autoincrement=False),
+      Column('user_count', Integer, nullable=False))
+Table('offer', V1,
+      Column('id', Integer, primary_key=True),
+      Column('vendor_id', Integer, ForeignKey('vendor.id'), nullable=False),
+      Column('title', String(150), nullable=False),
+      Column('description', Text),
+      Column('mosscoin_cost', Integer, nullable=False),
+      Column('status', String(20)),
+      Column('created_at', DateTime))
+
+V1_SEARCH_INDEX_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS vendor_search USING fts5(
+        vendor_id UNINDEXED, name, business_name, shop_category, description,
+        tokenize = 'porter unicode61')""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_ai AFTER INSERT ON item BEGIN
+        INSERT INTO vendor_search(rowid, vendor_id, name) VALUES (new.id * 2, new.vendor_id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_ad AFTER DELETE ON item BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS item_search_au AFTER UPDATE OF name, vendor_id ON item BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2;
+        INSERT INTO vendor_search(rowid, vendor_id, name) VALUES (new.id * 2, new.vendor_id, new.name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_ai AFTER INSERT ON vendor BEGIN
+        INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description)
+        VALUES (new.id * 2 + 1, new.id, new.business_name, new.shop_category, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_ad AFTER DELETE ON vendor BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2 + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vendor_search_au AFTER UPDATE OF business_name, shop_category, description ON vendor BEGIN
+        DELETE FROM vendor_search WHERE rowid = old.id * 2 + 1;
+        INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description)
+        VALUES (new.id * 2 + 1, new.id, new.business_name, new.shop_category, new.description);
+    END""",
+]
+
+
+def v1_create_tables(connection):
+    V1.create_all(bind=connection, checkfirst=True)
+    if connection.dialect.name == 'sqlite':
+        for statement in V1_SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+
+
+# --- 2: backfill leaderboard, search index and sales rollups ---
+V1_LEADERBOARD_BUCKET_KG = 1
+
+
+def v2_backfill_derived_data(connection):
+    user, bucket_table = V1.tables['user'], V1.tables['leaderboard_bucket']
+    bucket = func.coalesce(cast(user.c.total_co2_saved / V1_LEADERBOARD_BUCKET_KG, Integer), 0)
+    connection.execute(bucket_table.delete())
+    connection.execute(insert(bucket_table).from_select(
+        ['bucket', 'user_count'], select(bucket, func.count(user.c.id)).group_by(bucket)
+    ))
+    ranked = select(
+        user.c.id,
+        func.row_number().over(order_by=(user.c.total_co2_saved.desc(), user.c.id)).label('position')
+    ).subquery()
+    connection.execute(update(user).values(rank=ranked.c.position).where(user.c.id == ranked.c.id))
+
+    if connection.dialect.name == 'sqlite':
+        for statement in V1_SEARCH_INDEX_DDL:
+            connection.execute(text(statement))
+        connection.execute(text("DELETE FROM vendor_search"))
+        connection.execute(text(
+            "INSERT INTO vendor_search(rowid, vendor_id, name) SELECT id * 2, vendor_id, name FROM item"
+        ))
+        connection.execute(text(
+            "INSERT INTO vendor_search(rowid, vendor_id, business_name, shop_category, description) "
+            "SELECT id * 2 + 1, id, business_name, shop_category, description FROM vendor"
+        ))
+
+    bill, bill_item = V1.tables['bill'], V1.tables['bill_item']
+    sales, customers, items = (V1.tables[name] for name in (
+        'vendor_daily_sales', 'vendor_daily_customer', 'vendor_daily_item'))
+    day = func.date(bill.c.created_at)
+    for table in (sales, customers, items):
+        connection.execute(table.delete())
+    connection.execute(insert(sales).from_select(
+        ['vendor_id', 'day', 'bill_count', 'total_sales', 'total_co2'],
+        select(bill.c.vendor_id, day, func.count(bill.c.id),
+               func.sum(bill.c.total_amount), func.sum(bill.c.total_carbon_saved)
+               ).group_by(bill.c.vendor_id, day)
+    ))
+    connection.execute(insert(customers).from_select(
+        ['vendor_id', 'day', 'customer_id', 'bill_count'],
+        select(bill.c.vendor_id, day, bill.c.customer_id, func.count(bill.c.id)
+               ).group_by(bill.c.vendor_id, day, bill.c.customer_id)
+    ))
+    connection.execute(insert(items).from_select(
+        ['vendor_id', 'day', 'item_id', 'quantity'],
+        select(bill.c.vendor_id, day, bill_item.c.item_id, func.sum(bill_item.c.quantity)
+               ).join(bill_item, bill_item.c.bill_id == bill.c.id).group_by(bill.c.vendor_id, day, bill_item.c.item_id)
+    ))
+
+
+# --- 3: hot-path secondary indexes ---
+V3_INDEXES = [
+    Index('ix_bill_customer_created', V1.tables['bill'].c.customer_id, V1.tables['bill'].c.created_at,
+          V1.tables['bill'].c.id),
+    Index('ix_bill_vendor_created', V1.tables['bill'].c.vendor_id, V1.tables['bill'].c.created_at,
+          V1.tables['bill'].c.id),
+    Index('ix_bill_item_bill', V1.tables['bill_item'].c.bill_id),
+    Index('ix_item_vendor_stock', V1.tables['item'].c.vendor_id, V1.tables['item'].c.stock),
+    Index('ix_offer_status_vendor', V1.tables['offer'].c.status, V1.tables['offer'].c.vendor_id),
+    Index('ix_user_co2_rank', V1.tables['user'].c.total_co2_saved.desc(), V1.tables['user'].c.id),
+]
+
+
+def v3_hot_path_indexes(connection):
+    # Superseded by ix_user_co2_rank, whose column order matches the leaderboard sort.
+    connection.execute(text('DROP INDEX IF EXISTS ix_user_leaderboard'))
+    for index in V3_INDEXES:
+        index.create(bind=connection, checkfirst=True)
+
+
+# --- 4: mosscoin ledger opening balances ---
+V4 = MetaData()
+stub_tables(V4, 'user', 'bill', 'offer')
+V4_LEDGER = Table(
+    'moss_coin_ledger', V4,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('user.id'), nullable=False),
+    Column('amount', Integer, nullable=False),
+    Column('balance_after', Integer, nullable=False),
+    Column('reason', String(30), nullable=False),
+    Column('bill_id', Integer, ForeignKey('bill.id')),
+    Column('offer_id', Integer, ForeignKey('offer.id')),
+    Column('reward_id', String(50)),
+    Column('created_at', DateTime),
+    Index('ix_mosscoin_ledger_user', 'user_id', 'id'),
+)
+
+
+def v4_mosscoin_ledger(connection):
+    V4_LEDGER.create(bind=connection, checkfirst=True)
+    # Users without ledger rows get one entry explaining their balance.
+    user = V1.tables['user']
+    connection.execute(insert(V4_LEDGER).from_select(
+        ['user_id', 'amount', 'balance_after', 'reason', 'created_at'],
+        select(user.c.id, user.c.mosscoin_balance, user.c.mosscoin_balance, literal('opening_balance'),
+               func.current_timestamp())
+        .where(~select(V4_LEDGER.c.id).where(V4_LEDGER.c.user_id == user.c.id).exists())
+    ))
+
+
+# --- 5: cache version counters ---
+V5 = MetaData()
+V5_CACHE_VERSION = Table(
+    'cache_version', V5,
+    Column('name', String(50), primary_key=True),
+    Column('version', Integer, nullable=False),
+)
+
+
+def v5_cache_versions(connection):
+    V5_CACHE_VERSION.create(bind=connection, checkfirst=True)
+
+
+# --- 6: item vendor/name index for imports ---
+V6_INDEX = Index('ix_item_vendor_name', V1.tables['item'].c.vendor_id, V1.tables['item'].c.name)
+
+
+def v6_item_vendor_name_index(connection):
+    V6_INDEX.create(bind=connection, checkfirst=True)
+
+
+# --- 7: per-item low-stock thresholds and watchlist ---
+V7 = MetaData()
+stub_tables(V7, 'item', 'vendor')
+V7_LOW_STOCK_ITEM = Table(
+    'low_stock_item', V7,
+    Column('item_id', Integer, ForeignKey('item.id'), primary_key=True, autoincrement=False),
+    Column('vendor_id', Integer, ForeignKey('vendor.id'), nullable=False),
+    Column('since', DateTime, nullable=False),
+    Index('ix_low_stock_item_vendor', 'vendor_id'),
+)
+
+
+def column_names(connection, table):
+    return {column['name'] for column in inspect(connection).get_columns(table)}
+
+
+def v7_low_stock_watchlist(connection):
+    if 'low_stock_threshold' not in column_names(connection, 'item'):
+        connection.execute(text('ALTER TABLE item ADD COLUMN low_stock_threshold INTEGER NOT NULL DEFAULT 10'))
+    V7_LOW_STOCK_ITEM.create(bind=connection, checkfirst=True)
+    connection.execute(V7_LOW_STOCK_ITEM.delete())
+    connection.execute(text(
+        'INSERT INTO low_stock_item (item_id, vendor_id, since) '
+        'SELECT id, vendor_id, CURRENT_TIMESTAMP FROM item WHERE stock <= low_stock_threshold'
+    ))
+
+
+# --- 8: bill client ids for POS batch uploads ---
+V8 = MetaData()
+V8_BILL = Table('bill', V8, Column('vendor_id', Integer), Column('client_id', String(64)))
+V8_INDEX = Index('ux_bill_vendor_client', V8_BILL.c.vendor_id, V8_BILL.c.client_id, unique=True)
+
+
+def v8_bill_client_ids(connection):
+    if 'client_id' not in column_names(connection, 'bill'):
+        connection.execute(text('ALTER TABLE bill ADD COLUMN client_id VARCHAR(64)'))
+    V8_INDEX.create(bind=connection, checkfirst=True)
+
+
+# --- 9: leaderboard buckets of 1/16 kg ---
+V9_LEADERBOARD_BUCKETS_PER_KG = 16
+
+
+def v9_finer_leaderboard_buckets(connection):
+    user, bucket_table = V1.tables['user'], V1.tables['leaderboard_bucket']
+    bucket = func.coalesce(cast(user.c.total_co2_saved * V9_LEADERBOARD_BUCKETS_PER_KG, Integer), 0)
+    connection.execute(bucket_table.delete())
+    connection.execute(insert(bucket_table).from_select(
+        ['bucket', 'user_count'], select(bucket, func.count(user.c.id)).group_by(bucket)
+    ))
+
+
+# --- 10: leaderboard counts per score and id block ---
+V10 = MetaData()
+V10_LEADERBOARD_SCORE = Table(
+    'leaderboard_score', V10,
+    Column('score', Float, primary_key=True),
+    Column('block', Integer, primary_key=True, autoincrement=False),
+    Column('user_count', Integer, nullable=False),
+)
+V10_LEADERBOARD_ID_BLOCK = 1024
+
+
+def v10_leaderboard_scores(connection):
+    V10_LEADERBOARD_SCORE.create(bind=connection, checkfirst=True)
+    user = V1.tables['user']
+    score = func.coalesce(user.c.total_co2_saved, 0)
+    block = user.c.id // V10_LEADERBOARD_ID_BLOCK
+    connection.execute(V10_LEADERBOARD_SCORE.delete())
+    connection.execute(insert(V10_LEADERBOARD_SCORE).from_select(
+        ['score', 'block', 'user_count'], select(score, block, func.count(user.c.id)).group_by(score, block)
+    ))
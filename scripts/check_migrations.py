@@ -0,0 +1,86 @@
+"""Fail if the migrated schema differs from the one the models declare.
+
+Runs every migration on a scratch SQLite database, creates a second one
+straight from the models with db.create_all(), and compares their tables,
+columns, indexes and triggers. A difference means a model changed without a
+new migration (or a migration was edited after it shipped). Exits 1 on any
+difference:
+
+    python scripts/check_migrations.py
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def describe(connection):
+    from sqlalchemy import inspect, text
+    inspector = inspect(connection)
+    schema = {}
+    for table in inspector.get_table_names():
+        if table.startswith('vendor_search_'):  # FTS5 shadow tables
+            continue
+        for column in inspector.get_columns(table):
+            default = column['default'].strip("'") if column['default'] is not None else None
+            schema[f'{table}.{column["name"]}'] = (str(column['type']), column['nullable'], default)
+        schema[f'{table} primary key'] = tuple(inspector.get_pk_constraint(table)['constrained_columns'])
+        for index in inspector.get_indexes(table):
+            schema[f'{table} index {index["name"]}'] = (tuple(index['column_names']), bool(index['unique']))
+        for unique in inspector.get_unique_constraints(table):
+            schema[f'{table} unique'] = schema.get(f'{table} unique', ()) + (tuple(unique['column_names']),)
+    for kind, name in connection.execute(text(
+            "SELECT type, name FROM sqlite_master WHERE type = 'trigger' OR sql LIKE 'CREATE VIRTUAL TABLE%'")):
+        schema[f'{kind} {name}'] = True
+    return schema
+
+
+def main():
+    paths = []
+    for _ in range(2):
+        db_fd, db_path = tempfile.mkstemp(suffix='.db')
+        os.close(db_fd)
+        paths.append(db_path)
+    migrated_path, created_path = paths
+    os.environ['DATABASE_URL'] = 'sqlite:///' + migrated_path
+
+    from sqlalchemy import create_engine
+    from app import create_app, db, migrate_database
+    app = create_app()
+
+    try:
+        with app.app_context():
+            migrate_database()
+            with db.engine.connect() as connection:
+                migrated = describe(connection)
+            created_engine = create_engine('sqlite:///' + created_path)
+            db.metadata.create_all(bind=created_engine)
+            with created_engine.connect() as connection:
+                created = describe(connection)
+            created_engine.dispose()
+            db.engine.dispose()
+    finally:
+        for path in paths:
+            os.remove(path)
+
+    problems = []
+    for key in sorted(set(migrated) | set(created)):
+        if key not in migrated:
+            problems.append(f'{key}: declared by the models but no migration creates it')
+        elif key not in created:
+            problems.append(f'{key}: created by a migration but not declared by the models')
+        elif migrated[key] != created[key]:
+            problems.append(f'{key}: migrations give {migrated[key]}, models give {created[key]}')
+
+    if problems:
+        print(f'{len(problems)} schema difference(s) between migrations and models:\n')
+        for problem in problems:
+            print('  ' + problem)
+        sys.exit(1)
+    print(f'OK: migrations match the models ({len(migrated)} schema entries).')
+
+
+if __name__ == '__main__':
+    main()
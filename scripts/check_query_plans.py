@@ -0,0 +1,154 @@
+"""Fail if any route's SQL regresses to a full table scan.
+
+Drives every list/read route and the main write APIs against a scratch
+SQLite database, captures the statements they execute and runs
+EXPLAIN QUERY PLAN on each one. A plan that scans a whole table is
+reported, unless the statement is an unfiltered LIMITed read that walks
+a table or index in order without a temporary sort (the first page of a
+keyset listing). Exits 1 on any regression:
+
+    python scripts/check_query_plans.py
+"""
+import json
+import os
+import re
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+def seed(app, db, models):
+    from datetime import date
+    User, Vendor, Item, Offer = models
+    vendor = Vendor(business_name='Plan Check Store', contact_name='Check', mobile='9000000000',
+                    address='Plan Street', email='plans@vendor.test', password_hash='x',
+                    shop_category='Grocery', description='Organic produce')
+    customer = User(fullname='Plan Customer', email='plans@user.test', phone='9999999999',
+                    dob=date(1990, 1, 1), password_hash='x')
+    others = [User(fullname=f'Other {n}', email=f'other{n}@user.test', phone=f'8{n:09d}',
+                   dob=date(1980 + n, 1, 1), password_hash='x', total_co2_saved=float(n))
+              for n in range(30)]
+    db.session.add_all([vendor, customer] + others)
+    db.session.flush()
+    db.session.add_all([
+        Item(name=name, price=10.0, unit='pc', stock=100, carbon_saved_kg=0.5, vendor_id=vendor.id)
+        for name in ('Jute Bag', 'Local Apples', 'Oat Milk (1L)', 'Bamboo Toothbrush')
+    ])
+    db.session.add(Offer(vendor_id=vendor.id, title='10% off', mosscoin_cost=10))
+    db.session.commit()
+    return vendor.id, customer.id
+
+
+def main():
+    db_fd, db_path = tempfile.mkstemp(suffix='.db')
+    os.close(db_fd)
+    os.environ['DATABASE_URL'] = 'sqlite:///' + db_path
+
+    from sqlalchemy import event
+    from app import create_app, db, migrate_database, User, Vendor, Item, Offer
+    app = create_app()
+
+    captured = []
+    current = {'route': None}
+
+    with app.app_context():
+        migrate_database()
+        vendor_id, customer_id = seed(app, db, (User, Vendor, Item, Offer))
+        item_ids = [item.id for item in Item.query]
+        offer_id = Offer.query.first().id
+        tables = set(db.metadata.tables)
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            verb = statement.lstrip().split(None, 1)[0].upper()
+            if current['route'] and not executemany and verb in ('SELECT', 'UPDATE', 'DELETE', 'WITH'):
+                captured.append((current['route'], statement, parameters))
+
+    vendor = app.test_client()
+    consumer = app.test_client()
+    with vendor.session_transaction() as sess:
+        sess['vendor_id'] = vendor_id
+    with consumer.session_transaction() as sess:
+        sess['_user_id'] = str(customer_id)
+        sess['_fresh'] = True
+
+    def hit(client, method, url, **kwargs):
+        current['route'] = f'{method} {url}'
+        response = client.open(url, method=method, **kwargs)
+        if response.is_streamed:
+            response.get_data()
+        current['route'] = None
+        if response.status_code >= 500:
+            raise SystemExit(f'{method} {url} failed with {response.status_code}')
+        return response
+
+    for _ in range(3):
+        bill = hit(vendor, 'POST', '/api/vendor/send-bill-to-phone', json={
+            'phone': '9999999999', 'cart': [{'id': item_id, 'quantity': 1} for item_id in item_ids]
+        }).get_json()
+    queued = ''.join(json.dumps({
+        'client_id': f'till-{n}', 'phone': '9999999999', 'cart': [{'id': item_ids[0], 'quantity': 1}]
+    }) + '\n' for n in range(3))
+    for _ in range(2):  # the second upload only finds duplicates
+        hit(vendor, 'POST', '/api/vendor/bills/batch', content_type='application/x-ndjson', data=queued)
+    hit(consumer, 'POST', '/api/consumer/log-purchase', json={'bill_id': bill['bill_id']})
+    hit(consumer, 'POST', '/api/consumer/redeem-reward', json={'reward_id': f'offer_{offer_id}'})
+    hit(vendor, 'POST', '/api/vendor/add-item', json={'name': 'Oat milk 1 L', 'price': '3', 'unit': 'pc', 'stock': '5'})
+    hit(vendor, 'POST', '/api/vendor/import-items?format=csv', content_type='text/csv',
+        data=b'name,price,unit,stock\nJute Bag,12,pc,40\nSoy milk 1l,2,pc,10\n')
+    hit(vendor, 'POST', f'/api/vendor/items/{item_ids[0]}/low-stock-threshold', json={'threshold': 500})
+    hit(vendor, 'GET', '/api/vendor/low-stock')
+
+    for url in ('/consumer/dashboard', '/consumer/log_purchase', '/consumer/leaderboard',
+                '/consumer/discover_vendors', '/consumer/discover_vendors?q=jute',
+                f'/vendor_profile/{vendor_id}', '/consumer/redeem',
+                '/api/consumer/search-suggestions?q=ju'):
+        hit(consumer, 'GET', url)
+    for url in ('/api/consumer/bills?limit=1', '/api/consumer/leaderboard?limit=5',
+                '/api/consumer/vendors?limit=1', f'/api/consumer/vendors/{vendor_id}/items?limit=1'):
+        cursor = hit(consumer, 'GET', url).get_json()['next_cursor']
+        hit(consumer, 'GET', f'{url}&cursor={cursor}')
+    for url in ('/vendor/dashboard', '/vendor/manage_items', '/vendor/generate_bill',
+                '/vendor/manage_offers', '/vendor/transaction_history', '/vendor/customer_insights',
+                '/vendor/customer_insights?start=2020-01-01&end=2030-01-01',
+                '/api/vendor/transactions/export?format=ndjson&start=2020-01-01', '/api/vendor/catalogue'):
+        hit(vendor, 'GET', url)
+    cursor = hit(vendor, 'GET', '/api/vendor/transactions?limit=1').get_json()['next_cursor']
+    hit(vendor, 'GET', f'/api/vendor/transactions?limit=1&cursor={cursor}')
+
+    failures = []
+    with app.app_context():
+        connection = db.engine.raw_connection()
+        try:
+            seen = set()
+            for route, statement, parameters in captured:
+                if (route, statement) in seen:
+                    continue
+                seen.add((route, statement))
+                plan = [row[3] for row in connection.execute(f'EXPLAIN QUERY PLAN {statement}', parameters)]
+                sorts = any('USE TEMP B-TREE' in step for step in plan)
+                bounded = (re.search(r'\bLIMIT\b', statement, re.I) and not sorts
+                           and not re.search(r'\bWHERE\b', statement, re.I))
+                for step in plan:
+                    match = SCAN.match(step.strip())
+                    if match and match.group(1) in tables and not bounded:
+                        failures.append((route, step.strip(), ' '.join(statement.split())))
+        finally:
+            connection.close()
+    os.remove(db_path)
+
+    checked = len({(route, statement) for route, statement, _ in captured})
+    if failures:
+        for route, step, statement in failures:
+            print(f'FULL SCAN in {route}: {step}\n    {statement}\n')
+        print(f'{len(failures)} full scan(s) in {checked} statements.')
+        sys.exit(1)
+    print(f'OK: {checked} statements, no full table scans.')
+
+
+if __name__ == '__main__':
+    main()
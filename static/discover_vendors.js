@@ -0,0 +1,42 @@
+document.addEventListener('DOMContentLoaded', function() {
+
+    const searchInput = document.getElementById('vendor-search-input');
+    const suggestionList = document.getElementById('search-suggestions');
+    let debounceTimer = null;
+    let latestQuery = '';
+
+    // Ask the server for prefix matches once the user pauses typing
+    searchInput.addEventListener('input', function() {
+        clearTimeout(debounceTimer);
+        const query = searchInput.value.trim();
+        if (query.length < 2) {
+            suggestionList.innerHTML = '';
+            return;
+        }
+        debounceTimer = setTimeout(async () => {
+            latestQuery = query;
+            try {
+                const response = await fetch(`/api/consumer/search-suggestions?q=${encodeURIComponent(query)}`);
+                const result = await response.json();
+                // Ignore answers to queries the user has already typed past
+                if (!response.ok || query !== latestQuery) return;
+
+                suggestionList.innerHTML = '';
+                const seen = new Set();
+                result.suggestions.forEach(suggestion => {
+                    if (seen.has(suggestion.name)) return;
+                    seen.add(suggestion.name);
+                    const option = document.createElement('option');
+                    option.value = suggestion.name;
+                    if (suggestion.type === 'item' && suggestion.vendor_name) {
+                        option.label = `${suggestion.name} at ${suggestion.vendor_name}`;
+                    }
+                    suggestionList.appendChild(option);
+                });
+            } catch (error) {
+                suggestionList.innerHTML = '';
+            }
+        }, 150);
+    });
+
+});
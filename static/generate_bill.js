@@ -17,8 +17,98 @@ document.addEventListener('DOMContentLoaded', function() {
     const qrCodeContainer = document.getElementById('qr-code-container');
     const messageDisplay = document.getElementById('bill-message-display');
 
+    // Items in stock, by id, as last served by /api/vendor/catalogue
+    let catalogue = {};
+
+    // Bills made while offline wait here until they can be uploaded
+    const QUEUE_KEY = 'mosspay-offline-bills';
+
     // --- FUNCTIONS ---
 
+    // 0. Load the catalogue (the browser revalidates it with its ETag) and draw the item list
+    async function loadCatalogue() {
+        try {
+            const response = await fetch('/api/vendor/catalogue');
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            const result = await response.json();
+            catalogue = {};
+            result.items.forEach(row => {
+                const item = {};
+                result.fields.forEach((field, index) => { item[field] = row[index]; });
+                catalogue[item.id] = item;
+            });
+            renderItemList();
+        } catch (error) {
+            itemList.innerHTML = '<li class="item-list-loading">Could not load your items. Refresh to try again.</li>';
+        }
+    }
+
+    function renderItemList() {
+        itemList.innerHTML = '';
+        Object.values(catalogue).forEach(item => {
+            if (item.stock <= 0) return;
+            const entry = document.createElement('li');
+            entry.className = 'item-list-entry';
+            entry.dataset.name = item.name.toLowerCase();
+            entry.innerHTML = `
+                <div class="item-info">
+                    <strong></strong>
+                    <small>₹${item.price.toFixed(2)} | ${item.stock} in stock</small>
+                </div>
+                <div class="item-controls">
+                    <button class="btn-quantity" data-action="decrease" data-id="${item.id}">-</button>
+                    <span id="quantity-${item.id}">${cart[item.id] ? cart[item.id].quantity : 0}</span>
+                    <button class="btn-quantity" data-action="increase" data-id="${item.id}">+</button>
+                </div>
+            `;
+            entry.querySelector('strong').textContent = item.name;
+            itemList.appendChild(entry);
+        });
+        if (!itemList.children.length) {
+            itemList.innerHTML = '<li class="item-list-loading">No items in stock.</li>';
+        }
+    }
+
+    // 0b. Offline queue: each bill gets an id made here, so uploading it twice cannot bill twice
+    function queuedBills() {
+        return JSON.parse(localStorage.getItem(QUEUE_KEY) || '[]');
+    }
+
+    function queueBill(phone, itemsInCart) {
+        const bills = queuedBills();
+        bills.push({
+            client_id: window.crypto && crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`,
+            phone: phone,
+            cart: itemsInCart,
+            created_at: new Date().toISOString()
+        });
+        localStorage.setItem(QUEUE_KEY, JSON.stringify(bills));
+    }
+
+    async function uploadQueuedBills() {
+        const bills = queuedBills();
+        if (!bills.length || !navigator.onLine) return;
+        try {
+            const response = await fetch('/api/vendor/bills/batch', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/x-ndjson'},
+                body: bills.map(bill => JSON.stringify(bill)).join('\n') + '\n'
+            });
+            if (!response.ok) return;
+            const result = await response.json();
+            // Bills the server read leave the queue (failed ones are reported, not retried);
+            // an upload cut short at the server's limit keeps the rest for next time
+            localStorage.setItem(QUEUE_KEY, JSON.stringify(bills.slice(result.received)));
+            const errors = result.results.filter(bill => bill.status === 'error');
+            messageDisplay.textContent = `Uploaded ${result.created + result.duplicates} offline bill(s)` +
+                (errors.length ? `; ${errors.length} failed: ${errors.map(bill => bill.error).join(' ')}` : '.');
+            messageDisplay.className = errors.length ? 'message-error' : 'message-success';
+            if (result.created) loadCatalogue();
+        } catch (error) {
+            // Still offline; try again on the next 'online' event
+        }
+    }
+
     // 1. Update Bill UI (The right panel)
     function updateBillUI() {
         billItemsList.innerHTML = '';
@@ -38,9 +128,10 @@ document.addEventListener('DOMContentLoaded', function() {
                 const billEntry = document.createElement('div');
                 billEntry.className = 'bill-item-entry';
                 billEntry.innerHTML = `
-                    <span class="item-name">${item.name} (x${item.quantity})</span>
+                    <span class="item-name"></span>
                     <span class="item-price">₹${(item.price * item.quantity).toFixed(2)}</span>
                 `;
+                billEntry.querySelector('.item-name').textContent = `${item.name} (x${item.quantity})`;
                 billItemsList.appendChild(billEntry);
             }
         }
@@ -56,7 +147,8 @@ document.addEventListener('DOMContentLoaded', function() {
 
         const action = button.dataset.action;
         const id = button.dataset.id;
-        const stock = parseInt(button.dataset.stock, 10);
+        const item = catalogue[id];
+        const stock = item.stock;
         const quantityEl = document.getElementById(`quantity-${id}`);
         let currentQuantity = cart[id] ? cart[id].quantity : 0;
 
@@ -65,9 +157,9 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentQuantity++;
                 if (!cart[id]) {
                     cart[id] = {
-                        name: button.dataset.name,
-                        price: parseFloat(button.dataset.price),
-                        carbon: parseFloat(button.dataset.carbon),
+                        name: item.name,
+                        price: item.price,
+                        carbon: item.carbon_saved_kg,
                         stock: stock,
                         quantity: 0
                     };
@@ -125,6 +217,26 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDisplay.textContent = 'Sending...';
         messageDisplay.className = 'message-sending';
 
+        function clearCart() {
+            // Take the sold quantities off the local stock, then empty the cart
+            Object.keys(cart).forEach(id => {
+                if (catalogue[id]) catalogue[id].stock -= cart[id].quantity;
+                delete cart[id]; // Delete the property
+            });
+
+            updateBillUI();
+            renderItemList();
+            customerPhoneInput.value = '';
+        }
+
+        if (!navigator.onLine) {
+            queueBill(phone, itemsInCart);
+            messageDisplay.textContent = 'Offline: bill saved and will be sent when the connection is back.';
+            messageDisplay.className = 'message-sending';
+            clearCart();
+            return;
+        }
+
         try {
             const response = await fetch('/api/vendor/send-bill-to-phone', {
                 method: 'POST',
@@ -140,19 +252,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (response.ok) {
                 messageDisplay.textContent = `Success: ${result.message}`;
                 messageDisplay.className = 'message-success';
-                
-                // --- THIS IS THE FIX ---
-                // We must delete each key from the const, not reassign the const
-                Object.keys(cart).forEach(id => {
-                    document.getElementById(`quantity-${id}`).textContent = '0';
-                    delete cart[id]; // Delete the property
-                });
-                // --- END OF FIX ---
-
-                updateBillUI();
-                customerPhoneInput.value = '';
-                
-                setTimeout(() => window.location.reload(), 2000);
+                clearCart();
             } else {
                 messageDisplay.textContent = `Error: ${result.error}`;
                 messageDisplay.className = 'message-error';
@@ -185,4 +285,8 @@ document.addEventListener('DOMContentLoaded', function() {
         messageDisplay.className = 'message-success';
     });
 
-});
\ No newline at end of file
+    loadCatalogue();
+    uploadQueuedBills();
+    window.addEventListener('online', uploadQueuedBills);
+
+});
@@ -1,38 +1,174 @@
 document.addEventListener('DOMContentLoaded', function() {
-    
-    const allLogButtons = document.querySelectorAll('.btn-log-purchase');
 
-    allLogButtons.forEach(button => {
-        button.addEventListener('click', async function() {
-            const billId = this.dataset.billId;
-            const cardFooter = this.parentElement;
+    const billList = document.querySelector('.log-purchase-list');
+    const logAllButton = document.getElementById('btn-log-all');
+    const logAllBar = logAllButton.parentElement;
 
-            try {
-                // 1. Send the bill ID to the backend API
-                const response = await fetch('/api/consumer/log-purchase', {
+    function showLogged(cardFooter) {
+        cardFooter.innerHTML = `
+            <span class="badge-logged">
+                <i class="fas fa-check-circle"></i> Logged!
+            </span>
+        `;
+    }
+
+    function updateLogAllBar() {
+        logAllBar.hidden = !billList.querySelector('.btn-log-purchase');
+        logAllButton.disabled = false;
+    }
+
+    function markLogged(billId) {
+        const button = billList.querySelector(`.btn-log-purchase[data-bill-id="${billId}"]`);
+        if (button) showLogged(button.parentElement);
+    }
+
+    function billCard(bill) {
+        const card = document.createElement('div');
+        card.className = 'bill-card';
+        card.dataset.billId = bill.id;
+        card.innerHTML = `
+            <div class="bill-card-header">
+                <h4></h4>
+                <span class="bill-date"></span>
+            </div>
+            <div class="bill-card-body">
+                <div class="bill-detail">
+                    <span>Amount</span>
+                    <strong>₹${bill.total_amount.toFixed(2)}</strong>
+                </div>
+                <div class="bill-detail">
+                    <span>CO₂ Saved</span>
+                    <strong>${bill.total_carbon_saved} kg</strong>
+                </div>
+                <div class="bill-detail reward">
+                    <span>Reward</span>
+                    <strong>+${bill.mosscoins_to_award} MossCoins</strong>
+                </div>
+            </div>
+            <div class="bill-card-footer">
+                <button class="btn-sign-in btn-log-purchase" data-bill-id="${bill.id}">
+                    Log this Purchase
+                </button>
+            </div>
+        `;
+        card.querySelector('h4').textContent = bill.vendor_name;
+        card.querySelector('.bill-date').textContent = new Date(bill.created_at + 'Z').toLocaleDateString(
+            'en-GB', {day: '2-digit', month: 'short', year: 'numeric'}
+        );
+        return card;
+    }
+
+    function addBill(bill) {
+        if (billList.querySelector(`.btn-log-purchase[data-bill-id="${bill.id}"]`)) return;
+        const emptyMessage = billList.querySelector('.empty-bills');
+        if (emptyMessage) emptyMessage.remove();
+        billList.prepend(billCard(bill));
+        updateLogAllBar();
+    }
+
+    // Settle every pending bill, one capped batch per request until none remain
+    logAllButton.addEventListener('click', async function() {
+        logAllButton.disabled = true;
+        try {
+            let remaining;
+            do {
+                const response = await fetch('/api/consumer/log-purchases', {
                     method: 'POST',
                     headers: {'Content-Type': 'application/json'},
-                    body: JSON.stringify({ bill_id: billId })
+                    body: JSON.stringify({})
                 });
 
                 const result = await response.json();
 
-                if (response.ok) {
-                    // 2. Success! Change the button to a "Logged" badge
-                    cardFooter.innerHTML = `
-                        <span class="badge-logged">
-                            <i class="fas fa-check-circle"></i> Logged!
-                        </span>
-                    `;
-                    // You could also update the main MossCoin balance on the page here
-                } else {
-                    // 3. Show an error
+                if (!response.ok) {
                     alert(`Error: ${result.error}`);
+                    logAllButton.disabled = false;
+                    return;
                 }
-            } catch (error) {
-                alert(`Error: ${error.message}`);
+                result.results.forEach(billResult => {
+                    if (billResult.status === 'logged') markLogged(billResult.bill_id);
+                });
+                remaining = result.remaining_count;
+            } while (remaining > 0);
+            updateLogAllBar();
+        } catch (error) {
+            alert(`Error: ${error.message}`);
+            logAllButton.disabled = false;
+        }
+    });
+
+    // One listener covers the cards rendered by the server and those added live
+    billList.addEventListener('click', async function(event) {
+        const button = event.target.closest('.btn-log-purchase');
+        if (!button) return;
+        const billId = button.dataset.billId;
+        const cardFooter = button.parentElement;
+
+        try {
+            // 1. Send the bill ID to the backend API
+            const response = await fetch('/api/consumer/log-purchase', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ bill_id: billId })
+            });
+
+            const result = await response.json();
+
+            if (response.ok) {
+                // 2. Success! Change the button to a "Logged" badge
+                showLogged(cardFooter);
+                updateLogAllBar();
+            } else {
+                // 3. Show an error
+                alert(`Error: ${result.error}`);
             }
-        });
+        } catch (error) {
+            alert(`Error: ${error.message}`);
+        }
     });
 
-});
\ No newline at end of file
+    // Live updates: new bills from vendors and bills logged from another tab
+    if (window.EventSource) {
+        const POLL_MS = 30000;
+        let connectedBefore = false;
+
+        // Anything published while we were disconnected is picked up from the first page of bills
+        async function resync() {
+            const response = await fetch('/api/consumer/bills');
+            if (!response.ok) return;
+            const result = await response.json();
+            result.bills.slice().reverse().forEach(bill => {
+                if (bill.status === 'pending') addBill(bill);
+                else markLogged(bill.id);
+            });
+            updateLogAllBar();
+        }
+
+        function connect() {
+            const events = new EventSource('/api/consumer/bill-events');
+            events.addEventListener('ready', function() {
+                if (connectedBefore) resync();
+                connectedBefore = true;
+            });
+            events.addEventListener('resync', resync);
+            events.addEventListener('bill_created', function(event) {
+                addBill(JSON.parse(event.data));
+            });
+            events.addEventListener('bills_logged', function(event) {
+                JSON.parse(event.data).bill_ids.forEach(markLogged);
+                updateLogAllBar();
+            });
+            // Refused (the server is at its stream limit): poll, then try the stream again
+            events.addEventListener('error', function() {
+                if (events.readyState !== EventSource.CLOSED) return;
+                setTimeout(function() {
+                    resync();
+                    connect();
+                }, POLL_MS);
+            });
+        }
+
+        connect();
+    }
+
+});
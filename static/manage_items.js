@@ -7,12 +7,13 @@ document.addEventListener('DOMContentLoaded', function() {
     addItemForm.addEventListener('submit', async (e) => {
         e.preventDefault();
         
-        // 1. Get data from all 4 fields
+        // 1. Get data from all 5 fields
         const itemData = {
             name: document.getElementById('item-name').value,
             price: document.getElementById('item-price').value,
             unit: document.getElementById('item-unit').value,
-            stock: document.getElementById('item-stock').value
+            stock: document.getElementById('item-stock').value,
+            low_stock_threshold: document.getElementById('item-threshold').value
         };
 
         if (!itemData.name || !itemData.price || !itemData.unit || !itemData.stock) {
@@ -38,6 +39,7 @@ document.addEventListener('DOMContentLoaded', function() {
                     <td>${newItem.price.toFixed(2)}</td>
                     <td>${newItem.unit}</td>
                     <td>${newItem.stock}</td>
+                    <td><input type="number" class="threshold-input" min="0" value="${newItem.low_stock_threshold}" data-item-id="${newItem.id}"></td>
                     <td>${newItem.carbon_saved_kg}</td>
                     <td><a href="#" class="btn-delete">Delete</a></td>
                 `;
@@ -45,6 +47,12 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // 4. Clear the form
                 addItemForm.reset();
+
+                // 5. No confident carbon match: the item was saved with 0 kg, so say what might fit
+                if (!newItem.carbon_match && newItem.carbon_suggestions.length) {
+                    alert(`No carbon data was added for "${newItem.name}". ` +
+                          `Did you mean: ${newItem.carbon_suggestions.join(', ')}?`);
+                }
             } else {
                 alert(`Error: ${newItem.error}`);
             }
@@ -52,4 +60,87 @@ document.addEventListener('DOMContentLoaded', function() {
             alert(`Error: ${error.message}`);
         }
     });
+
+    // Per-item low-stock thresholds, saved as soon as one is changed
+    document.getElementById('items-table').addEventListener('change', async (e) => {
+        const input = e.target.closest('.threshold-input');
+        if (!input) return;
+        try {
+            const response = await fetch(`/api/vendor/items/${input.dataset.itemId}/low-stock-threshold`, {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ threshold: input.value }),
+            });
+            const result = await response.json();
+            if (response.ok) {
+                input.defaultValue = result.low_stock_threshold;
+            } else {
+                alert(`Error: ${result.error}`);
+                input.value = input.defaultValue;
+            }
+        } catch (error) {
+            alert(`Error: ${error.message}`);
+            input.value = input.defaultValue;
+        }
+    });
+
+    // Bulk import from a CSV/JSON file
+    const importForm = document.getElementById('import-items-form');
+    const importReport = document.getElementById('import-report');
+
+    importForm.addEventListener('submit', async (e) => {
+        e.preventDefault();
+        const file = document.getElementById('import-file').files[0];
+        if (!file) {
+            alert('Please choose a file to import.');
+            return;
+        }
+        const submitButton = importForm.querySelector('button');
+        submitButton.disabled = true;
+        submitButton.textContent = 'Importing...';
+        importReport.textContent = '';
+
+        const formData = new FormData();
+        formData.append('file', file);
+        try {
+            const response = await fetch('/api/vendor/import-items', { method: 'POST', body: formData });
+            const result = await response.json();
+            const summary = document.createElement('p');
+            summary.textContent = result.error
+                ? `Error: ${result.error}`
+                : `Added ${result.inserted}, updated ${result.updated}, rejected ${result.failed} of ${result.rows} rows.`;
+            importReport.appendChild(summary);
+            if (result.errors && result.errors.length) {
+                const list = document.createElement('ul');
+                result.errors.forEach(rowError => {
+                    const entry = document.createElement('li');
+                    entry.textContent = `Row ${rowError.row}: ${rowError.error}`;
+                    list.appendChild(entry);
+                });
+                importReport.appendChild(list);
+            }
+            if (result.unmatched_carbon && result.unmatched_carbon.length) {
+                const note = document.createElement('p');
+                note.textContent = 'No carbon data was added for these items; add a carbon_saved_kg column or rename them:';
+                importReport.appendChild(note);
+                const list = document.createElement('ul');
+                result.unmatched_carbon.forEach(item => {
+                    const entry = document.createElement('li');
+                    entry.textContent = item.suggestions.length
+                        ? `${item.name} (did you mean ${item.suggestions.join(', ')}?)`
+                        : item.name;
+                    list.appendChild(entry);
+                });
+                importReport.appendChild(list);
+            }
+            if (response.ok && (result.inserted || result.updated) && !result.failed && !result.unmatched_carbon.length) {
+                window.location.reload();
+            }
+        } catch (error) {
+            alert(`Error: ${error.message}`);
+        } finally {
+            submitButton.disabled = false;
+            submitButton.textContent = 'Import Items';
+        }
+    });
 });
\ No newline at end of file
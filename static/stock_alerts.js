@@ -0,0 +1,61 @@
+document.addEventListener('DOMContentLoaded', function() {
+
+    const list = document.getElementById('low-stock-list');
+    const emptyMessage = document.getElementById('low-stock-empty');
+    const alertBox = document.getElementById('low-stock-alert');
+    if (!list || !window.EventSource) return;
+
+    function renderItem(item) {
+        let row = list.querySelector(`li[data-item-id="${item.id}"]`);
+        if (!row) {
+            row = document.createElement('li');
+            row.dataset.itemId = item.id;
+            row.append(document.createElement('span'), document.createElement('strong'));
+            list.prepend(row);
+        }
+        row.querySelector('span').textContent = item.name;
+        row.querySelector('strong').textContent = `${item.stock} ${item.unit} left`;
+    }
+
+    function renderList(items) {
+        list.replaceChildren();
+        items.slice().reverse().forEach(renderItem);
+        emptyMessage.hidden = items.length > 0;
+    }
+
+    async function refresh() {
+        const response = await fetch('/api/vendor/low-stock');
+        if (response.ok) renderList((await response.json()).items);
+    }
+
+    // Alerts arrive the moment a sale takes an item below its threshold
+    const POLL_MS = 30000;
+    let connectedBefore = false;
+
+    function connect() {
+        const events = new EventSource('/api/vendor/stock-events');
+        events.addEventListener('ready', function() {
+            if (connectedBefore) refresh();
+            connectedBefore = true;
+        });
+        events.addEventListener('resync', refresh);
+        events.addEventListener('low_stock', function(event) {
+            const items = JSON.parse(event.data).items;
+            items.forEach(renderItem);
+            emptyMessage.hidden = true;
+            alertBox.textContent = `Running low: ${items.map(item => item.name).join(', ')}`;
+            alertBox.hidden = false;
+        });
+        // Refused (the server is at its stream limit): poll, then try the stream again
+        events.addEventListener('error', function() {
+            if (events.readyState !== EventSource.CLOSED) return;
+            setTimeout(function() {
+                refresh();
+                connect();
+            }, POLL_MS);
+        });
+    }
+
+    connect();
+
+});
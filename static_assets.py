@@ -0,0 +1,145 @@
+"""Content-hashed static asset URLs with precompressed variants.
+
+Every file under the static folder is hashed at startup, and
+asset_url('style.css') in a template gives /assets/style.<hash>.css. A hashed
+URL always means the same bytes, so it is served with a one-year immutable
+Cache-Control and repeat visits never ask for it again. `flask build-assets`
+writes .br (when the brotli package is installed) and .gz variants of text
+assets into the build folder; clients that accept one of them get it.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import abort, current_app, request, send_file, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are still built
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = {'.css', '.js', '.json', '.svg', '.txt', '.map'}
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()[:12]
+
+
+class AssetPipeline:
+
+    def __init__(self, app=None, build_folder=None, url_prefix='/assets', endpoint='hashed_asset'):
+        self.app = None
+        self.build_folder = build_folder
+        self.url_prefix = url_prefix
+        self.endpoint = endpoint
+        self.hashed = {}     # 'style.css' -> 'style.<hash>.css'
+        self.sources = {}    # 'style.<hash>.css' -> path of the original file
+        self.mtimes = {}
+        self.variants = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if self.app is None:  # the files are the same for every app, so scan them once
+            self.app = app
+            self.static_folder = app.static_folder
+            self.build_folder = self.build_folder or os.path.join(app.static_folder, '.build')
+            self.scan()
+        app.add_url_rule(f'{self.url_prefix}/<path:filename>', self.endpoint, self.serve)
+        app.add_template_global(self.url, 'asset_url')
+
+    def scan(self):
+        self.hashed, self.sources, self.mtimes = {}, {}, {}
+        for root, dirs, files in os.walk(self.static_folder):
+            dirs[:] = [name for name in dirs if not name.startswith('.')]
+            for name in files:
+                if not name.startswith('.'):
+                    path = os.path.join(root, name)
+                    self._add(os.path.relpath(path, self.static_folder).replace(os.sep, '/'), path)
+        self.variants = set()
+        for root, _, files in os.walk(self.build_folder):
+            for name in files:
+                path = os.path.join(root, name)
+                self.variants.add(os.path.relpath(path, self.build_folder).replace(os.sep, '/'))
+
+    def _add(self, filename, path):
+        stem, extension = os.path.splitext(filename)
+        hashed = f'{stem}.{file_digest(path)}{extension}'
+        self.hashed[filename] = hashed
+        self.sources[hashed] = path
+        self.mtimes[filename] = os.path.getmtime(path)
+        return hashed
+
+    def url(self, filename):
+        """URL of the current version of a static file (plain /static/ URL if it is unknown)."""
+        hashed = self.hashed.get(filename)
+        if hashed and current_app.debug:  # pick up edits without a restart while developing
+            path = self.sources[hashed]
+            if os.path.exists(path) and os.path.getmtime(path) != self.mtimes[filename]:
+                hashed = self._add(filename, path)
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for(self.endpoint, filename=hashed)
+
+    def serve(self, filename):
+        source = self.sources.get(filename)
+        if source is None:
+            abort(404)
+        path, encoding = source, None
+        for name, suffix in ENCODINGS:
+            if filename + suffix in self.variants and request.accept_encodings[name]:
+                path, encoding = os.path.join(self.build_folder, filename + suffix), name
+                break
+        response = send_file(path, mimetype=mimetypes.guess_type(source)[0] or 'application/octet-stream',
+                             conditional=True)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Cache-Control'] = IMMUTABLE
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def build(self):
+        """Write compressed variants of the current text assets and drop stale ones.
+
+        Returns (variants written, variants removed). A variant is skipped when
+        it would not save at least 10% over the original.
+        """
+        self.scan()
+        keep = set()
+        written = 0
+        for hashed, source in self.sources.items():
+            if os.path.splitext(hashed)[1] not in COMPRESSIBLE:
+                continue
+            with open(source, 'rb') as f:
+                data = f.read()
+            for name, suffix in ENCODINGS:
+                if name == 'br' and brotli is None:
+                    continue
+                target = hashed + suffix
+                if target in self.variants:
+                    keep.add(target)
+                    continue
+                if name == 'br':
+                    compressed = brotli.compress(data, quality=11)
+                else:
+                    compressed = gzip.compress(data, compresslevel=9, mtime=0)
+                if len(compressed) > len(data) * 0.9:
+                    continue
+                path = os.path.join(self.build_folder, target)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(compressed)
+                keep.add(target)
+                written += 1
+        stale = self.variants - keep
+        for target in stale:
+            os.remove(os.path.join(self.build_folder, target))
+        self.scan()
+        return written, len(stale)
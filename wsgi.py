@@ -0,0 +1,8 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app
+
+Only builds the app. Caches are preloaded from gunicorn's when_ready hook,
+so importing this module (e.g. from the flask CLI) never touches the database.
+"""
+from app import create_app
+
+app = create_app()